@@ -0,0 +1,496 @@
+import random
+from array import array
+from collections import deque
+
+from engine import (DIRECTIONS, GREEN_CHANCE, GREEN_FOOD_SECONDS, GREEN_VALUE, OPPOSITES, RESPAWN_FREEZE_MS,
+                    TURN_QUEUE, new_milestone, open_box, roll_food)
+from levels import level
+from projectiles import Projectiles, ScoreShotPolicy
+from timers import TimerWheel
+
+START_LENGTH = 3
+RESPAWN_TICKS = 20
+BOT_SHOT_RANGE = 6
+BOT_SHOT_POINTS = 10
+HEAD_DANGER = 8
+SNAKE_COLORS = ("#e6194b", "#3cb44b", "#ffe119", "#4363d8", "#f58231", "#911eb4", "#46f0f0", "#f032e6",
+                "#bcf60c", "#fabebe", "#008080", "#e6beff", "#9a6324", "#fffac8", "#800000", "#aaffc3")
+
+
+class ArenaSnake:
+    """One arena snake with the per-player state SnakeEngine keeps for its own snake."""
+
+    __slots__ = ("sid", "bot", "color", "body", "pending", "direction", "new_direction", "turns", "alive", "score",
+                 "respawn_tick", "target", "shot_policy", "active", "processed_milestones", "extra_life", "rewinds",
+                 "frozen", "teleport_timer")
+
+    def __init__(self, sid, bot, color, shot_points):
+        self.sid = sid
+        self.bot = bot
+        self.color = color
+        self.body = deque()
+        self.pending = 0
+        self.direction = "Right"
+        self.new_direction = "Right"
+        self.turns = deque()
+        self.alive = False
+        self.score = 0
+        self.respawn_tick = 0
+        self.target = None
+        self.shot_policy = ScoreShotPolicy(shot_points)
+        self.active = True
+        self.processed_milestones = set()
+        self.extra_life = False
+        self.rewinds = 0
+        self.frozen = False
+        self.teleport_timer = None
+
+    def grow(self, n):
+        self.pending += n
+
+
+class ArenaEngine:
+    """Many snakes on one board, resolved in a single pass per tick.
+
+    Every body cell is stamped with its snake id + 1 in one shared array, so a head
+    is checked against all snakes with one lookup; heads landing on the same cell
+    are found by hashing the planned heads. Players are the first `players` snake
+    ids, the rest are bots.
+
+    Food, green food, milestone boxes, extra lives, teleports and the turn
+    queue follow SnakeEngine's rules, with the per-player state kept on each
+    ArenaSnake. The board keeps `food_count` foods (cell -> value) and at most
+    as many green ones. A box reached by a local player pauses the arena until
+    choose_box(), as in SnakeEngine; bots and network players take a box right
+    away. Board tracks a single snake, so the shared owner array stands in for
+    its occupancy grids here."""
+
+    def __init__(self, grid_width, grid_height, snakes=20, players=1, use_walls=False, tick_ms=100,
+                 snake_color=None, seed=None, respawn_players=False, level_style="scatter", wall_density=None):
+        self.grid_width = self.width = grid_width
+        self.grid_height = self.height = grid_height
+        self.num_snakes = snakes
+        self.players = players
+        self.respawn_players = respawn_players
+        self.me = 0
+        self.use_walls = use_walls
+        self.level_style = level_style
+        self.wall_density = wall_density
+        self.tick_ms = tick_ms
+        self.snake_color = snake_color
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.log = None
+        self.teleport_cooldown = 10
+        self.food_count = max(3, snakes // 2)
+        self.projectile_steps = max(1, round(tick_ms / 50))
+        self.projectiles = Projectiles()
+        self.timers = TimerWheel()
+        self.reset()
+
+    def reset(self):
+        cells = self.width * self.height
+        self.running = True
+        self.awaiting_box = False
+        self.box_sid = None
+        self.tick = 0
+        self.timers.clear()
+        self.owner = array("i", [0]) * cells
+        self.wall_cells = bytearray(cells)
+        self.walls = set()
+        self.food = {}
+        self.green = {}
+        self.projectiles.clear()
+        self.shooters = {}
+        self.hit_events = []
+        self.reviving = []
+        self.death_reason = None
+        self.snakes = []
+        for sid in range(self.num_snakes):
+            player = sid < self.players
+            color = self.snake_color if player and self.snake_color else SNAKE_COLORS[sid % len(SNAKE_COLORS)]
+            self.snakes.append(ArenaSnake(sid, not player, color, 30 if player else BOT_SHOT_POINTS))
+        if self.use_walls:
+            self.generate_walls()
+        for snake in self.snakes:
+            self.spawn(snake, [])
+        self.fill_food([])
+
+    # The view and the projectiles treat the arena as a board.
+
+    @property
+    def score(self):
+        return self.snakes[self.me].score if self.me < len(self.snakes) else 0
+
+    @property
+    def extra_life(self):
+        return self.me < len(self.snakes) and self.snakes[self.me].extra_life
+
+    @property
+    def rewinds(self):
+        # Box 4 is counted, but the arena keeps no history to rewind.
+        return self.snakes[self.me].rewinds if self.me < len(self.snakes) else 0
+
+    def ticks(self, ms):
+        return max(1, -(-ms // self.tick_ms))
+
+    def food_items(self):
+        """(cell, kind) for every food on the board, kind being "food", "bonus" or "green"."""
+        for cell, value in self.food.items():
+            yield cell, "bonus" if value > 1 else "food"
+        for cell in self.green:
+            yield cell, "green"
+
+    def inside(self, cell):
+        return 0 <= cell[0] < self.width and 0 <= cell[1] < self.height
+
+    def is_wall(self, cell):
+        return self.wall_cells[cell[1] * self.width + cell[0]]
+
+    def remove_wall(self, cell):
+        self.wall_cells[cell[1] * self.width + cell[0]] = 0
+        self.walls.discard(cell)
+
+    def walls_in(self, x0, y0, x1, y1):
+        return [cell for cell in self.walls if x0 <= cell[0] < x1 and y0 <= cell[1] < y1]
+
+    def is_free(self, cell):
+        i = cell[1] * self.width + cell[0]
+        return not self.owner[i] and not self.wall_cells[i] and cell not in self.food and cell not in self.green
+
+    def random_free(self):
+        for _ in range(100):
+            cell = (self.rng.randrange(self.width), self.rng.randrange(self.height))
+            if self.is_free(cell):
+                return cell
+        free = [(x, y) for y in range(self.height) for x in range(self.width) if self.is_free((x, y))]
+        return self.rng.choice(free) if free else None
+
+    def generate_walls(self):
+        for cell in level(self.width, self.height, self.level_style, self.wall_density,
+                          self.rng.getrandbits(32)):
+            self.wall_cells[cell[1] * self.width + cell[0]] = 1
+            self.walls.add(cell)
+
+    def fill_food(self, events):
+        while len(self.food) < self.food_count:
+            bonus, value = roll_food(self.rng)
+            cell = self.random_free()
+            if cell is None:
+                return
+            self.food[cell] = value
+            events.append(("food_added", cell, "bonus" if bonus else "food"))
+            if len(self.green) < self.food_count and self.rng.random() < GREEN_CHANCE:
+                green = self.random_free()
+                if green is not None:
+                    self.green[green] = self.timers.schedule(self.ticks(GREEN_FOOD_SECONDS * 1000),
+                                                             self.expire_green, green)
+                    events.append(("food_added", green, "green"))
+
+    def expire_green(self, events, cell):
+        if self.green.pop(cell, None) is not None:
+            events.append(("food_gone", cell))
+
+    def spawn(self, snake, events):
+        for _ in range(100):
+            x = self.rng.randrange(START_LENGTH - 1, self.width)
+            y = self.rng.randrange(self.height)
+            body = [(x - i, y) for i in range(START_LENGTH)]
+            if all(self.is_free(cell) for cell in body):
+                break
+        else:
+            snake.respawn_tick = self.tick + RESPAWN_TICKS
+            return False
+        snake.body = deque(body)
+        for cx, cy in body:
+            self.owner[cy * self.width + cx] = snake.sid + 1
+        snake.pending = 0
+        snake.direction = snake.new_direction = "Right"
+        snake.turns.clear()
+        snake.frozen = False
+        snake.alive = True
+        snake.target = None
+        events.append(("snake_spawn", snake.sid, tuple(body)))
+        return True
+
+    def local(self, snake):
+        return snake.sid < self.players
+
+    def kill(self, snake, reason, events):
+        for x, y in snake.body:
+            self.owner[y * self.width + x] = 0
+        snake.alive = False
+        snake.turns.clear()
+        snake.respawn_tick = self.tick + RESPAWN_TICKS
+        events.append(("snake_dead", snake.sid, reason))
+        if snake.extra_life and snake.active:
+            # Brought back once the tick's moves are done, so no planned head lands on the new body.
+            snake.extra_life = False
+            self.reviving.append((snake, reason))
+        elif not snake.bot:
+            self.death_reason = reason
+
+    def revive(self, events):
+        """Respawns snakes that died with an extra life, held still for a moment as in SnakeEngine."""
+        for snake, reason in self.reviving:
+            if not self.spawn(snake, events):
+                if not snake.bot:
+                    self.death_reason = reason
+                continue
+            snake.frozen = True
+            self.timers.schedule(self.ticks(RESPAWN_FREEZE_MS), self.unfreeze, snake)
+            if self.local(snake):
+                events.append(("respawn", reason))
+        self.reviving.clear()
+
+    def unfreeze(self, events, snake):
+        snake.frozen = False
+        if self.local(snake):
+            events.append(("resume",))
+
+    def add_player(self, events, color=None):
+        sid = len(self.snakes)
+        snake = ArenaSnake(sid, False, color or SNAKE_COLORS[sid % len(SNAKE_COLORS)], 30)
+        self.snakes.append(snake)
+        self.spawn(snake, events)
+        return sid
+
+    def remove_player(self, sid, events):
+        snake = self.snakes[sid]
+        snake.active = False
+        if snake.alive:
+            self.kill(snake, "left", events)
+
+    def set_direction(self, direction, sid=0):
+        # Queued like SnakeEngine.set_direction, each turn checked against the one before it.
+        snake = self.snakes[sid]
+        if not snake.alive or len(snake.turns) >= TURN_QUEUE:
+            return
+        last = snake.turns[-1] if snake.turns else snake.new_direction
+        if direction != last and direction != OPPOSITES[last]:
+            snake.turns.append(direction)
+
+    def choose_box(self, option):
+        if not self.awaiting_box:
+            return []
+        self.awaiting_box = False
+        events = []
+        open_box(self.snakes[self.box_sid], option, events)
+        return events
+
+    def bot_box(self, snake):
+        # Bots and network players have nobody to ask: an extra life first, then points and length.
+        return 1 if snake.extra_life else 2
+
+    def shoot(self, sid=0):
+        snake = self.snakes[sid]
+        if not self.running or self.awaiting_box or not snake.alive or not snake.shot_policy.allows(snake.score):
+            return []
+        head_x, head_y = snake.body[0]
+        dx, dy = DIRECTIONS[snake.direction]
+        pid = self.projectiles.add(head_x, head_y, dx, dy)
+        self.shooters[pid] = sid
+        snake.shot_policy.shot(snake.score)
+        events = self.hit_events = []
+        self.projectiles.advance_one(len(self.projectiles) - 1, self, 1, events, self.projectile_hit)
+        self.forget_projectiles(events)
+        return events
+
+    def teleport_ready(self, sid=0):
+        return not self.timers.pending(self.snakes[sid].teleport_timer)
+
+    def teleport(self, sid=0):
+        """Moves the whole snake so its head lands on a random free cell, like SnakeEngine.teleport().
+
+        Unlike the single-player board, every moved segment must land on a free
+        cell, since the owner array holds one snake per cell."""
+        snake = self.snakes[sid]
+        if not self.running or self.awaiting_box or not snake.alive or not self.teleport_ready(sid):
+            return []
+        old_x, old_y = snake.body[0]
+        for x, y in snake.body:
+            self.owner[y * self.width + x] = 0
+        for _ in range(100):
+            head = self.random_free()
+            if head is None:
+                break
+            moved = [(x + head[0] - old_x, y + head[1] - old_y) for x, y in snake.body]
+            moved = [cell for cell in moved if self.inside(cell)]
+            if all(self.is_free(cell) for cell in moved):
+                break
+        else:
+            head = None
+        if head is None:
+            moved = snake.body
+        for x, y in moved:
+            self.owner[y * self.width + x] = sid + 1
+        if head is None:
+            return []
+        snake.body = deque(moved)
+        snake.target = None
+        snake.teleport_timer = self.timers.schedule(self.ticks(self.teleport_cooldown * 1000),
+                                                    self.teleport_recharged, snake)
+        return [("snake_spawn", sid, tuple(moved))]
+
+    def teleport_recharged(self, events, snake):
+        if self.local(snake):
+            events.append(("teleport_ready",))
+
+    def projectile_hit(self, pid, x, y):
+        owner = self.owner[y * self.width + x]
+        if not owner or owner - 1 == self.shooters.get(pid):
+            return False
+        self.kill(self.snakes[owner - 1], "shot", self.hit_events)
+        return True
+
+    def forget_projectiles(self, events):
+        for event in events:
+            if event[0] == "pro_gone":
+                self.shooters.pop(event[1], None)
+
+    def steer(self, snake):
+        head_x, head_y = snake.body[0]
+        # Bots only aim for plain food; green food is eaten on the way, and aiming for it too would double the search.
+        if snake.target not in self.food:
+            snake.target = min(self.food, key=lambda c: abs(c[0] - head_x) + abs(c[1] - head_y), default=None)
+        target = snake.target
+        best, best_cost = None, None
+        for name, (dx, dy) in DIRECTIONS.items():
+            if name == OPPOSITES[snake.direction]:
+                continue
+            x, y = head_x + dx, head_y + dy
+            if not (0 <= x < self.width and 0 <= y < self.height):
+                continue
+            i = y * self.width + x
+            if self.owner[i] or self.wall_cells[i]:
+                continue
+            cost = self.rng.random() + self.head_danger(snake, x, y)
+            if target is not None:
+                cost += abs(target[0] - x) + abs(target[1] - y)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = name, cost
+        if best is not None:
+            snake.new_direction = best
+
+    def head_danger(self, snake, x, y):
+        # Another head next to the cell may move into it this very tick.
+        for dx, dy in DIRECTIONS.values():
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                owner = self.owner[ny * self.width + nx]
+                if owner and owner != snake.sid + 1 and self.snakes[owner - 1].body[0] == (nx, ny):
+                    return HEAD_DANGER
+        return 0
+
+    def wants_to_shoot(self, snake):
+        if not snake.shot_policy.allows(snake.score):
+            return False
+        x, y = snake.body[0]
+        dx, dy = DIRECTIONS[snake.direction]
+        for _ in range(BOT_SHOT_RANGE):
+            x += dx
+            y += dy
+            if not (0 <= x < self.width and 0 <= y < self.height):
+                return False
+            owner = self.owner[y * self.width + x]
+            if owner:
+                return owner - 1 != snake.sid
+        return False
+
+    def step(self, actions=None):
+        events = []
+        if not self.running or self.awaiting_box:
+            return events
+        for sid, action in (actions or {}).items():
+            if action == "shoot":
+                events += self.shoot(sid)
+            elif action == "teleport":
+                events += self.teleport(sid)
+            elif action in DIRECTIONS:
+                self.set_direction(action, sid)
+
+        self.tick += 1
+        self.timers.advance(events)
+        self.revive(events)
+        for snake in self.snakes:
+            if not snake.alive:
+                if snake.active and (snake.bot or self.respawn_players) and snake.respawn_tick <= self.tick:
+                    self.spawn(snake, events)
+            elif snake.bot and not snake.frozen:
+                if self.wants_to_shoot(snake):
+                    events += self.shoot(snake.sid)
+                self.steer(snake)
+
+        if self.projectiles:
+            self.hit_events = events
+            self.projectiles.advance(self, self.projectile_steps, events, self.projectile_hit)
+            self.forget_projectiles(events)
+
+        # Plan every move first so the outcome does not depend on snake order.
+        moves = []
+        heads = {}
+        for snake in self.snakes:
+            if snake.alive and not snake.frozen:
+                if snake.turns:
+                    snake.new_direction = snake.turns.popleft()
+                snake.direction = snake.new_direction
+                dx, dy = DIRECTIONS[snake.direction]
+                head_x, head_y = snake.body[0]
+                head = (head_x + dx, head_y + dy)
+                moves.append((snake, head))
+                heads[head] = heads.get(head, 0) + 1
+
+        dead = []
+        for snake, head in moves:
+            x, y = head
+            if not (0 <= x < self.width and 0 <= y < self.height):
+                dead.append((snake, "border"))
+                continue
+            i = y * self.width + x
+            if self.wall_cells[i]:
+                dead.append((snake, "wall"))
+            elif self.owner[i]:
+                dead.append((snake, "self" if self.owner[i] == snake.sid + 1 else "snake"))
+            elif heads[head] > 1:
+                dead.append((snake, "head"))
+        for snake, reason in dead:
+            self.kill(snake, reason, events)
+
+        for snake, head in moves:
+            if not snake.alive:
+                continue
+            self.owner[head[1] * self.width + head[0]] = snake.sid + 1
+            snake.body.appendleft(head)
+            events.append(("snake_head", snake.sid, head))
+            points = 0
+            if head in self.food:
+                points = self.food.pop(head)
+                snake.score += points
+                snake.grow(points - 1)
+            elif head in self.green:
+                self.timers.cancel(self.green.pop(head))
+                points = GREEN_VALUE
+                snake.score += points
+            if points:
+                events.append(("food_eaten", head, snake.sid, points))
+                milestone = new_milestone(snake)
+                if milestone is not None:
+                    if self.local(snake):
+                        self.awaiting_box = True
+                        self.box_sid = snake.sid
+                        events.append(("boxes", milestone))
+                    else:
+                        open_box(snake, self.bot_box(snake), [])
+            elif snake.pending:
+                snake.pending -= 1
+            else:
+                tail_x, tail_y = snake.body.pop()
+                self.owner[tail_y * self.width + tail_x] = 0
+                events.append(("snake_tail", snake.sid))
+        self.revive(events)
+        self.fill_food(events)
+
+        if self.players and not any(snake.alive for snake in self.snakes[:self.players]):
+            self.running = False
+            events.append(("death", self.death_reason))
+        return events
@@ -0,0 +1,212 @@
+from array import array
+from collections import deque
+
+from board import HIT_WALL
+from config import CHUNKED_MIN_CELLS
+from engine import DIRECTIONS
+
+WINDOW_MARGIN = 32
+MAX_WINDOW = 128
+SPACE_LIMIT = 256
+SHOT_RANGE = 4
+SHOT_DETOUR = 4
+UNREACHABLE = 1 << 30
+
+
+class DistanceField:
+    """Shortest distances to one target through everything but walls.
+
+    The snake's body is left out on purpose: it moves every tick, while walls and
+    the target only change on food pickup, regeneration or a shot. Huge boards get
+    a window around the target and the head instead of the whole grid."""
+
+    def __init__(self, board, target, near):
+        self.board = board
+        self.target = target
+        if board.width * board.height <= CHUNKED_MIN_CELLS:
+            self.x0, self.y0, self.x1, self.y1 = 0, 0, board.width, board.height
+        else:
+            self.x0 = max(0, min(target[0], near[0]) - WINDOW_MARGIN)
+            self.y0 = max(0, min(target[1], near[1]) - WINDOW_MARGIN)
+            self.x1 = min(board.width, max(target[0], near[0]) + WINDOW_MARGIN + 1)
+            self.y1 = min(board.height, max(target[1], near[1]) + WINDOW_MARGIN + 1)
+        self.width = self.x1 - self.x0
+        self.dist = array("i", [-1]) * (self.width * (self.y1 - self.y0))
+        if not board.is_wall(target):
+            self.dist[self.index(target)] = 0
+            self.spread(deque([target]))
+
+    @staticmethod
+    def fits(board, target, near):
+        if board.width * board.height <= CHUNKED_MIN_CELLS:
+            return True
+        return (abs(target[0] - near[0]) + 2 * WINDOW_MARGIN <= MAX_WINDOW
+                and abs(target[1] - near[1]) + 2 * WINDOW_MARGIN <= MAX_WINDOW)
+
+    def covers(self, cell):
+        return self.x0 <= cell[0] < self.x1 and self.y0 <= cell[1] < self.y1
+
+    def index(self, cell):
+        return (cell[1] - self.y0) * self.width + cell[0] - self.x0
+
+    def get(self, cell):
+        if not self.covers(cell):
+            return -1
+        return self.dist[self.index(cell)]
+
+    def spread(self, queue):
+        # Relaxing BFS: used for the initial build and again when a wall disappears.
+        dist = self.dist
+        is_wall = self.board.is_wall
+        x0, y0, x1, y1, width = self.x0, self.y0, self.x1, self.y1, self.width
+        while queue:
+            x, y = queue.popleft()
+            d = dist[(y - y0) * width + x - x0] + 1
+            for dx, dy in DIRECTIONS.values():
+                nx, ny = x + dx, y + dy
+                if not (x0 <= nx < x1 and y0 <= ny < y1):
+                    continue
+                i = (ny - y0) * width + nx - x0
+                if (dist[i] < 0 or dist[i] > d) and not is_wall((nx, ny)):
+                    dist[i] = d
+                    queue.append((nx, ny))
+
+    def open(self, cell):
+        if not self.covers(cell):
+            return
+        near = [self.get((cell[0] + dx, cell[1] + dy)) for dx, dy in DIRECTIONS.values()]
+        near = [d for d in near if d >= 0]
+        if near:
+            self.dist[self.index(cell)] = min(near) + 1
+            self.spread(deque([cell]))
+
+
+class Autopilot:
+    def __init__(self, engine):
+        self.engine = engine
+        self.fields = {}
+        self.board = None
+        self.walls_version = None
+
+    def field(self, target):
+        board = self.engine.board
+        if board is not self.board or board.walls_version != self.walls_version:
+            self.fields.clear()
+            self.board = board
+            self.walls_version = board.walls_version
+        head = board.body[0]
+        field = self.fields.get(target)
+        if field is None or not field.covers(head):
+            if not DistanceField.fits(board, target, head):
+                # Too far away on a huge board: head straight for it until a window fits.
+                self.fields.pop(target, None)
+                return None
+            field = self.fields[target] = DistanceField(board, target, head)
+        return field
+
+    def update(self, events):
+        for event in events:
+            if event[0] == "wall_removed" and self.board is self.engine.board:
+                for field in self.fields.values():
+                    field.open(event[1])
+                self.walls_version += 1
+
+    def targets(self):
+        engine = self.engine
+        targets = [engine.food]
+        if engine.food_green_active:
+            targets.append(engine.food_green)
+        return [target for target in targets if target is not None]
+
+    def space(self, start, limit):
+        hit = self.engine.board.hit
+        inside = self.engine.board.inside
+        seen = {start}
+        queue = deque([start])
+        while queue and len(seen) < limit:
+            x, y = queue.popleft()
+            for dx, dy in DIRECTIONS.values():
+                cell = (x + dx, y + dy)
+                if cell not in seen and inside(cell) and not hit(*cell):
+                    seen.add(cell)
+                    queue.append(cell)
+        return len(seen)
+
+    def moves(self):
+        engine = self.engine
+        board = engine.board
+        head_x, head_y = board.body[0]
+        moves = []
+        for name, (dx, dy) in DIRECTIONS.items():
+            cell = (head_x + dx, head_y + dy)
+            if board.inside(cell) and not board.hit(*cell):
+                moves.append((name, cell))
+        return moves
+
+    def choose(self):
+        engine = self.engine
+        if not engine.running or engine.awaiting_box or engine.frozen:
+            return None
+        targets = self.targets()
+        fields = [(target, self.field(target)) for target in targets]
+        for target in list(self.fields):
+            if target not in targets:
+                del self.fields[target]
+
+        moves = self.moves()
+        if not moves:
+            return "teleport" if engine.teleport_ready() else None
+
+        ranked = []
+        for name, cell in moves:
+            reach = [field.get(cell) if field else abs(target[0] - cell[0]) + abs(target[1] - cell[1])
+                     for target, field in fields]
+            reach = [d for d in reach if d >= 0]
+            ranked.append((min(reach) if reach else UNREACHABLE, name, cell))
+        ranked.sort()
+        if ranked[0][0] == UNREACHABLE and targets and engine.teleport_ready():
+            return "teleport"
+
+        need = min(len(engine.board.body) + 1, SPACE_LIMIT)
+        best, roomiest = None, 0
+        for d, name, cell in ranked:
+            room = self.space(cell, need)
+            if room >= need:
+                best = (d, name, cell)
+                break
+            if room > roomiest:
+                best, roomiest = (d, name, cell), room
+
+        d, name, cell = best
+        if name == engine.direction == engine.new_direction and self.worth_shooting(d, cell):
+            return "shoot"
+        return name
+
+    def worth_shooting(self, d, cell):
+        engine = self.engine
+        if not engine.shot_policy.allows(engine.score) or not self.targets():
+            return False
+        target = self.targets()[0]
+        detour = d - abs(target[0] - cell[0]) - abs(target[1] - cell[1])
+        if d != UNREACHABLE and detour < SHOT_DETOUR:
+            return False
+        dx, dy = DIRECTIONS[engine.direction]
+        x, y = engine.board.body[0]
+        for _ in range(SHOT_RANGE):
+            x += dx
+            y += dy
+            if not engine.board.inside((x, y)):
+                return False
+            hit = engine.board.hit(x, y)
+            if hit:
+                return hit == HIT_WALL
+        return False
+
+    def box(self):
+        # An extra life first; then growing by 10 only while the board has room for it, else a rewind charge.
+        engine = self.engine
+        if not engine.extra_life:
+            return 2
+        board = engine.board
+        room = engine.grid_width * engine.grid_height - len(board.walls)
+        return 1 if (len(board.body) + 10) * 2 < room else 4
@@ -0,0 +1,217 @@
+import numpy as np
+
+from config import DEFAULT_WIDTH, DEFAULT_HEIGHT
+from engine import DIRECTIONS, GREEN_FOOD_SECONDS, RESPAWN_FREEZE_MS, TURN_QUEUE
+from levels import level
+
+ACTIONS = tuple(DIRECTIONS)
+DX = np.array([DIRECTIONS[a][0] for a in ACTIONS])
+DY = np.array([DIRECTIONS[a][1] for a in ACTIONS])
+RIGHT = ACTIONS.index("Right")
+
+EMPTY, BODY, WALL, HEAD, FOOD, FOOD_BONUS, FOOD_GREEN = range(7)
+
+
+class BatchSnakeEnv:
+    def __init__(self, num_boards, grid_width=DEFAULT_WIDTH, grid_height=DEFAULT_HEIGHT, use_walls=False,
+                 box_choice=2, seed=None, tick_ms=100, level_style="scatter", wall_density=None):
+        self.num_boards = num_boards
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.cells = grid_width * grid_height
+        self.use_walls = use_walls
+        self.level_style = level_style
+        self.wall_density = wall_density
+        self.box_choice = box_choice
+        # Green food and the respawn freeze last the same number of ticks as in SnakeEngine.
+        self.green_ticks = max(1, -(-GREEN_FOOD_SECONDS * 1000 // tick_ms))
+        self.freeze_ticks = max(1, -(-RESPAWN_FREEZE_MS // tick_ms))
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.arange(num_boards)
+
+        self.grid = np.zeros((num_boards, self.cells), dtype=np.uint8)
+        self.body = np.zeros((num_boards, self.cells), dtype=np.int32)
+        self.head_ptr = np.zeros(num_boards, dtype=np.int64)
+        self.length = np.zeros(num_boards, dtype=np.int64)
+        self.pending = np.zeros(num_boards, dtype=np.int64)
+        self.direction = np.zeros(num_boards, dtype=np.int64)
+        self.turns = np.zeros((num_boards, TURN_QUEUE), dtype=np.int64)
+        self.queued = np.zeros(num_boards, dtype=np.int64)
+        self.walls = np.zeros((num_boards, self.cells), dtype=bool)
+        self.frozen_until = np.zeros(num_boards, dtype=np.int64)
+        self.food = np.full(num_boards, -1, dtype=np.int64)
+        self.food_value = np.ones(num_boards, dtype=np.int64)
+        self.green = np.full(num_boards, -1, dtype=np.int64)
+        self.green_due = np.zeros(num_boards, dtype=np.int64)
+        self.score = np.zeros(num_boards, dtype=np.int64)
+        self.last_milestone = np.zeros(num_boards, dtype=np.int64)
+        self.extra_life = np.zeros(num_boards, dtype=bool)
+        self.rewinds = np.zeros(num_boards, dtype=np.int64)
+        self.ticks = np.zeros(num_boards, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.restart(self.boards)
+        return self.observe()
+
+    def restart(self, boards):
+        self.score[boards] = 0
+        self.last_milestone[boards] = 0
+        self.extra_life[boards] = False
+        self.rewinds[boards] = 0
+        self.ticks[boards] = 0
+        self.frozen_until[boards] = 0
+        if self.use_walls:
+            self.build_levels(boards)
+        self.respawn(boards)
+
+    def build_levels(self, boards):
+        # Every game gets a 32-bit level seed like SnakeEngine's, and extra-life respawns keep its walls.
+        w = self.grid_width
+        keep = tuple((w // 2 - i, self.grid_height // 2) for i in range(-3, 3))
+        seeds = self.rng.integers(0, 1 << 32, size=boards.size)
+        self.walls[boards] = False
+        for board, seed in zip(boards, seeds):
+            cells = level(w, self.grid_height, self.level_style, self.wall_density, int(seed), keep)
+            if cells:
+                self.walls[board, [y * w + x for x, y in cells]] = True
+
+    def respawn(self, boards):
+        self.grid[boards] = np.where(self.walls[boards], WALL, EMPTY)
+        self.pending[boards] = 0
+        self.direction[boards] = RIGHT
+        self.queued[boards] = 0
+        self.food[boards] = -1
+        self.green[boards] = -1
+
+        y = self.grid_height // 2
+        x = self.grid_width // 2
+        start = np.array([y * self.grid_width + x - i for i in (2, 1, 0)])
+        self.body[boards, :3] = start
+        self.grid[boards[:, None], start] = BODY
+        self.head_ptr[boards] = 2
+        self.length[boards] = 3
+        self.spawn_food(boards)
+
+    def random_free(self, boards, exclude=None):
+        keys = self.rng.random((boards.size, self.cells))
+        keys[self.grid[boards] != EMPTY] = -1.0
+        if exclude is not None:
+            rows = np.nonzero(exclude >= 0)[0]
+            keys[rows, exclude[rows]] = -1.0
+        choice = keys.argmax(axis=1)
+        return np.where(keys[np.arange(boards.size), choice] >= 0, choice, -1)
+
+    def spawn_food(self, boards):
+        bonus = self.rng.random(boards.size) < 0.2
+        self.food_value[boards] = np.where(bonus, 5, 1)
+        food = self.random_free(boards)
+        self.food[boards] = food
+
+        has_green = (self.rng.random(boards.size) < 0.4) & (food >= 0)
+        self.green[boards] = -1
+        if has_green.any():
+            self.green[boards[has_green]] = self.random_free(boards[has_green], exclude=food[has_green])
+        self.green_due[boards] = self.ticks[boards] + self.green_ticks
+
+    def apply_box(self, boards):
+        if self.box_choice == 1:
+            self.score[boards] += 10
+            self.pending[boards] += 10
+        elif self.box_choice == 2:
+            self.extra_life[boards] = True
+        elif self.box_choice == 4:
+            # Boards cannot rewind; the charge is only counted, as SnakeEngine would have it.
+            self.rewinds[boards] += 1
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        n = self.boards
+        w = self.grid_width
+
+        self.queue_turns(actions)
+        self.ticks += 1
+        self.green[self.ticks >= self.green_due] = -1
+        # A respawned snake waits out its freeze; its turns stay queued.
+        awake = self.ticks >= self.frozen_until
+        turn = awake & (self.queued > 0)
+        self.direction = np.where(turn, self.turns[:, 0], self.direction)
+        self.turns[turn] = np.roll(self.turns[turn], -1, axis=1)
+        self.queued -= turn
+
+        head = self.body[n, self.head_ptr]
+        nx = head % w + DX[self.direction]
+        ny = head // w + DY[self.direction]
+        out = (nx < 0) | (nx >= w) | (ny < 0) | (ny >= self.grid_height)
+        cell = np.where(out, 0, ny * w + nx)
+        dead = awake & (out | (self.grid[n, cell] != EMPTY))
+        live = awake & ~dead
+
+        old_score = self.score.copy()
+        eat = live & (cell == self.food)
+        eat_green = live & ~eat & (cell == self.green)
+        self.score += np.where(eat, self.food_value, 0) + np.where(eat_green, 3, 0)
+        self.pending += np.where(eat, self.food_value - 1, 0)
+        self.green[eat_green] = -1
+
+        milestone = self.score // 30 * 30
+        box = live & (milestone >= 30) & (milestone > self.last_milestone)
+        self.last_milestone = np.where(box, milestone, self.last_milestone)
+        if box.any():
+            self.apply_box(np.nonzero(box)[0])
+
+        ate = eat | eat_green
+        move = live & ~box
+        pop = move & ~ate & (self.pending == 0)
+        self.pending -= move & ~ate & (self.pending > 0)
+
+        idx = np.nonzero(pop)[0]
+        tail = self.body[idx, (self.head_ptr[idx] - self.length[idx] + 1) % self.cells]
+        self.grid[idx, tail] = EMPTY
+        self.length += move & ~pop
+
+        idx = np.nonzero(move)[0]
+        self.head_ptr[idx] = (self.head_ptr[idx] + 1) % self.cells
+        self.body[idx, self.head_ptr[idx]] = cell[idx]
+        self.grid[idx, cell[idx]] = BODY
+
+        idx = np.nonzero(eat)[0]
+        if idx.size:
+            self.spawn_food(idx)
+
+        rewards = self.score - old_score
+        dones = np.zeros(self.num_boards, dtype=bool)
+        final_scores = np.zeros(self.num_boards, dtype=np.int64)
+        idx = np.nonzero(dead)[0]
+        if idx.size:
+            has_life = self.extra_life[idx]
+            lives = idx[has_life]
+            over = idx[~has_life]
+            if lives.size:
+                self.extra_life[lives] = False
+                self.respawn(lives)
+                self.frozen_until[lives] = self.ticks[lives] + self.freeze_ticks
+            if over.size:
+                dones[over] = True
+                final_scores[over] = self.score[over]
+                self.restart(over)
+
+        return self.observe(), rewards, dones, {"final_scores": final_scores}
+
+    def queue_turns(self, actions):
+        # Like SnakeEngine.set_direction: up to TURN_QUEUE turns, each checked against the one queued before it.
+        last = np.where(self.queued > 0, self.turns[self.boards, np.maximum(self.queued - 1, 0)], self.direction)
+        ok = (actions >= 0) & (self.queued < TURN_QUEUE) & (actions != last) & (actions != (last ^ 1))
+        idx = np.nonzero(ok)[0]
+        self.turns[idx, self.queued[idx]] = actions[idx]
+        self.queued[idx] += 1
+
+    def observe(self):
+        n = self.boards
+        obs = self.grid.copy()
+        obs[n, self.body[n, self.head_ptr]] = HEAD
+        has = self.food >= 0
+        obs[n[has], self.food[has]] = np.where(self.food_value[has] == 5, FOOD_BONUS, FOOD)
+        has = self.green >= 0
+        obs[n[has], self.green[has]] = FOOD_GREEN
+        return obs.reshape(self.num_boards, self.grid_height, self.grid_width)
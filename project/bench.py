@@ -0,0 +1,337 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from config import BENCH_DIR, CELL_SIZE, REWIND_BYTES, REWIND_SECONDS, VIEW_WIDTH, VIEW_HEIGHT
+from engine import SnakeEngine
+from levels import STYLES, level
+from main import SnakeGame
+from rasterizer import Rasterizer, png_bytes
+from records import RecordWriter
+from shared import BoardGrid
+
+THRESHOLD = 0.25
+ROUNDS = 5
+ROUND_SECONDS = 0.05
+GRIDS = ((10, 10), (20, 20), (30, 20), (50, 50), (200, 200), (1000, 1000))
+QUICK_GRIDS = ((10, 10), (30, 20), (50, 50))
+FILLS = (0, 50, 90, 99)
+RECORD_LINES = (1000, 100000, 1000000)
+QUICK_RECORD_LINES = (1000, 100000)
+# What the Z key takes back at the engine's default 100 ms tick.
+REWIND_TICKS = REWIND_SECONDS * 1000 // 100
+
+
+def measure(func, rounds=ROUNDS):
+    """Median milliseconds per call, with calls batched until a round takes ROUND_SECONDS."""
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= ROUND_SECONDS or calls >= 1 << 20:
+            break
+        calls *= 2
+    times = [elapsed / calls]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        times.append((time.perf_counter() - start) / calls)
+    return statistics.median(times) * 1000
+
+
+def cycle_direction(x, y, width, height):
+    # A Hamiltonian cycle for even heights: rows snake through columns 1.., column 0 leads back up.
+    if x == 0:
+        return "Up" if y > 0 else "Right"
+    if y % 2 == 0:
+        return "Right" if x < width - 1 else "Down"
+    if x > 1:
+        return "Left"
+    return "Down" if y < height - 1 else "Left"
+
+
+def cycle(width, height, start, count):
+    cells = []
+    x, y = start
+    for _ in range(count):
+        cells.append((x, y))
+        dx, dy = {"Up": (0, -1), "Down": (0, 1), "Left": (-1, 0), "Right": (1, 0)}[
+            cycle_direction(x, y, width, height)]
+        x, y = x + dx, y + dy
+    return cells
+
+
+def long_engine(width, height, length, use_walls=False, rewind_bytes=0):
+    """An engine whose snake runs on the Hamiltonian cycle, already `length` cells long."""
+    engine = SnakeEngine(width, height, use_walls, seed=1, rewind_bytes=rewind_bytes)
+    head = engine.board.body[0]
+    # The cycle runs head-first, so the body is the cycle walked backwards from the head.
+    path = cycle(width, height, head, width * height)
+    engine.board.set_snake([head] + path[:0:-1][:length - 1])
+    engine.direction = engine.new_direction = cycle_direction(*head, width, height)
+    if engine.history is not None:
+        engine.history.start(engine)
+    return engine
+
+
+def logic_cases(grids):
+    cases = {}
+    for width, height in grids:
+        area = width * height
+        for length in sorted({3, min(area // 4, 10000), min(area // 2, 50000)}):
+            engine = long_engine(width, height, length)
+            board = engine.board
+
+            def tick(engine=engine, board=board, length=length, width=width, height=height):
+                if engine.awaiting_box:
+                    engine.choose_box(3)
+                if len(board.body) > length + area // 8:
+                    board.set_snake(list(board.body)[:length])
+                x, y = board.body[0]
+                engine.step(cycle_direction(x, y, width, height))
+
+            cases[f"tick/{width}x{height}/len{length}"] = measure(tick)
+            assert engine.running, "the benchmark snake left its cycle"
+    return cases
+
+
+def free_cell_cases(grids):
+    cases = {}
+    for width, height in grids:
+        for fill in FILLS:
+            engine = long_engine(width, height, max(3, width * height * fill // 100))
+            cases[f"free_cell/{width}x{height}/{fill}%"] = measure(engine.get_free_cell)
+            cases[f"spawn_food/{width}x{height}/{fill}%"] = measure(engine.spawn_food)
+    return cases
+
+
+def rewind_cases(grids):
+    cases = {}
+    for width, height in grids:
+        area = width * height
+        for length in sorted({3, min(area // 2, 50000)}):
+            engine = long_engine(width, height, length, rewind_bytes=REWIND_BYTES)
+            board = engine.board
+
+            def tick(engine=engine, board=board, length=length, width=width, height=height):
+                if engine.awaiting_box:
+                    engine.choose_box(3)
+                if len(board.body) > length + area // 8:
+                    # Cut behind the history's back, so it starts over from here.
+                    board.set_snake(list(board.body)[:length])
+                    engine.history.start(engine)
+                x, y = board.body[0]
+                engine.step(cycle_direction(x, y, width, height))
+
+            cases[f"rewind/record/{width}x{height}/len{length}"] = measure(tick)
+            for _ in range(200):
+                tick()
+
+            def restore(engine=engine):
+                # Nothing to step back over: only the record's scalars are put back.
+                engine.history.restore(engine, engine.tick)
+
+            cases[f"rewind/restore/{width}x{height}/len{length}"] = measure(restore)
+
+            def back(engine=engine, tick=tick):
+                # A full in-game rewind: REWIND_TICKS ticks are recorded, then undone one record at a time.
+                # Subtract REWIND_TICKS times rewind/record for the cost of the undo alone.
+                for _ in range(REWIND_TICKS):
+                    tick()
+                engine.history.restore(engine, engine.tick - REWIND_TICKS)
+
+            cases[f"rewind/back{REWIND_TICKS}/{width}x{height}/len{length}"] = measure(back)
+            assert engine.running, "the benchmark snake left its cycle"
+    return cases
+
+
+def wall_cases(grids):
+    cases = {}
+    for width, height in grids:
+        if width * height > 250000:
+            continue
+        for style in STYLES:
+            # Bypass the level cache to time the generator itself.
+            cases[f"level/{style}/{width}x{height}"] = measure(lambda: level.__wrapped__(width, height, style))
+        engine = SnakeEngine(width, height, True, seed=1)
+        cases[f"generate_walls/{width}x{height}"] = measure(engine.generate_walls)
+    return cases
+
+
+def wait_for(writer, kind):
+    while True:
+        result = writer.results.get()
+        if result[0] == "error":
+            raise RuntimeError(result[2])
+        if result[0] == kind:
+            return result[2]
+
+
+def record_cases(sizes):
+    cases = {}
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        for lines in sizes:
+            text = os.path.join(directory, f"scores_{lines}.txt")
+            with open(text, "w", encoding="utf-8") as f:
+                for i in range(lines):
+                    f.write(f"Игрок{i % 50} | {rng.randint(0, 500)} | 0{i % 10}:00 | Средний\n")
+            writer = RecordWriter(os.path.join(directory, f"scores_{lines}.db"))
+            # Same round trips as SnakeGame.load_scores and update_records_table.
+            start = time.perf_counter()
+            writer.load(text)
+            wait_for(writer, "load")
+            cases[f"load_scores/{lines}"] = (time.perf_counter() - start) * 1000
+
+            def first_page():
+                writer.page()
+                wait_for(writer, "page")
+
+            cases[f"update_records_table/{lines}"] = measure(first_page)
+            writer.close()
+    return cases
+
+
+class View(SnakeGame):
+    """Just enough of SnakeGame to run its own draw code against a canvas."""
+
+    def __init__(self, canvas, renderer, engine):
+        self.canvas = canvas
+        self.renderer = renderer
+        self.engine = engine
+        self.arena = None
+
+
+def render_cases(grids):
+    import tkinter as tk
+    from renderer import BoardRenderer
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Отрисовка пропущена, нет дисплея ({e}); запустите через xvfb-run", file=sys.stderr)
+        return {}
+    root.withdraw()
+    canvas = tk.Canvas(root, width=VIEW_WIDTH * CELL_SIZE, height=VIEW_HEIGHT * CELL_SIZE)
+    renderer = BoardRenderer(canvas)
+    cases = {}
+    for width, height in grids:
+        engine = long_engine(width, height, min(width * height // 4, 2000), use_walls=True)
+        view = View(canvas, renderer, engine)
+        for mode in ("flat", "3d"):
+            renderer.set_3d(mode == "3d")
+
+            def redraw():
+                view.reset_view()
+                view.draw()
+                root.update_idletasks()
+
+            def draw():
+                view.draw()
+                root.update_idletasks()
+
+            cases[f"draw/{mode}/{width}x{height}/full"] = measure(redraw)
+            cases[f"draw/{mode}/{width}x{height}/steady"] = measure(draw)
+    root.destroy()
+    return cases
+
+
+def raster_cases(grids):
+    cases = {}
+    for width, height in grids:
+        area = width * height
+        if area > 250000:
+            continue
+        length = min(area // 4, 2000)
+        engine = long_engine(width, height, length)
+        board = engine.board
+        grid = BoardGrid(engine)
+        for mode in ("flat", "3d"):
+            raster = Rasterizer(width, height, is_3d=mode == "3d")
+            raster.draw_engine(grid, engine)
+
+            def tick(engine=engine, board=board, grid=grid, raster=raster):
+                if engine.awaiting_box:
+                    engine.choose_box(3)
+                if len(board.body) > length + area // 8:
+                    board.set_snake(list(board.body)[:length])
+                    grid.publish(engine)
+                x, y = board.body[0]
+                grid.apply(engine, engine.step(cycle_direction(x, y, width, height)))
+                raster.draw_engine(grid, engine)
+
+            cases[f"raster/{mode}/{width}x{height}/tick"] = measure(tick)
+            assert engine.running, "the benchmark snake left its cycle"
+        cases[f"raster/png/{width}x{height}"] = measure(lambda: png_bytes(raster.frame))
+    return cases
+
+
+def run(args):
+    grids = QUICK_GRIDS if args.quick else GRIDS
+    sizes = {"logic": grids, "free_cell": grids, "walls": grids, "draw": QUICK_GRIDS, "raster": grids, "rewind": grids,
+             "records": QUICK_RECORD_LINES if args.quick else RECORD_LINES}
+    results = {}
+    for name in args.only or SUITES:
+        for case, ms in SUITES[name](sizes[name]).items():
+            results[case] = ms
+            print(f"{case:40} {ms:10.4f} мс")
+    return results
+
+
+SUITES = {"logic": logic_cases, "free_cell": free_cell_cases, "walls": wall_cases, "records": record_cases,
+          "draw": render_cases, "raster": raster_cases, "rewind": rewind_cases}
+
+
+def compare(results, baseline, threshold):
+    """Cases slower than baseline * (1 + threshold), as (case, baseline_ms, ms)."""
+    return [(case, baseline[case], ms) for case, ms in results.items()
+            if case in baseline and ms > baseline[case] * (1 + threshold)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замеры производительности логики, рекордов и отрисовки")
+    parser.add_argument("--quick", action="store_true", help="без самых больших полей и файла на 1M строк")
+    parser.add_argument("--only", nargs="+", choices=list(SUITES), default=None)
+    parser.add_argument("--save", action="store_true", help="записать результаты как новый эталон")
+    parser.add_argument("--check", action="store_true", help="завершиться с ошибкой при регрессии")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--baseline", default=os.path.join(BENCH_DIR, "baseline.json"))
+    args = parser.parse_args()
+
+    results = run(args)
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    meta = {"python": sys.version.split()[0], "platform": sys.platform, "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+    with open(os.path.join(BENCH_DIR, time.strftime("%Y%m%d_%H%M%S") + ".json"), "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+
+    status = 0
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"Нет эталона {args.baseline}, сначала запустите с --save", file=sys.stderr)
+            status = 2
+        else:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+            slower = compare(results, baseline, args.threshold)
+            for case, before, after in slower:
+                print(f"РЕГРЕССИЯ {case}: {before:.4f} -> {after:.4f} мс (+{after / before - 1:.0%})", file=sys.stderr)
+            print(f"Сравнено с эталоном: {sum(case in baseline for case in results)} замеров, "
+                  f"регрессий {len(slower)} (порог {args.threshold:.0%})")
+            status = 1 if slower else 0
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": baseline}, f, ensure_ascii=False, indent=2)
+        print(f"Эталон записан: {args.baseline}")
+    sys.exit(status)
@@ -0,0 +1,315 @@
+from array import array
+from collections import deque
+
+from config import CHUNKED_MIN_CELLS
+
+HIT_SNAKE = 1
+HIT_WALL = 2
+CHUNK_SHIFT = 5
+CHUNK = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK - 1
+
+
+def make_board(width, height):
+    if width * height > CHUNKED_MIN_CELLS:
+        return ChunkedBoard(width, height)
+    return Board(width, height)
+
+
+class Board:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.body = deque()
+        self.pending = 0
+        self.snake_cells = bytearray(width * height)
+        self.wall_cells = bytearray(width * height)
+        self.walls = set()
+        self.walls_version = 0
+        self.free = list(range(width * height))
+        self.free_pos = array("i", range(width * height))
+
+    def inside(self, cell):
+        return 0 <= cell[0] < self.width and 0 <= cell[1] < self.height
+
+    def is_snake(self, cell):
+        return self.snake_cells[cell[1] * self.width + cell[0]]
+
+    def is_wall(self, cell):
+        return self.wall_cells[cell[1] * self.width + cell[0]]
+
+    def is_free(self, cell):
+        i = cell[1] * self.width + cell[0]
+        return not self.snake_cells[i] and not self.wall_cells[i]
+
+    def hit(self, x, y):
+        i = y * self.width + x
+        if self.snake_cells[i]:
+            return HIT_SNAKE
+        if self.wall_cells[i]:
+            return HIT_WALL
+        return 0
+
+    def walls_in(self, x0, y0, x1, y1):
+        return [cell for cell in self.walls if x0 <= cell[0] < x1 and y0 <= cell[1] < y1]
+
+    def occupy(self, i):
+        pos = self.free_pos[i]
+        if pos < 0:
+            return
+        last = self.free.pop()
+        if last != i:
+            self.free[pos] = last
+            self.free_pos[last] = pos
+        self.free_pos[i] = -1
+
+    def vacate(self, i):
+        if self.free_pos[i] < 0 and not self.snake_cells[i] and not self.wall_cells[i]:
+            self.free_pos[i] = len(self.free)
+            self.free.append(i)
+
+    def random_free(self, rng, exclude=()):
+        blocked = 0
+        for cell in exclude:
+            if cell is not None and self.inside(cell) and self.free_pos[cell[1] * self.width + cell[0]] >= 0:
+                blocked += 1
+        if len(self.free) <= blocked:
+            return None
+        while True:
+            i = self.free[rng.randrange(len(self.free))]
+            cell = (i % self.width, i // self.width)
+            if cell not in exclude:
+                return cell
+
+    def set_snake(self, cells):
+        for x, y in self.body:
+            self.snake_cells[y * self.width + x] = 0
+            self.vacate(y * self.width + x)
+        self.body.clear()
+        for x, y in cells:
+            i = y * self.width + x
+            if not self.snake_cells[i]:
+                self.snake_cells[i] = 1
+                self.occupy(i)
+                self.body.append((x, y))
+
+    def move(self, head, ate):
+        i = head[1] * self.width + head[0]
+        self.body.appendleft(head)
+        self.snake_cells[i] = 1
+        self.occupy(i)
+        if ate:
+            return None
+        if self.pending:
+            self.pending -= 1
+            return None
+        x, y = self.body.pop()
+        i = y * self.width + x
+        self.snake_cells[i] = 0
+        self.vacate(i)
+        return x, y
+
+    def unmove(self, tail):
+        """Takes back a move(): drops the head and puts back `tail`, the cell it returned, if any."""
+        x, y = self.body.popleft()
+        i = y * self.width + x
+        self.snake_cells[i] = 0
+        self.vacate(i)
+        if tail is not None:
+            i = tail[1] * self.width + tail[0]
+            self.body.append(tail)
+            self.snake_cells[i] = 1
+            self.occupy(i)
+
+    def grow(self, count):
+        self.pending += count
+
+    def add_wall(self, cell):
+        i = cell[1] * self.width + cell[0]
+        if not self.wall_cells[i]:
+            self.wall_cells[i] = 1
+            self.occupy(i)
+            self.walls.add(cell)
+            self.walls_version += 1
+
+    def remove_wall(self, cell):
+        i = cell[1] * self.width + cell[0]
+        self.wall_cells[i] = 0
+        self.vacate(i)
+        self.walls.discard(cell)
+        self.walls_version += 1
+
+    def clear_walls(self):
+        for x, y in self.walls:
+            self.wall_cells[y * self.width + x] = 0
+            self.vacate(y * self.width + x)
+        self.walls.clear()
+        self.walls_version += 1
+
+
+class Chunk:
+    __slots__ = ("snake", "wall", "used")
+
+    def __init__(self):
+        self.snake = bytearray(CHUNK * CHUNK)
+        self.wall = bytearray(CHUNK * CHUNK)
+        self.used = 0
+
+
+class ChunkedBoard:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.body = deque()
+        self.pending = 0
+        self.walls = set()
+        self.walls_version = 0
+        self.chunks = {}
+        self.used = 0
+
+    def inside(self, cell):
+        return 0 <= cell[0] < self.width and 0 <= cell[1] < self.height
+
+    def hit(self, x, y):
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            return 0
+        i = (y & CHUNK_MASK) << CHUNK_SHIFT | (x & CHUNK_MASK)
+        if chunk.snake[i]:
+            return HIT_SNAKE
+        if chunk.wall[i]:
+            return HIT_WALL
+        return 0
+
+    def is_snake(self, cell):
+        return self.hit(cell[0], cell[1]) == HIT_SNAKE
+
+    def is_wall(self, cell):
+        chunk = self.chunks.get((cell[0] >> CHUNK_SHIFT, cell[1] >> CHUNK_SHIFT))
+        return chunk is not None and chunk.wall[(cell[1] & CHUNK_MASK) << CHUNK_SHIFT | (cell[0] & CHUNK_MASK)]
+
+    def is_free(self, cell):
+        return not self.hit(cell[0], cell[1])
+
+    def mark(self, x, y, wall, value):
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if not value:
+                return
+            chunk = self.chunks[key] = Chunk()
+        i = (y & CHUNK_MASK) << CHUNK_SHIFT | (x & CHUNK_MASK)
+        layer = chunk.wall if wall else chunk.snake
+        if layer[i] == value:
+            return
+        before = chunk.snake[i] or chunk.wall[i]
+        layer[i] = value
+        after = chunk.snake[i] or chunk.wall[i]
+        if before != after:
+            delta = 1 if after else -1
+            chunk.used += delta
+            self.used += delta
+            if not chunk.used:
+                del self.chunks[key]
+
+    def random_free(self, rng, exclude=()):
+        blocked = 0
+        for cell in exclude:
+            if cell is not None and self.inside(cell) and self.is_free(cell):
+                blocked += 1
+        free = self.width * self.height - self.used
+        if free <= blocked:
+            return None
+        if free * 4 >= self.width * self.height:
+            while True:
+                cell = (rng.randrange(self.width), rng.randrange(self.height))
+                if self.is_free(cell) and cell not in exclude:
+                    return cell
+        while True:
+            cell = self.nth_free(rng.randrange(free))
+            if cell not in exclude:
+                return cell
+
+    def nth_free(self, n):
+        for cy in range((self.height + CHUNK_MASK) >> CHUNK_SHIFT):
+            rows = min(CHUNK, self.height - (cy << CHUNK_SHIFT))
+            for cx in range((self.width + CHUNK_MASK) >> CHUNK_SHIFT):
+                cols = min(CHUNK, self.width - (cx << CHUNK_SHIFT))
+                chunk = self.chunks.get((cx, cy))
+                free = rows * cols - (chunk.used if chunk else 0)
+                if n >= free:
+                    n -= free
+                    continue
+                for ly in range(rows):
+                    for lx in range(cols):
+                        i = ly << CHUNK_SHIFT | lx
+                        if chunk is None or not (chunk.snake[i] or chunk.wall[i]):
+                            if not n:
+                                return (cx << CHUNK_SHIFT | lx, cy << CHUNK_SHIFT | ly)
+                            n -= 1
+        return None
+
+    def set_snake(self, cells):
+        for x, y in self.body:
+            self.mark(x, y, False, 0)
+        self.body.clear()
+        for x, y in cells:
+            if not self.is_snake((x, y)):
+                self.mark(x, y, False, 1)
+                self.body.append((x, y))
+
+    def move(self, head, ate):
+        self.body.appendleft(head)
+        self.mark(head[0], head[1], False, 1)
+        if ate:
+            return None
+        if self.pending:
+            self.pending -= 1
+            return None
+        x, y = self.body.pop()
+        self.mark(x, y, False, 0)
+        return x, y
+
+    def unmove(self, tail):
+        x, y = self.body.popleft()
+        self.mark(x, y, False, 0)
+        if tail is not None:
+            self.body.append(tail)
+            self.mark(tail[0], tail[1], False, 1)
+
+    def grow(self, count):
+        self.pending += count
+
+    def add_wall(self, cell):
+        if cell not in self.walls:
+            self.mark(cell[0], cell[1], True, 1)
+            self.walls.add(cell)
+            self.walls_version += 1
+
+    def remove_wall(self, cell):
+        if cell in self.walls:
+            self.mark(cell[0], cell[1], True, 0)
+            self.walls.discard(cell)
+            self.walls_version += 1
+
+    def clear_walls(self):
+        for x, y in self.walls:
+            self.mark(x, y, True, 0)
+        self.walls.clear()
+        self.walls_version += 1
+
+    def walls_in(self, x0, y0, x1, y1):
+        found = []
+        for cy in range(y0 >> CHUNK_SHIFT, ((y1 - 1) >> CHUNK_SHIFT) + 1):
+            for cx in range(x0 >> CHUNK_SHIFT, ((x1 - 1) >> CHUNK_SHIFT) + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                i = chunk.wall.find(1)
+                while i >= 0:
+                    x = cx << CHUNK_SHIFT | (i & CHUNK_MASK)
+                    y = cy << CHUNK_SHIFT | (i >> CHUNK_SHIFT)
+                    if x0 <= x < x1 and y0 <= y < y1:
+                        found.append((x, y))
+                    i = chunk.wall.find(1, i + 1)
+        return found
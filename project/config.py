@@ -0,0 +1,36 @@
+
+CELL_SIZE = 20
+DEFAULT_WIDTH = 30
+DEFAULT_HEIGHT = 20
+GAME_SPEED = {"Лёгкий": 150, "Средний": 100, "Сложный": 50}
+LEVEL_STYLES = {"Случайные стены": "scatter", "Комнаты": "rooms", "Лабиринт": "maze", "Коридоры": "corridors"}
+SCORE_FILE = "scores.txt"
+RECORDS_DB = "scores.db"
+REPLAY_DIR = "replays"
+METRICS_DIR = "metrics"
+TOURNAMENT_DIR = "tournaments"
+BENCH_DIR = "benchmarks"
+SHARED_BOARD = "snake_board"
+THUMB_DIR = "thumbnails"
+THUMB_SIZE = 240
+STATE_DIR = "saves"
+REWIND_BYTES = 1 << 16
+REWIND_SECONDS = 3
+VIEW_WIDTH = 40
+VIEW_HEIGHT = 30
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+HUGE_MAX_SIZE = 5000
+CHUNKED_MIN_CELLS = 100 * 100
+
+COLORS = {
+    "bg": "#2e3440",
+    "snake": "#a3be8c",
+    "food": "#ebcb8b",
+    "food_bonus": "#ff8c00",
+    "food_green": "#00ff00",
+    "wall": "#5e81ac",
+    "text": "#eceff4",
+    "border": "#4c566a",
+    "snake_head": "#ff0000"
+}
@@ -0,0 +1,363 @@
+import random
+from collections import deque
+
+from board import HIT_SNAKE, HIT_WALL, make_board
+from config import DEFAULT_WIDTH, DEFAULT_HEIGHT
+from inputlog import BOX, DIRECTION, DIRECTION_CODES, REWIND, SHOOT, TELEPORT
+from levels import level
+from projectiles import Projectiles, ScoreShotPolicy
+from rewind import History
+from timers import TimerWheel
+
+DIRECTIONS = {"Up": (0, -1), "Down": (0, 1), "Left": (-1, 0), "Right": (1, 0)}
+OPPOSITES = {"Up": "Down", "Down": "Up", "Left": "Right", "Right": "Left"}
+TURN_QUEUE = 3
+# Timed effects (green food, the teleport cooldown, respawn freeze) are counted in ticks of
+# tick_ms: Ctrl speeds them up along with the snake, and replays repeat them exactly.
+GREEN_FOOD_SECONDS = 10
+RESPAWN_FREEZE_MS = 100
+BONUS_CHANCE = 0.2
+BONUS_VALUE = 5
+GREEN_CHANCE = 0.4
+GREEN_VALUE = 3
+BOX_EVERY = 30
+
+
+# Food and box rules, shared with the arena. A player is anything with score, processed_milestones,
+# extra_life, rewinds and grow(n): SnakeEngine itself or an ArenaSnake.
+
+def roll_food(rng):
+    """(bonus, value) for a new food."""
+    bonus = rng.random() < BONUS_CHANCE
+    return bonus, BONUS_VALUE if bonus else 1
+
+
+def new_milestone(player):
+    """The box milestone the player's score has just reached, or None; each one counts once."""
+    milestone = (player.score // BOX_EVERY) * BOX_EVERY
+    if milestone >= BOX_EVERY and milestone not in player.processed_milestones:
+        player.processed_milestones.add(milestone)
+        return milestone
+    return None
+
+
+def open_box(player, option, events):
+    events.append(("box", option))
+    if option == 1:
+        player.score += 10
+        player.grow(10)
+        events.append(("grow", 10))
+    elif option == 2:
+        player.extra_life = True
+    elif option == 4:
+        player.rewinds += 1
+
+
+class SnakeEngine:
+    def __init__(self, grid_width=DEFAULT_WIDTH, grid_height=DEFAULT_HEIGHT, use_walls=False, tick_ms=100,
+                 rng=None, shot_policy=None, seed=None, log=None, level_style="scatter", wall_density=None,
+                 rewind_bytes=0):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.use_walls = use_walls
+        self.level_style = level_style
+        self.wall_density = wall_density
+        self.tick_ms = tick_ms
+        self.seed = seed
+        self.rng = rng or random.Random(seed)
+        self.log = log
+        self.teleport_cooldown = 10
+        self.shot_policy = shot_policy or ScoreShotPolicy()
+        self.projectile_steps = max(1, round(tick_ms / 50))
+        self.projectiles = Projectiles()
+        self.turns = deque()
+        self.timers = TimerWheel()
+        # Rewinding is off unless asked for; the buffer costs a record per tick.
+        self.history = History(rewind_bytes) if rewind_bytes else None
+        self.reset()
+
+    def reset(self):
+        self.running = True
+        self.awaiting_box = False
+        self.tick = 0
+        self.score = 0
+        self.direction = "Right"
+        self.new_direction = "Right"
+        self.turns.clear()
+        self.timers.clear()
+        self.frozen = False
+        self.board = make_board(self.grid_width, self.grid_height)
+        self.board.set_snake(self.start_snake())
+        self.food = None
+        self.food_bonus = False
+        self.food_value = 1
+        self.food_green = None
+        self.food_green_active = False
+        self.green_timer = None
+        self.extra_life = False
+        self.rewinds = 0
+        self.freeze_timer = None
+        self.processed_milestones = set()
+        self.projectiles.clear()
+        self.shot_policy.reset()
+        self.teleport_timer = None
+        self.level = ()
+        if self.use_walls:
+            # Every game seed gets its own layout; respawns keep self.level and replays hit the level cache.
+            self.level = level(self.grid_width, self.grid_height, self.level_style, self.wall_density,
+                               self.rng.getrandbits(32), self.start_area())
+            self.generate_walls()
+        self.spawn_food()
+        if self.history is not None:
+            self.history.start(self)
+
+    def start_snake(self):
+        return [(self.grid_width // 2 - i, self.grid_height // 2) for i in range(3)]
+
+    def start_area(self):
+        # The start body and the first few cells in front of it stay free of walls.
+        return tuple((self.grid_width // 2 - i, self.grid_height // 2) for i in range(-3, 3))
+
+    def set_direction(self, direction, stamp=None):
+        """Queues a turn for a later tick, one turn per tick.
+
+        Each turn is checked against the one queued before it, so two presses
+        inside one tick both count and never fold the snake onto itself. `stamp`
+        is the perf_counter() of the key press; it comes back in a ("turn", stamp)
+        event on the tick the head moves that way."""
+        if not self.running or len(self.turns) >= TURN_QUEUE:
+            return
+        last = self.turns[-1][0] if self.turns else self.new_direction
+        if direction == last or direction == OPPOSITES[last]:
+            return
+        self.turns.append((direction, stamp))
+        if self.log is not None:
+            self.log.record(self.tick, DIRECTION, DIRECTION_CODES[direction])
+
+    def ticks(self, ms):
+        return max(1, -(-ms // self.tick_ms))
+
+    def get_free_cell(self, exclude=None):
+        return self.board.random_free(self.rng, exclude or ())
+
+    def grow(self, n):
+        self.board.grow(n)
+
+    def spawn_food(self):
+        self.food_bonus, self.food_value = roll_food(self.rng)
+        self.food = self.get_free_cell()
+
+        self.timers.cancel(self.green_timer)
+        if self.food is not None and self.rng.random() < GREEN_CHANCE:
+            self.food_green = self.get_free_cell(exclude=[self.food])
+            self.food_green_active = self.food_green is not None
+        else:
+            self.food_green = None
+            self.food_green_active = False
+        if self.food_green_active:
+            self.green_timer = self.timers.schedule(self.ticks(GREEN_FOOD_SECONDS * 1000), self.expire_green)
+
+    def expire_green(self, events):
+        self.food_green_active = False
+        events.append(("green",))
+
+    def generate_walls(self):
+        self.board.clear_walls()
+        for cell in self.level:
+            if not self.board.is_snake(cell) and cell != self.food:
+                self.board.add_wall(cell)
+
+    def step(self, action=None):
+        if action == "teleport":
+            # The jump happens before the tick, but views redraw it from the engine state,
+            # so its events go after the tick's own head and tail moves.
+            jump = self.teleport()
+            events = self.advance() + jump
+        else:
+            events = self.advance(action)
+        if self.history is not None:
+            self.history.record(self, events)
+        return events
+
+    def advance(self, action=None):
+        if action in DIRECTIONS:
+            self.set_direction(action)
+            events = []
+        elif action == "shoot":
+            events = self.shoot()
+        else:
+            events = []
+
+        if not self.running or self.awaiting_box:
+            return events
+
+        board = self.board
+        self.tick += 1
+        self.timers.advance(events)
+        if self.frozen:
+            return events
+        if self.projectiles:
+            self.projectiles.advance(board, self.projectile_steps, events)
+        stamp = None
+        if self.turns:
+            self.new_direction, stamp = self.turns.popleft()
+        self.direction = self.new_direction
+        dx, dy = DIRECTIONS[self.direction]
+        head_x, head_y = board.body[0]
+        head_x += dx
+        head_y += dy
+        head = (head_x, head_y)
+
+        if not (0 <= head_x < self.grid_width and 0 <= head_y < self.grid_height):
+            return self.die(events, "border")
+        hit = board.hit(head_x, head_y)
+        if hit == HIT_SNAKE:
+            return self.die(events, "self")
+        if hit == HIT_WALL:
+            return self.die(events, "wall")
+
+        ate = False
+        ate_food = False
+
+        if head == self.food:
+            self.score += self.food_value
+            if self.food_bonus:
+                board.grow(self.food_value - 1)
+                events.append(("grow", self.food_value - 1))
+            ate = ate_food = True
+
+        elif self.food_green_active and head == self.food_green:
+            self.score += GREEN_VALUE
+            self.food_green_active = False
+            self.timers.cancel(self.green_timer)
+            events.append(("green",))
+            ate = True
+
+        milestone = new_milestone(self)
+        if milestone is not None:
+            self.awaiting_box = True
+            if ate_food:
+                self.refill_food(events)
+            events.append(("boxes", milestone))
+            return events
+
+        tail = board.move(head, ate)
+        if tail is not None:
+            events.append(("tail", tail))
+        events.append(("head", head))
+        if stamp is not None:
+            events.append(("turn", stamp))
+        if ate_food:
+            self.refill_food(events)
+        return events
+
+    def refill_food(self, events):
+        self.spawn_food()
+        events.append(("food",))
+        if self.food is None:
+            events.append(("board_full",))
+
+    def die(self, events, reason):
+        if self.extra_life:
+            self.extra_life = False
+            self.respawn()
+            events.append(("respawn", reason))
+        else:
+            self.running = False
+            if self.log is not None:
+                self.log.finish(self.tick, self.score)
+            events.append(("death", reason))
+        return events
+
+    def respawn(self):
+        self.board.set_snake(self.start_snake())
+        self.board.pending = 0
+        self.direction = "Right"
+        self.new_direction = "Right"
+        self.turns.clear()
+        self.food = None
+        self.food_green = None
+        self.food_green_active = False
+        if self.use_walls:
+            self.generate_walls()
+        self.spawn_food()
+        # A short breather before the snake moves again, counted in ticks like everything else.
+        self.frozen = True
+        self.freeze_timer = self.timers.schedule(self.ticks(RESPAWN_FREEZE_MS), self.unfreeze)
+
+    def unfreeze(self, events):
+        self.frozen = False
+        events.append(("resume",))
+
+    def choose_box(self, option):
+        if not self.awaiting_box:
+            return []
+        self.awaiting_box = False
+        if self.log is not None:
+            self.log.record(self.tick, BOX, option)
+        events = []
+        open_box(self, option, events)
+        return events
+
+    def shoot(self):
+        if not self.running or self.awaiting_box:
+            return []
+        if not self.shot_policy.allows(self.score):
+            return []
+        head_x, head_y = self.board.body[0]
+        dx, dy = DIRECTIONS[self.direction]
+        self.projectiles.add(head_x, head_y, dx, dy)
+        self.shot_policy.shot(self.score)
+        if self.log is not None:
+            self.log.record(self.tick, SHOOT)
+        events = []
+        self.projectiles.advance_one(len(self.projectiles) - 1, self.board, 1, events)
+        if self.history is not None:
+            self.history.note(events)
+        return events
+
+    def teleport_ready(self):
+        return not self.timers.pending(self.teleport_timer)
+
+    def teleport(self):
+        if not self.running or self.awaiting_box:
+            return []
+        if not self.teleport_ready():
+            return []
+
+        new_pos = self.get_free_cell()
+        if new_pos is None:
+            return [("board_full",)]
+        old_head = self.board.body[0]
+        dx = new_pos[0] - old_head[0]
+        dy = new_pos[1] - old_head[1]
+
+        moved = [(x + dx, y + dy) for x, y in self.board.body]
+        self.board.set_snake([seg for seg in moved if self.board.inside(seg)])
+        self.teleport_timer = self.timers.schedule(self.ticks(self.teleport_cooldown * 1000), self.teleport_recharged)
+        if self.log is not None:
+            self.log.record(self.tick, TELEPORT)
+        if self.history is not None:
+            self.history.note([("teleport",)])
+        return [("teleport",)]
+
+    def teleport_recharged(self, events):
+        events.append(("teleport_ready",))
+
+    def rewind(self, ticks):
+        """Spends a rewind charge to go back `ticks` ticks, or as far as the history reaches.
+
+        Food and other random picks after the rewind come out differently,
+        since the random generator keeps going forward."""
+        if not self.running or self.awaiting_box or self.history is None or self.rewinds <= 0:
+            return []
+        tick = self.tick
+        if self.history.restore(self, tick - ticks) is None:
+            return []
+        self.rewinds -= 1
+        if self.log is not None:
+            self.log.record(tick, REWIND, min(ticks, 255))
+        events = [("rewind", tick - self.tick)]
+        if self.awaiting_box:
+            events.append(("boxes", max(self.processed_milestones)))
+        return events
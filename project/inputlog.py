@@ -0,0 +1,63 @@
+import struct
+
+from levels import STYLES
+
+MAGIC = b"SNKR"
+VERSION = 4
+HEADER = struct.Struct("<4sBQHHBHIi")
+INPUT = struct.Struct("<IBB")
+NOT_ENDED = 0xFFFFFFFF
+
+DIRECTION, SHOOT, TELEPORT, BOX, CTRL, REWIND = range(6)
+DIRECTION_CODES = {"Up": 0, "Down": 1, "Left": 2, "Right": 3}
+DIRECTION_NAMES = {code: name for name, code in DIRECTION_CODES.items()}
+
+
+class InputLog:
+    def __init__(self, seed, width, height, use_walls, tick_ms, level_style="scatter"):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.use_walls = use_walls
+        self.level_style = level_style
+        self.tick_ms = tick_ms
+        self.end_tick = NOT_ENDED
+        self.final_score = 0
+        self.data = bytearray()
+
+    def record(self, tick, code, arg=0):
+        self.data += INPUT.pack(tick, code, arg)
+
+    def finish(self, tick, score):
+        self.end_tick = tick
+        self.final_score = score
+
+    def inputs(self):
+        return INPUT.iter_unpack(self.data)
+
+    def to_bytes(self):
+        # The walls byte is 0 for no walls, otherwise the level style index + 1.
+        walls = STYLES.index(self.level_style) + 1 if self.use_walls else 0
+        header = HEADER.pack(MAGIC, VERSION, self.seed, self.width, self.height, walls, self.tick_ms,
+                             self.end_tick, self.final_score)
+        return header + self.data
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, seed, width, height, walls, tick_ms, end_tick, final_score = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a replay file")
+        log = cls(seed, width, height, bool(walls), tick_ms, STYLES[walls - 1] if walls else "scatter")
+        log.end_tick = end_tick
+        log.final_score = final_score
+        log.data = bytearray(data[HEADER.size:])
+        return log
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
@@ -0,0 +1,227 @@
+import random
+from functools import lru_cache
+
+STYLES = ("scatter", "rooms", "maze", "corridors")
+DENSITY = {"scatter": 0.02, "rooms": 0.7, "maze": 0.8, "corridors": 0.08}
+LEVEL_CACHE = 64
+ROOM_SIZE = 8
+MAZE_STEP = 3
+MAX_WALLS = 50000
+BORDER = -1
+# Neighbours clockwise from north; even positions share an edge with the cell.
+RING = ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1))
+
+
+class LevelBuilder:
+    """Adds walls one cell at a time and refuses any cell that would cut the free space in two.
+
+    Walls touching by edge or corner are kept in a union-find, with the board edge
+    as one extra member. A new wall can only split the free cells around it when
+    it joins two wall groups that are already connected elsewhere, so the check
+    costs one look at the eight neighbours instead of a flood fill."""
+
+    def __init__(self, width, height, keep=()):
+        self.width = width
+        self.height = height
+        self.keep = {y * width + x for x, y in keep}
+        self.parent = {BORDER: BORDER}
+        self.solid = bytearray(width * height)
+        self.offsets = [dy * width + dx for dx, dy in RING]
+        self.cells = []
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def add(self, x, y):
+        width = self.width
+        i = y * width + x
+        solid = self.solid
+        if solid[i] or i in self.keep:
+            return False
+        # Wall neighbours by index (the edge counts as BORDER), None where free.
+        if 0 < x < width - 1 and 0 < y < self.height - 1:
+            ring = [i + d if solid[i + d] else None for d in self.offsets]
+        else:
+            ring = []
+            for dx, dy in RING:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < self.height):
+                    ring.append(BORDER)
+                else:
+                    ring.append(ny * width + nx if solid[ny * width + nx] else None)
+        near = [j for j in ring if j is not None]
+        # With fewer than two wall neighbours nothing can be cut off.
+        if len(near) > 1 and self.splits(ring):
+            return False
+        parent = self.parent
+        parent[i] = i
+        solid[i] = 1
+        for j in near:
+            parent[self.find(j)] = i
+        self.cells.append((x, y))
+        return True
+
+    def splits(self, ring):
+        # Free edge neighbours joined through a free corner form one local group;
+        # the wall runs between groups must all belong to different wall groups.
+        groups = [k for k in range(0, 8, 2) if ring[k] is None and not (ring[k - 2] is None and ring[k - 1] is None)]
+        if len(groups) < 2:
+            return False
+        seen = set()
+        for k in groups:
+            j = k - 1
+            while ring[j] is None:
+                j -= 1
+            root = self.find(ring[j])
+            if root in seen:
+                return True
+            seen.add(root)
+        return False
+
+    def segment(self, x, y, dx, dy, length):
+        for n in range(length):
+            if 0 <= x < self.width and 0 <= y < self.height:
+                self.add(x, y)
+            x += dx
+            y += dy
+
+
+def scatter(builder, rng, density):
+    width = builder.width
+    for _ in range(min(round(width * builder.height * density), MAX_WALLS)):
+        y, x = divmod(rng.randrange(width * builder.height), width)
+        builder.add(x, y)
+
+
+def corridors(builder, rng, density):
+    width = builder.width
+    for _ in range(min(round(width * builder.height * density / 5), MAX_WALLS // 5)):
+        y, x = divmod(rng.randrange(width * builder.height), width)
+        dx, dy = ((1, 0), (0, 1))[rng.getrandbits(1)]
+        builder.segment(x, y, dx, dy, rng.randint(3, 8))
+
+
+class Lattice:
+    """Picks the segments between lattice posts for maze and rooms, with a union-find over posts.
+
+    Two lattice lines only meet at a post, so a segment is just an edge between
+    its end posts, where a post on the outer ring or a segment running off the
+    board counts as the edge of the board (BORDER). Taking only edges between
+    groups that were apart keeps the walls a forest hanging off the edge at
+    most once, so the free cells stay connected without looking at single
+    cells. A door cuts a segment into two stubs that each touch one end only,
+    so it never joins anything. Segments through a `keep` cell are skipped."""
+
+    def __init__(self, width, height, step, keep=()):
+        self.width = width
+        self.height = height
+        self.step = step
+        self.cols = (width + step - 1) // step
+        self.parent = {}
+        self.blocked = set()
+        for x, y in keep:
+            # A cell lies on at most one line each way, in one segment or, at a post, two.
+            for along, across, vertical in ((x, y, 0), (y, x, 1)):
+                if across % step:
+                    continue
+                for n in {along // step, (along - 1) // step}:
+                    if n >= 0:
+                        post = n * self.cols + across // step if vertical else (across // step) * self.cols + n
+                        self.blocked.add(post * 2 + vertical)
+        self.placed = set()
+        self.cells = []
+
+    def find(self, i):
+        parent = self.parent
+        while True:
+            p = parent.get(i, i)
+            if p == i:
+                return i
+            parent[i] = i = parent.get(p, p)
+
+    def post(self, cell):
+        if cell not in self.placed:
+            self.placed.add(cell)
+            self.cells.append(cell)
+
+    def place(self, index, door=None):
+        """Adds segment `index` (post * 2, + 1 when vertical) unless it would close a loop; `door` leaves
+        the two cells after it open."""
+        if index in self.blocked:
+            return False
+        width, height, step = self.width, self.height, self.step
+        post, vertical = divmod(index, 2)
+        py, px = divmod(post, self.cols)
+        x, y = px * step, py * step
+        if vertical:
+            size = min(step + 1, height - y)
+            on_edge = x in (0, width - 1)
+            first = BORDER if y == 0 or on_edge else post
+            last = BORDER if size <= step or y + step == height - 1 or on_edge else post + self.cols
+        else:
+            size = min(step + 1, width - x)
+            on_edge = y in (0, height - 1)
+            first = BORDER if x == 0 or on_edge else post
+            last = BORDER if size <= step or x + step == width - 1 or on_edge else post + 1
+        if door is None or door >= size:
+            spans = ((0, size),)
+            a, b = self.find(first), self.find(last)
+            if a == b and not on_edge:
+                return False
+            self.parent[a] = b
+        else:
+            spans = ((0, door), (door + 2, size))
+        for start, end in spans:
+            if start == 0:
+                self.post((x, y))
+                start = 1
+            if end == step + 1:
+                self.post((x, y + step) if vertical else (x + step, y))
+                end = step
+            if vertical:
+                self.cells.extend([(x, y + k) for k in range(start, end)])
+            else:
+                self.cells.extend([(x + k, y) for k in range(start, end)])
+        return True
+
+    def sample(self, rng, density, limit):
+        total = self.cols * ((self.height + self.step - 1) // self.step) * 2
+        return rng.sample(range(total), min(round(total * density), limit))
+
+
+def rooms(builder, rng, density):
+    for index in builder.sample(rng, density, MAX_WALLS // ROOM_SIZE):
+        post, vertical = divmod(index, 2)
+        y, x = divmod(post, builder.cols)
+        if (x if vertical else y) == 0:
+            continue
+        builder.place(index, rng.randrange(1, ROOM_SIZE - 1))
+
+
+def maze(builder, rng, density):
+    # Kruskal over the lattice posts: a wall between two posts that are already
+    # connected would close a loop, so that gap is left open as a passage.
+    for index in builder.sample(rng, density, MAX_WALLS // MAZE_STEP):
+        builder.place(index)
+
+
+PATTERNS = {"scatter": scatter, "rooms": rooms, "maze": maze, "corridors": corridors}
+LATTICE_STEP = {"rooms": ROOM_SIZE, "maze": MAZE_STEP}
+
+
+@lru_cache(maxsize=LEVEL_CACHE)
+def level(width, height, style="scatter", density=None, seed=0, keep=()):
+    """Wall cells for a board, as a tuple in placement order. The free cells stay connected.
+
+    `keep` lists cells that must stay free. Results are cached, so asking again
+    with the same arguments costs nothing."""
+    if style in LATTICE_STEP:
+        builder = Lattice(width, height, LATTICE_STEP[style], keep)
+    else:
+        builder = LevelBuilder(width, height, keep)
+    PATTERNS[style](builder, random.Random(seed), DENSITY[style] if density is None else density)
+    return tuple(builder.cells)
@@ -1,29 +1,28 @@
 
 import tkinter as tk
 from tkinter import ttk
-from tkinter.colorchooser import askcolor
-import tkinter.messagebox as msgbox
+import atexit
 import random
+import queue
 import time
 import os
 
-CELL_SIZE = 20
-DEFAULT_WIDTH = 30
-DEFAULT_HEIGHT = 20
-GAME_SPEED = {"Лёгкий": 150, "Средний": 100, "Сложный": 50}
-SCORE_FILE = "scores.txt"
-
-COLORS = {
-    "bg": "#2e3440",
-    "snake": "#a3be8c",
-    "food": "#ebcb8b",
-    "food_bonus": "#ff8c00",
-    "food_green": "#00ff00",  
-    "wall": "#5e81ac",
-    "text": "#eceff4",
-    "border": "#4c566a",
-    "snake_head": "#ff0000"
-}
+from config import (CELL_SIZE, DEFAULT_WIDTH, DEFAULT_HEIGHT, GAME_SPEED, SCORE_FILE, RECORDS_DB, REPLAY_DIR,
+                    METRICS_DIR, VIEW_WIDTH, VIEW_HEIGHT, HUGE_MAX_SIZE, SERVER_PORT, LEVEL_STYLES, COLORS,
+                    STATE_DIR, REWIND_BYTES, REWIND_SECONDS)
+from arena import ArenaEngine
+from autopilot import Autopilot
+from engine import SnakeEngine
+from netclient import NetClient, RemoteArena
+from inputlog import CTRL, InputLog
+from metrics import PerfMetrics
+from rasterizer import Thumbnail
+from records import PAGE_SIZE, RecordWriter, thumbnail_path
+from renderer import BoardRenderer
+from replay import ReplayPlayer
+from rewind import load_state, save_state
+from scheduler import GameScheduler
+from shared import BoardExport
 
 class SnakeGame:
     def __init__(self, root):
@@ -39,6 +38,7 @@ class SnakeGame:
 
         self.canvas = tk.Canvas(self.game_frame, bg=COLORS["bg"])
         self.canvas.pack()
+        self.renderer = BoardRenderer(self.canvas)
 
         self.status_bar = tk.Label(self.game_frame, font=("Arial", 12), bg=COLORS["bg"], fg=COLORS["text"])
         self.status_bar.pack(fill=tk.X)
@@ -49,30 +49,38 @@ class SnakeGame:
         self.running = False
         self.paused = False
         self.ctrl_pressed = False
-        self.direction = 'Right'
-        self.new_direction = 'Right'
-        self.score = 0
+        self.metrics = PerfMetrics()
+        self.perf_label = None
+        self.perf_updated = 0.0
+        self.share_board = False
+        self.board_export = None
+        self.scheduler = GameScheduler(self.root, self.game_loop, frame=self.on_frame)
+        self.scheduler.metrics = self.metrics
         self.level = "Средний"
         self.speed = GAME_SPEED[self.level]
-        self.snake = []
-        self.food = None
-        self.food_bonus = None
-        self.food_green = None
-        self.food_green_active = False
         self.player_name = "Игрок"
         self.snake_color = COLORS["snake"]
-        self.start_time = None
         self.elapsed_time = 0
         self.grid_width = DEFAULT_WIDTH
         self.grid_height = DEFAULT_HEIGHT
         self.use_walls = False
-        self.walls = []
-        self.extra_life = False
-        self.last_gift_score = 0
-        self.processed_milestones = set()
-        self.extra_life = False
-
-        self.records = []
+        self.level_style = "Случайные стены"
+        self.huge_world = False
+        self.arena_bots = 0
+        self.arena = None
+        self.server_address = ""
+        self.net = None
+        self.engine = SnakeEngine(self.grid_width, self.grid_height)
+        self.replay = None
+        self.last_replay = None
+        self.autopilot = None
+        self.theme_rng = random.Random()
+
+        self.records = None
+        self.records_token = 0
+        self.records_waiting = 0
+        self.records_poll = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.load_scores()
         self.bind_keys()
         self.show_player_setup()
@@ -82,88 +90,187 @@ class SnakeGame:
         self.show_legend()
         self.is_3d = False
 
-        self.pro = None
-        self.can_shoot = True
-        self.last_shot_score = 0
-
-        self.last_teleport_time = 0
-        self.teleport_cooldown = 10 
-
 
 
     def reset_scores(self):
+        import tkinter.messagebox as msgbox
         result = msgbox.askyesno("Подтверждение", "Вы точно уверены, что хотите сбросить рекорды?")
         if result:
             self.records.clear()
-            if os.path.exists(SCORE_FILE):
-                os.remove(SCORE_FILE)
             self.update_records_table()
 
     def setup_records_table(self):
+        self.records_after = None
+        self.records_exhausted = True
+        self.records_pending = False
         columns = ("Игрок", "Счёт", "Время", "Сложность")
         self.tree = ttk.Treeview(self.records_frame, columns=columns, show='headings')
         for col in columns:
             self.tree.heading(col, text=col)
             self.tree.column(col, anchor="center")
+        self.records_scroll = ttk.Scrollbar(self.records_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_records_scroll)
+        self.records_scroll.pack(side="right", fill="y")
+        self.thumb_image = None
+        self.thumb_label = tk.Label(self.records_frame, bg="white")
+        self.thumb_label.pack(side="bottom", pady=5)
         self.tree.pack(fill='both', expand=True)
+        self.tree.bind("<<TreeviewSelect>>", lambda e: self.show_thumbnail())
+
+    def show_thumbnail(self):
+        selected = self.tree.selection()
+        path = thumbnail_path(selected[0]) if selected else None
+        if path is None or not os.path.exists(path):
+            self.thumb_image = None
+            self.thumb_label.config(image="")
+            return
+        self.thumb_image = tk.PhotoImage(file=path)
+        self.thumb_label.config(image=self.thumb_image)
+
+    def on_records_scroll(self, first, last):
+        self.records_scroll.set(first, last)
+        if float(last) > 0.9 and not self.records_exhausted:
+            self.load_records_page()
 
     def update_records_table(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        sorted_scores = sorted(self.records, key=lambda x: x[1], reverse=True)
-        for row in sorted_scores:
-            self.tree.insert("", "end", values=row)
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self.records_after = None
+        self.records_exhausted = False
+        self.records_pending = False
+        self.records_token += 1
+        self.load_records_page()
+
+    def load_records_page(self):
+        if self.records_pending:
+            return
+        self.records_pending = True
+        self.records.page(after=self.records_after, token=self.records_token)
+        self.wait_for_records()
+
+    def wait_for_records(self):
+        self.records_waiting += 1
+        self.watch_records()
+
+    def watch_records(self):
+        # Polls until the writer is idle, so errors from saves nobody waits on still get shown.
+        if self.records_poll is None:
+            self.records_poll = self.root.after(50, self.poll_records)
+
+    def poll_records(self):
+        self.records_poll = None
+        errors = []
+        while True:
+            try:
+                kind, token, payload = self.records.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "error":
+                if payload not in errors:
+                    errors.append(payload)
+                if token is None:
+                    continue
+            self.records_waiting -= 1
+            if kind == "after":
+                token()
+                continue
+            if token != self.records_token:
+                continue
+            if kind == "load":
+                self.update_records_table()
+            elif kind == "page":
+                self.records_pending = False
+                for row in payload:
+                    # The row id is the item id, so equal records keep apart and their thumbnails are found by it.
+                    self.tree.insert("", "end", iid=str(row[0]), values=row[1:])
+                if payload:
+                    self.records_after = (payload[-1][2], payload[-1][0])
+                if len(payload) < PAGE_SIZE:
+                    self.records_exhausted = True
+            else:
+                self.records_pending = False
+        if (self.records_waiting > 0 or self.records.busy()) and self.records_poll is None:
+            self.records_poll = self.root.after(50, self.poll_records)
+        if errors:
+            import tkinter.messagebox as msgbox
+            msgbox.showerror("Рекорды", "Ошибка сохранения:\n" + "\n".join(errors))
 
     def load_scores(self):
-        if os.path.exists(SCORE_FILE):
-            with open(SCORE_FILE, "r", encoding="utf-8") as f:
-                for line in f:
-                    parts = line.strip().split(" | ")
-                    if len(parts) == 4:
-                        name, score, time_str, level = parts
-                        self.records.append((name, int(score), time_str, level))
-        self.update_records_table()
+        self.records = RecordWriter(RECORDS_DB)
+        atexit.register(self.records.close)
+        self.records.load(SCORE_FILE, token=self.records_token)
+        self.wait_for_records()
+
+    def on_close(self):
+        self.scheduler.stop()
+        if self.net is not None:
+            self.net.close()
+        self.close_board_export()
+        self.records.close()
+        self.root.destroy()
 
     def save_score(self):
         minutes = self.elapsed_time // 60
         seconds = self.elapsed_time % 60
         time_str = f"{minutes:02}:{seconds:02}"
-        record = (self.player_name, self.score, time_str, self.level)
-        self.records.append(record)
-        with open(SCORE_FILE, "a", encoding="utf-8") as f:
-            f.write(" | ".join(map(str, record)) + "\n")
+        record = (self.player_name, self.engine.score, time_str, self.level)
+        thumbnail = None
+        if not self.arena:
+            # Only the board is copied here; the PNG is drawn on the writer thread once the row has its id.
+            thumbnail = Thumbnail(self.engine, is_3d=self.renderer.is_3d, snake_color=self.snake_color).render
+        self.records.add(record, thumbnail)
         self.update_records_table()
+        self.watch_records()
 
     def bind_keys(self):
-        self.root.bind("<Up>", lambda e: self.set_direction("Up"))
-        self.root.bind("<Down>", lambda e: self.set_direction("Down"))
-        self.root.bind("<Left>", lambda e: self.set_direction("Left"))
-        self.root.bind("<Right>", lambda e: self.set_direction("Right"))
-        self.root.bind("<space>", lambda e: self.toggle_pause())
-        self.root.bind("<Return>", lambda e: self.new_game() if not self.running else None)
-        self.root.bind("<Control_L>", lambda e: self.set_ctrl(True))
-        self.root.bind("<KeyRelease-Control_L>", lambda e: self.set_ctrl(False))
-        self.root.bind("r", lambda e: self.randomize_theme())
-        self.root.bind("q", lambda e: self.toggle_3d_mode())
-        self.root.bind("w", lambda e: self.shoot_pro())
-        self.root.bind("e", lambda e: self.teleport())
+        self.bind_key("<Up>", lambda e: self.set_direction("Up"))
+        self.bind_key("<Down>", lambda e: self.set_direction("Down"))
+        self.bind_key("<Left>", lambda e: self.set_direction("Left"))
+        self.bind_key("<Right>", lambda e: self.set_direction("Right"))
+        self.bind_key("<space>", lambda e: self.toggle_pause())
+        self.bind_key("<Return>", lambda e: self.new_game() if not self.running else None)
+        self.bind_key("<Control_L>", lambda e: self.set_ctrl(True))
+        self.bind_key("<KeyRelease-Control_L>", lambda e: self.set_ctrl(False))
+        self.bind_key("r", lambda e: self.randomize_theme())
+        self.bind_key("q", lambda e: self.toggle_3d_mode())
+        self.bind_key("w", lambda e: self.shoot_pro())
+        self.bind_key("e", lambda e: self.teleport())
+        self.bind_key("p", lambda e: self.play_replay() if not self.running else None)
+        self.bind_key("m", lambda e: self.toggle_perf_overlay())
+        self.bind_key("a", lambda e: self.toggle_autopilot())
+        self.bind_key("b", lambda e: self.toggle_board_export())
+        self.bind_key("z", lambda e: self.rewind())
+        self.bind_key("<F5>", lambda e: self.save_game())
+        self.bind_key("<F9>", lambda e: self.load_game())
+
+    def bind_key(self, sequence, callback):
+        self.root.bind(sequence, self.metrics.timed("input", callback))
 
 
 
 
 
     def set_ctrl(self, pressed):
+        if self.replay:
+            return
+        if pressed != self.ctrl_pressed and self.running and self.engine.log is not None:
+            self.engine.log.record(self.engine.tick, CTRL, int(pressed))
         self.ctrl_pressed = pressed
+        self.scheduler.rate = 2 if pressed else 1
 
     def set_direction(self, dir):
-        opposites = {"Up": "Down", "Down": "Up", "Left": "Right", "Right": "Left"}
-        if self.running and dir != opposites.get(self.direction):
-            self.new_direction = dir
+        if not self.running or self.replay or self.autopilot:
+            return
+        if self.arena or self.paused:
+            self.engine.set_direction(dir)
+        else:
+            self.engine.set_direction(dir, time.perf_counter())
 
     def show_player_setup(self):
         setup = tk.Toplevel(self.root)
         setup.title("Настройки игрока")
-        setup.geometry("300x400")
+        setup.geometry("300x630")
         setup.configure(bg=COLORS["bg"])
         setup.grab_set()
 
@@ -174,6 +281,7 @@ class SnakeGame:
 
         tk.Label(setup, text="Цвет змейки:", bg=COLORS["bg"], fg=COLORS["text"]).pack(pady=5)
         def choose_color():
+            from tkinter.colorchooser import askcolor
             color = askcolor()[1]
             if color:
                 self.snake_color = color
@@ -199,156 +307,269 @@ class SnakeGame:
         wall_var = tk.BooleanVar(value=self.use_walls)
         tk.Checkbutton(setup, text="Добавить препятствия", variable=wall_var,
                        bg=COLORS["bg"], fg=COLORS["text"], selectcolor=COLORS["bg"]).pack(pady=5)
+        style_var = tk.StringVar(value=self.level_style)
+        tk.OptionMenu(setup, style_var, *LEVEL_STYLES.keys()).pack()
+
+        huge_var = tk.BooleanVar(value=self.huge_world)
+        tk.Checkbutton(setup, text=f"Большой мир (до {HUGE_MAX_SIZE}x{HUGE_MAX_SIZE})", variable=huge_var,
+                       bg=COLORS["bg"], fg=COLORS["text"], selectcolor=COLORS["bg"]).pack(pady=5)
+
+        arena_var = tk.BooleanVar(value=bool(self.arena_bots))
+        tk.Checkbutton(setup, text="Арена с ботами", variable=arena_var,
+                       bg=COLORS["bg"], fg=COLORS["text"], selectcolor=COLORS["bg"]).pack(pady=5)
+        tk.Label(setup, text="Число ботов:", bg=COLORS["bg"], fg=COLORS["text"]).pack()
+        bots_entry = tk.Entry(setup)
+        bots_entry.insert(0, str(self.arena_bots or 30))
+        bots_entry.pack()
+
+        tk.Label(setup, text="Сервер (адрес:порт), пусто - своя игра:", bg=COLORS["bg"], fg=COLORS["text"]).pack()
+        server_entry = tk.Entry(setup)
+        server_entry.insert(0, self.server_address)
+        server_entry.pack()
 
         def confirm():
             self.player_name = name_entry.get() or "Игрок"
             self.level = level_var.get()
             self.speed = GAME_SPEED[self.level]
-            self.grid_width = max(10, min(50, int(width_entry.get())))
-            self.grid_height = max(10, min(50, int(height_entry.get())))
+            self.huge_world = huge_var.get()
+            max_size = HUGE_MAX_SIZE if self.huge_world else 50
+            self.grid_width = max(10, min(max_size, int(width_entry.get())))
+            self.grid_height = max(10, min(max_size, int(height_entry.get())))
             self.use_walls = wall_var.get()
+            self.level_style = style_var.get()
+            self.arena_bots = max(1, min(500, int(bots_entry.get()))) if arena_var.get() else 0
+            self.server_address = server_entry.get().strip()
             setup.destroy()
             self.new_game()
 
         tk.Button(setup, text="Играть", command=confirm).pack(pady=20)
 
     def new_game(self):
-        self.canvas.config(width=self.grid_width * CELL_SIZE, height=self.grid_height * CELL_SIZE)
-        self.canvas.delete("all")
+        seed = random.getrandbits(64)
+        style = LEVEL_STYLES[self.level_style]
+        log = InputLog(seed, self.grid_width, self.grid_height, self.use_walls, self.speed, style)
+        self.replay = None
+        self.theme_rng = random.Random(seed)
+        if self.net is not None:
+            self.net.close()
+            self.net = None
+        if self.server_address:
+            self.join_server()
+            return
+        if self.arena_bots:
+            self.arena = ArenaEngine(self.grid_width, self.grid_height, self.arena_bots + 1, use_walls=self.use_walls,
+                                     tick_ms=self.speed, snake_color=self.snake_color, seed=seed, level_style=style)
+            self.start_engine(self.arena)
+            return
+        self.arena = None
+        self.start_engine(SnakeEngine(self.grid_width, self.grid_height, self.use_walls, tick_ms=self.speed,
+                                      seed=seed, log=log, level_style=style, rewind_bytes=REWIND_BYTES))
+
+    def join_server(self):
+        host, _, port = self.server_address.rpartition(":")
+        if not host:
+            host, port = port, SERVER_PORT
+        self.net = NetClient(host, int(port), self.snake_color)
+        try:
+            self.arena = RemoteArena(self.net)
+        except (ConnectionError, queue.Empty):
+            self.net = None
+            self.arena = None
+            import tkinter.messagebox as msgbox
+            msgbox.showerror("Сеть", f"Не удалось подключиться к {self.server_address}")
+            return
+        self.start_engine(self.arena)
+
+    def play_replay(self, path=None):
+        path = path or self.last_replay
+        if not path:
+            return
+        # The file may still be queued on the writer thread, so it is opened once the writer gets past it.
+        self.records.after(lambda: self.start_replay(path))
+        self.wait_for_records()
+
+    def start_replay(self, path):
+        self.replay = ReplayPlayer(InputLog.load(path))
+        self.arena = None
+        self.theme_rng = random.Random(self.replay.log.seed)
+        self.start_engine(self.replay.engine)
+
+    def start_engine(self, engine):
+        self.engine = engine
+        if self.autopilot and not self.arena:
+            self.autopilot = Autopilot(engine)
+        self.reset_view()
+        self.renderer.snake_color = self.snake_color
         self.running = True
         self.paused = False
-        self.score = 0
-        self.direction = "Right"
-        self.new_direction = "Right"
-        self.snake = [(self.grid_width // 2 - i, self.grid_height // 2) for i in range(3)]
-        self.start_time = time.time()
         self.elapsed_time = 0
-        self.spawn_food()
-        if self.use_walls:
-            self.generate_walls()
+        self.scheduler.played = 0.0
+        self.metrics.reset()
+        self.close_board_export()
+        if self.share_board and not self.arena:
+            self.open_board_export()
         self.draw()
         self.update_status()
-        self.update_timer()
-        self.game_loop()
+        self.scheduler.tick_ms = engine.tick_ms
+        self.scheduler.rate = 1
+        self.scheduler.start()
 
-    def get_free_cell(self, exclude=None):
-        exclude = exclude or []
-        while True:
-            cell = (random.randint(0, self.grid_width - 1), random.randint(0, self.grid_height - 1))
-            if cell not in self.snake and cell not in self.walls and cell not in exclude:
-                return cell
-
-    def spawn_food(self):
-        self.food_bonus = random.random() < 0.2
-        self.food_value = 5 if self.food_bonus else 1
-        self.food = self.get_free_cell()
-
-        
-        if random.random() < 0.4:
-            self.food_green = self.get_free_cell(exclude=[self.food])
-            self.food_green_active = True
-        else:
-            self.food_green = None
-            self.food_green_active = False
-
-    def generate_walls(self):
-        self.walls = []
-        total_walls = random.randint(10, 20)
-        for _ in range(total_walls):
-            x = random.randint(0, self.grid_width - 1)
-            y = random.randint(0, self.grid_height - 1)
-            if (x, y) not in self.snake and (x, y) != self.food:
-                self.walls.append((x, y))
+    def reset_view(self):
+        engine = self.engine
+        view_width = min(engine.grid_width, VIEW_WIDTH)
+        view_height = min(engine.grid_height, VIEW_HEIGHT)
+        self.canvas.config(width=view_width * CELL_SIZE, height=view_height * CELL_SIZE)
+        self.renderer.reset(engine.grid_width, engine.grid_height, view_width, view_height)
 
     def draw(self):
-        self.canvas.delete("all")
-        for i in range(self.grid_width):
-            self.canvas.create_line(i * CELL_SIZE, 0, i * CELL_SIZE, self.grid_height * CELL_SIZE, fill=COLORS["border"])
-        for j in range(self.grid_height):
-            self.canvas.create_line(0, j * CELL_SIZE, self.grid_width * CELL_SIZE, j * CELL_SIZE, fill=COLORS["border"])
-
-        for wall in self.walls:
-            x1 = wall[0] * CELL_SIZE
-            y1 = wall[1] * CELL_SIZE
-            x2 = x1 + CELL_SIZE
-            y2 = y1 + CELL_SIZE
-
-            if self.is_3d:
-                self.canvas.create_rectangle(x1 + 2, y1 + 2, x2 + 2, y2 + 2, fill="#111111", outline="")
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=COLORS["wall"], outline="#aaaaaa")
-            else:
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=COLORS["wall"], outline=COLORS["wall"])
-
-        for i, segment in enumerate(self.snake):
-            color = COLORS["snake_head"] if i == 0 else self.snake_color
-            x1 = segment[0] * CELL_SIZE
-            y1 = segment[1] * CELL_SIZE
-            x2 = x1 + CELL_SIZE
-            y2 = y1 + CELL_SIZE
-
-            if self.is_3d:
-                self.canvas.create_oval(x1 + 2, y1 + 2, x2 + 2, y2 + 2, fill="#222222", outline="")
-                self.canvas.create_oval(x1, y1, x2, y2, fill=color, outline="#999999" if i == 0 else "#555555")
-            else:
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline=color)
+        self.renderer.clear_overlay()
+        self.draw_board()
 
-        food_color = COLORS["food_bonus"] if self.food_bonus else COLORS["food"]
-        x1 = self.food[0] * CELL_SIZE
-        y1 = self.food[1] * CELL_SIZE
-        x2 = x1 + CELL_SIZE
-        y2 = y1 + CELL_SIZE
-
-        if self.is_3d:
-            self.canvas.create_oval(x1 + 2, y1 + 2, x2 + 2, y2 + 2, fill="#111111", outline="")
-            self.canvas.create_oval(x1, y1, x2, y2, fill=food_color, outline="gray")
-        else:
-            self.canvas.create_rectangle(x1, y1, x2, y2, fill=food_color, outline=food_color)
-        
-        if self.food:
-            x1 = self.food[0] * CELL_SIZE
-            y1 = self.food[1] * CELL_SIZE
-            x2 = x1 + CELL_SIZE
-            y2 = y1 + CELL_SIZE
-            food_color = COLORS["food_bonus"] if self.food_bonus else COLORS["food"]
-
-            if self.is_3d:
-                self.canvas.create_oval(x1 + 3, y1 + 3, x2 + 3, y2 + 3, fill="#222222", outline="")
-                self.canvas.create_oval(x1 - 2, y1 - 2, x2 + 2, y2 + 2, fill=food_color, outline="#ffffff")
-            else:
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=food_color, outline=food_color)
-
-        if self.food_green_active and self.food_green:
-            x1 = self.food_green[0] * CELL_SIZE
-            y1 = self.food_green[1] * CELL_SIZE
-            x2 = x1 + CELL_SIZE
-            y2 = y1 + CELL_SIZE
-
-            if self.is_3d:
-                self.canvas.create_oval(x1 + 3, y1 + 3, x2 + 3, y2 + 3, fill="#111111", outline="")
-                self.canvas.create_oval(x1 - 2, y1 - 2, x2 + 2, y2 + 2, fill=COLORS["food_green"], outline="#33ff33")
+    def draw_board(self):
+        engine = self.engine
+        if self.arena:
+            self.draw_arena()
+            return
+        self.renderer.follow(engine.board.body[0], engine.board)
+        self.renderer.set_walls(engine.board.walls_in(*self.renderer.visible()))
+        self.renderer.set_snake(engine.board.body)
+        self.renderer.set_food(engine.food, engine.food_bonus)
+        self.renderer.set_green(engine.food_green if engine.food_green_active else None)
+        self.renderer.set_projectiles(engine.projectiles.cells())
+
+    def draw_arena(self):
+        arena = self.arena
+        player = arena.snakes[arena.me]
+        if player.alive:
+            self.renderer.follow(player.body[0], arena)
+        self.renderer.set_walls(arena.walls_in(*self.renderer.visible()))
+        for snake in arena.snakes:
+            if snake.alive:
+                self.renderer.set_arena_snake(snake.sid, snake.body, snake.color)
             else:
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=COLORS["food_green"], outline=COLORS["food_green"])
-        if self.pro:
-            x = self.pro["x"] * CELL_SIZE
-            y = self.pro["y"] * CELL_SIZE
-            self.canvas.create_oval(x + 5, y + 5, x + 15, y + 15, fill="#ffcc00", outline="#ffaa00")
+                self.renderer.remove_arena_snake(snake.sid)
+        self.renderer.set_foods(arena.food_items())
+        self.renderer.set_projectiles(arena.projectiles.cells())
+
+    def apply_events(self, events):
+        engine = self.engine
+        if self.board_export is not None:
+            self.board_export.apply(engine, events)
+        for event in events:
+            kind = event[0]
+            if kind == "head":
+                self.renderer.clear_overlay()
+                self.renderer.add_head(event[1])
+                self.renderer.follow(event[1], engine.board)
+            elif kind == "turn":
+                self.metrics.add("input_lag", (time.perf_counter() - event[1]) * 1000)
+            elif kind == "tail":
+                self.renderer.remove_tail()
+            elif kind == "food":
+                self.renderer.set_food(engine.food, engine.food_bonus)
+                self.renderer.set_green(engine.food_green if engine.food_green_active else None)
+            elif kind == "green":
+                self.renderer.set_green(engine.food_green if engine.food_green_active else None)
+            elif kind == "pro":
+                self.renderer.place_projectile(event[1], event[2])
+            elif kind == "pro_gone":
+                self.renderer.remove_projectile(event[1])
+            elif kind == "wall_removed":
+                self.renderer.remove_wall(event[1])
+            elif kind == "rewind":
+                self.reset_view()
+                self.draw()
+                self.renderer.show_text("⏪", ("Arial", 20, "bold"), "#00ffcc")
+                self.update_status()
+            elif kind == "teleport":
+                self.renderer.set_snake(engine.board.body)
+                self.renderer.follow(engine.board.body[0], engine.board)
+                self.renderer.show_text("⚡", ("Arial", 20, "bold"), "#00ffcc")
+            elif kind == "snake_head":
+                self.renderer.add_arena_head(event[1], event[2])
+                if event[1] == engine.me:
+                    self.renderer.clear_overlay()
+                    self.renderer.follow(event[2], engine)
+            elif kind == "resync":
+                self.draw_board()
+            elif kind == "snake_tail":
+                self.renderer.remove_arena_tail(event[1])
+            elif kind == "snake_spawn":
+                self.renderer.set_arena_snake(event[1], event[2], engine.snakes[event[1]].color)
+            elif kind == "snake_dead":
+                self.renderer.remove_arena_snake(event[1])
+            elif kind == "food_added":
+                self.renderer.add_food(event[1], event[2])
+            elif kind in ("food_eaten", "food_gone"):
+                self.renderer.remove_food(event[1])
+            elif kind == "boxes":
+                if self.autopilot and not self.replay:
+                    self.apply_events(engine.choose_box(self.autopilot.box()))
+                elif not self.replay:
+                    self.pause_and_show_boxes()
+            elif kind == "respawn":
+                self.respawn_after_life()
+            elif kind == "resume":
+                self.renderer.clear_overlay()
+            elif kind == "death":
+                self.game_over()
 
     def update_status(self):
         self.status_bar.config(
-            text=f"Игрок: {self.player_name} | Счёт: {self.score} | Время: {self.elapsed_time} сек | Сложность: {self.level}"
+            text=f"Игрок: {self.player_name} | Счёт: {self.engine.score} | Время: {self.elapsed_time} сек | Сложность: {self.level}"
+                 + (" | Автопилот" if self.autopilot else "")
+                 + (f" | Перемотки: {self.engine.rewinds}" if not self.arena and self.engine.rewinds else "")
         )
 
-    def update_timer(self):
-        if self.running and not self.paused:
-            self.elapsed_time = int(time.time() - self.start_time)
+    def on_frame(self):
+        # The clock shows real time played: pauses stop it, Ctrl does not speed it up.
+        seconds = int(self.scheduler.played // 1000)
+        if seconds != self.elapsed_time:
+            self.elapsed_time = seconds
             self.update_status()
-            self.root.after(1000, self.update_timer)
-        
+        if self.perf_label is not None and time.perf_counter() - self.perf_updated > 0.5:
+            self.update_perf_overlay()
+
+    def toggle_perf_overlay(self):
+        if self.perf_label is None:
+            self.perf_label = tk.Label(self.game_frame, font=("Courier", 9), justify="left", bg="#000000",
+                                       fg="#00ff00")
+            self.perf_label.place(x=0, y=0)
+            self.update_perf_overlay()
+        else:
+            self.perf_label.destroy()
+            self.perf_label = None
+
+    def toggle_board_export(self):
+        self.share_board = not self.share_board
+        self.close_board_export()
+        if self.share_board and not self.arena:
+            self.open_board_export()
+
+    def open_board_export(self):
+        try:
+            self.board_export = BoardExport(self.engine)
+        except FileExistsError:
+            # Another game is exporting under the same name; leave it alone.
+            self.share_board = False
+            import tkinter.messagebox as msgbox
+            msgbox.showerror("Экспорт поля", "Общая память уже занята другой игрой")
+
+    def close_board_export(self):
+        if self.board_export is not None:
+            self.board_export.close()
+            self.board_export = None
+
+    def update_perf_overlay(self):
+        self.perf_updated = time.perf_counter()
+        self.metrics.canvas_items = len(self.canvas.find_all())
+        self.perf_label.config(text=self.metrics.overlay_text())
+
     def pause_and_show_boxes(self):
         self.paused = True
         popup = tk.Toplevel(self.root)
         popup.title("Выбор шкатулки")
-        popup.geometry("300x220")
+        popup.geometry("300x260")
         popup.configure(bg=COLORS["bg"])
         popup.grab_set()
 
@@ -359,24 +580,23 @@ class SnakeGame:
         result_label.pack(pady=5)
 
         def choose_box(option):
+            self.apply_events(self.engine.choose_box(option))
             if option == 1:
-                self.score += 10
-                tail = self.snake[-1]
-                self.snake.extend([tail] * 10)
                 result_text = "Вы выбрали Шкатулку 1: +10 очков и +10 длины"
             elif option == 2:
-                self.extra_life = True
                 result_text = "Вы выбрали Шкатулку 2: вторая жизнь"
             elif option == 3:
                 result_text = "Вы выбрали Шкатулку 3: смерть"
                 result_label.config(text=result_text)
                 popup.after(1500, lambda: [popup.destroy(), self.resume_or_die()])
                 return
+            elif option == 4:
+                result_text = f"Вы выбрали Шкатулку 4: перемотка на {REWIND_SECONDS} с (клавиша Z)"
 
             result_label.config(text=result_text)
             popup.after(1500, lambda: [popup.destroy(), self.resume_or_die()])
 
-        for i in range(1, 4):
+        for i in range(1, 5):
             btn = tk.Button(popup, text=f"Шкатулка {i}", command=lambda opt=i: choose_box(opt))
             btn.pack(pady=5)
 
@@ -385,114 +605,84 @@ class SnakeGame:
             return
         self.paused = False
         self.update_status()
-        self.update_timer()
-        self.game_loop()
+        self.scheduler.start()
 
     def game_loop(self):
         if self.paused or not self.running:
+            self.scheduler.stop()
             return
 
-        self.direction = self.new_direction
-        head_x, head_y = self.snake[0]
-
-        if self.direction == "Up": head_y -= 1
-        elif self.direction == "Down": head_y += 1
-        elif self.direction == "Left": head_x -= 1
-        elif self.direction == "Right": head_x += 1
-
-        if head_x < 0 or head_x >= self.grid_width or head_y < 0 or head_y >= self.grid_height:
-            self.game_over()
-            return
-
+        start = time.perf_counter()
+        if self.replay:
+            # Teleports and rewinds are drawn from the engine state, so they go on screen before the next tick.
+            self.apply_events(self.replay.apply_inputs())
+            events = self.replay.advance()
+        elif self.autopilot:
+            events = self.engine.step(self.autopilot.choose())
+            self.autopilot.update(events)
+        else:
+            events = self.engine.step()
+        stepped = time.perf_counter()
+        self.apply_events(events)
+        self.metrics.add("logic", (stepped - start) * 1000)
+        self.metrics.add("draw", (time.perf_counter() - stepped) * 1000)
+        if self.replay:
+            self.scheduler.rate = 2 if self.replay.ctrl else 1
+            if self.running and self.replay.finished():
+                self.game_over()
+        if self.paused or not self.running:
+            self.scheduler.stop()
 
-        if (head_x, head_y) in self.snake or (head_x, head_y) in self.walls:
-            self.game_over()
+    def game_over(self):
+        self.running = False
+        if self.replay:
+            self.renderer.show_text(f"Повтор окончен\nСчёт: {self.engine.score}", ("Arial", 24), COLORS["text"])
             return
-
-        ate = False
-
-        if (head_x, head_y) == self.food:
-            self.score += self.food_value
-            if self.food_bonus:
-                self.snake.extend([(self.snake[-1][0], self.snake[-1][1])] * (self.food_value - 1))
-            self.spawn_food()
-            ate = True
-
-        elif self.food_green_active and (head_x, head_y) == self.food_green:
-            self.score += 3
-            self.food_green_active = False
-            ate = True
-
-        milestone = (self.score // 30) * 30
-        if milestone >= 30 and milestone not in self.processed_milestones:
-            self.processed_milestones.add(milestone)
-            self.pause_and_show_boxes()
+        self.save_score()
+        self.save_replay()
+        if self.perf_label is not None:
+            self.export_metrics()
+        self.renderer.show_text(f"Игра окончена!\nСчёт: {self.engine.score}", ("Arial", 24), COLORS["text"])
+
+    def save_replay(self):
+        if self.engine.log is None:
             return
+        path = os.path.join(REPLAY_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{self.engine.seed}.snr")
+        self.records.save_file(path, self.engine.log.to_bytes())
+        self.last_replay = path
+        self.watch_records()
+
+    def export_metrics(self):
+        self.metrics.canvas_items = len(self.canvas.find_all())
+        name = f"{time.strftime('%Y%m%d_%H%M%S')}_{self.engine.grid_width}x{self.engine.grid_height}"
+        meta = {"level": self.level, "width": self.engine.grid_width, "height": self.engine.grid_height,
+                "walls": self.engine.use_walls, "score": self.engine.score, "ticks": self.engine.tick}
+        # Only the samples are copied here; the writer thread formats and writes both files.
+        export = self.metrics.snapshot(meta)
+        base = os.path.join(METRICS_DIR, name)
+        self.records.render_file(base + ".json", export.json)
+        self.records.render_file(base + ".csv", export.csv)
+        self.watch_records()
 
-        if not ate:
-            self.snake.pop()
-
-        self.snake = [(head_x, head_y)] + self.snake
-        self.draw()
-
-        delay = self.speed if not self.ctrl_pressed else max(10, self.speed // 2)
-        self.root.after(delay, self.game_loop)
-
-    def game_over(self):
-        if self.extra_life:
-            self.extra_life = False
-            self.respawn_after_life()
-        else:
-            self.running = False
-            self.save_score()
-            self.canvas.create_text(
-                self.grid_width * CELL_SIZE // 2,
-                self.grid_height * CELL_SIZE // 2,
-                text=f"Игра окончена!\nСчёт: {self.score}",
-                font=("Arial", 24), fill=COLORS["text"]
-            )
     def respawn_after_life(self):
-        self.canvas.delete("all")
-        self.canvas.create_text(
-            self.grid_width * CELL_SIZE // 2,
-            self.grid_height * CELL_SIZE // 2,
-            text="⚡ Вы воскресли! ⚡",
-            font=("Arial", 28, "bold"),
-            fill="#00ffcc"
-        )
-
-        self.root.after(100, self._continue_after_effect)
-        
-    def _continue_after_effect(self):
-        self.snake = [(self.grid_width // 2 - i, self.grid_height // 2) for i in range(3)]
-        self.direction = "Right"
-        self.new_direction = "Right"
-        self.food = None
-        self.food_green = None
-        self.food_green_active = False
-        if self.use_walls:
-            self.generate_walls()
-        self.spawn_food()
+        # The engine holds the snake still for a few ticks and sends "resume" when it moves again.
+        self.reset_view()
         self.draw()
+        self.renderer.show_text("⚡ Вы воскресли! ⚡", ("Arial", 28, "bold"), "#00ffcc")
         self.update_status()
-        self.update_timer()
-        self.game_loop()
 
     def toggle_pause(self):
         if self.running:
             self.paused = not self.paused
             if self.paused:
-                self.canvas.create_text(
-                    self.grid_width * CELL_SIZE // 2, self.grid_height * CELL_SIZE // 2,
-                    text="Пауза", font=("Arial", 30), fill=COLORS["text"]
-                )
+                self.scheduler.stop()
+                self.renderer.show_text("Пауза", ("Arial", 30), COLORS["text"])
             else:
-                self.update_timer()
-                self.game_loop()
+                self.scheduler.start()
     def show_legend(self):
         legend_text = (
             "Управление: ← ↑ ↓ → - движение | "
-            "Пробел - пауза | Enter - новая игра | Ctrl - ускорение | R - смена фона | W - выстрел | Q - изменение формы змейки | E - телепорт (кд 45с)"
+            "Пробел - пауза | Enter - новая игра | Ctrl - ускорение | R - смена фона | W - выстрел | Q - изменение формы змейки | E - телепорт (кд 10с игрового времени) | P - повтор | M - метрики | A - автопилот | B - экспорт поля | Z - перемотка назад | F5 - сохранить | F9 - загрузить"
         )
         self.legend_label = tk.Label(
             self.game_frame, text=legend_text,
@@ -501,7 +691,7 @@ class SnakeGame:
         self.legend_label.pack(fill=tk.X, side=tk.BOTTOM)
     def randomize_theme(self):
         def random_color():
-            return "#%06x" % random.randint(0, 0xFFFFFF)
+            return "#%06x" % self.theme_rng.randint(0, 0xFFFFFF)
 
         COLORS["bg"] = random_color()
         COLORS["text"] = random_color()
@@ -513,7 +703,8 @@ class SnakeGame:
         COLORS["wall"] = random_color()
         COLORS["border"] = random_color()
 
-        self.snake_color = COLORS["snake"] 
+        self.snake_color = COLORS["snake"]
+        self.renderer.snake_color = self.snake_color
 
         self.game_frame.config(bg=COLORS["bg"])
         self.canvas.config(bg=COLORS["bg"])
@@ -521,78 +712,59 @@ class SnakeGame:
         if hasattr(self, 'legend_label'):
             self.legend_label.config(bg=COLORS["bg"], fg=COLORS["text"])
 
-        self.draw()
+        self.renderer.restyle()
+        self.update_status()
+
+    def toggle_autopilot(self):
+        if self.arena:
+            return
+        self.autopilot = None if self.autopilot else Autopilot(self.engine)
         self.update_status()
 
     def toggle_3d_mode(self):
         self.is_3d = not self.is_3d
-        self.draw()
+        self.renderer.set_3d(self.is_3d)
+        self.draw_board()
+        self.canvas.tag_raise("overlay")
     
     def shoot_pro(self):
-        if not self.running or self.paused:
-            return
-        if self.score - self.last_shot_score < 30:
-            return 
-        head_x, head_y = self.snake[0]
-        dx, dy = 0, 0
-        if self.direction == "Up":
-            dy = -1
-        elif self.direction == "Down":
-            dy = 1
-        elif self.direction == "Left":
-            dx = -1
-        elif self.direction == "Right":
-            dx = 1
-        self.pro = {"x": head_x, "y": head_y, "dx": dx, "dy": dy}
-
-        self.last_shot_score = self.score
-        self.animate_pro()
-    
-    def animate_pro(self):
-        if not self.pro:
+        if not self.running or self.paused or self.replay:
             return
+        self.apply_events(self.engine.shoot())
 
-        x = self.pro["x"] + self.pro["dx"]
-        y = self.pro["y"] + self.pro["dy"]
+    def teleport(self):
+        if not self.running or self.paused or self.replay:
+            return
+        self.apply_events(self.engine.teleport())
 
-        if x < 0 or x >= self.grid_width or y < 0 or y >= self.grid_height:
-            self.pro = None
+    def rewind(self):
+        if not self.running or self.paused or self.replay or self.arena:
             return
+        self.apply_events(self.engine.rewind(self.engine.ticks(REWIND_SECONDS * 1000)))
 
-        if (x, y) in self.walls:
-            self.walls.remove((x, y))
-            self.pro = None
-            self.draw()
+    def save_game(self):
+        if not self.running or self.paused or self.replay or self.arena:
             return
+        self.records.save_file(os.path.join(STATE_DIR, "quicksave.sns"), save_state(self.engine))
+        self.watch_records()
+        self.renderer.show_text("Игра сохранена", ("Arial", 20, "bold"), COLORS["text"])
 
-        self.pro["x"] = x
-        self.pro["y"] = y
-        self.draw()
-        self.root.after(50, self.animate_pro)
-    def teleport(self):
-        if not self.running or self.paused:
+    def load_game(self):
+        if self.arena or self.replay:
             return
+        # A quicksave may still be queued on the writer thread; load once the writer gets past it.
+        self.records.after(self.load_quicksave)
+        self.wait_for_records()
 
-        now = time.time()
-        if now - self.last_teleport_time < self.teleport_cooldown:
-            return  
-
-        new_pos = self.get_free_cell()
-        old_head = self.snake[0]
-        dx = new_pos[0] - old_head[0]
-        dy = new_pos[1] - old_head[1]
-
-        self.snake = [(x + dx, y + dy) for x, y in self.snake]
-        self.snake = [seg for seg in self.snake if 0 <= seg[0] < self.grid_width and 0 <= seg[1] < self.grid_height]
-        self.last_teleport_time = now
-        self.canvas.create_text(
-            self.grid_width * CELL_SIZE // 2,
-            self.grid_height * CELL_SIZE // 2,
-            text="⚡",
-            font=("Arial", 20, "bold"),
-            fill="#00ffcc"
-        )
-        self.draw()
+    def load_quicksave(self):
+        path = os.path.join(STATE_DIR, "quicksave.sns")
+        if self.arena or self.replay or not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            engine = load_state(f.read(), rewind_bytes=REWIND_BYTES)
+        # A loaded game does not start from its seed, so it gets no replay.
+        self.theme_rng = random.Random(engine.seed)
+        self.start_engine(engine)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+import time
+from collections import deque
+
+SAMPLES = 5000
+STATS = ("logic", "draw", "input", "input_lag", "frame", "frame_jitter", "tick_jitter", "send")
+
+
+class Stat:
+    def __init__(self):
+        self.samples = deque(maxlen=SAMPLES)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def copy(self):
+        stat = Stat()
+        stat.samples.extend(self.samples)
+        stat.count = self.count
+        stat.total = self.total
+        stat.max = self.max
+        return stat
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class PerfMetrics:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.stats = {name: Stat() for name in STATS}
+        self.canvas_items = 0
+        self.started = time.perf_counter()
+
+    def add(self, name, ms):
+        self.stats[name].add(ms)
+
+    def timed(self, name, func):
+        def wrapper(*args):
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.stats[name].add((time.perf_counter() - start) * 1000)
+        return wrapper
+
+    def summary(self):
+        result = {name: stat.summary() for name, stat in self.stats.items()}
+        result["canvas_items"] = self.canvas_items
+        result["seconds"] = time.perf_counter() - self.started
+        return result
+
+    def overlay_text(self):
+        s = self.stats
+        return (f"логика {s['logic'].percentile(50):.2f}/{s['logic'].percentile(99):.2f} мс | "
+                f"отрисовка {s['draw'].percentile(50):.2f}/{s['draw'].percentile(99):.2f} мс | "
+                f"ввод {s['input'].percentile(99):.2f} мс | "
+                f"до поворота {s['input_lag'].percentile(50):.0f}/{s['input_lag'].percentile(99):.0f} мс\n"
+                f"кадр p50/p99 {s['frame'].percentile(50):.2f}/{s['frame'].percentile(99):.2f} мс | "
+                f"джиттер тика {s['tick_jitter'].percentile(50):+.1f}/{s['tick_jitter'].percentile(99):+.1f} мс | "
+                f"элементов холста {self.canvas_items}")
+
+    def snapshot(self, meta=None):
+        """A copy of the samples so far, to be turned into files off the Tk thread."""
+        return MetricsExport(self, meta)
+
+
+class MetricsExport:
+    """The metrics as they were at one moment; json() and csv() give the file contents as bytes."""
+
+    def __init__(self, metrics, meta=None):
+        self.meta = dict(meta or {})
+        self.stats = {name: stat.copy() for name, stat in metrics.stats.items()}
+        self.canvas_items = metrics.canvas_items
+        self.seconds = time.perf_counter() - metrics.started
+
+    def json(self):
+        summary = dict(self.meta)
+        summary["metrics"] = {name: stat.summary() for name, stat in self.stats.items()}
+        summary["metrics"]["canvas_items"] = self.canvas_items
+        summary["metrics"]["seconds"] = self.seconds
+        return json.dumps(summary, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def csv(self):
+        out = io.StringIO(newline="")
+        writer = csv.writer(out)
+        writer.writerow(["metric", "sample", "ms"])
+        for metric, stat in self.stats.items():
+            for i, value in enumerate(stat.samples):
+                writer.writerow([metric, i, f"{value:.4f}"])
+        return out.getvalue().encode("utf-8")
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import queue
+import threading
+from array import array
+from collections import deque
+
+from arena import ArenaSnake
+from engine import DIRECTIONS, OPPOSITES
+from server import encode
+
+CONNECT_TIMEOUT = 5
+MAX_PREDICT = 3
+
+
+class NetClient:
+    """Socket side of a networked game, run on its own asyncio thread.
+
+    Decoded server messages land in `inbox` for the Tk thread to drain."""
+
+    def __init__(self, host, port, color=None):
+        self.host = host
+        self.port = port
+        self.color = color
+        self.inbox = queue.Queue()
+        self.loop = asyncio.new_event_loop()
+        self.writer = None
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.run(),), daemon=True)
+        self.thread.start()
+
+    async def run(self):
+        try:
+            reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            self.writer.write(encode({"t": "join", "color": self.color}))
+            async for line in reader:
+                self.inbox.put(json.loads(line))
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.inbox.put({"t": "closed"})
+
+    def send(self, message):
+        if self.writer is not None:
+            self.loop.call_soon_threadsafe(self.writer.write, encode(message))
+
+    def close(self):
+        if self.writer is not None:
+            self.loop.call_soon_threadsafe(self.writer.close)
+
+
+def cell(value):
+    return value[0], value[1]
+
+
+class RemoteArena:
+    """Client mirror of the server's arena, shaped like ArenaEngine for the view.
+
+    Other snakes only follow server events. The player's own snake runs up to
+    MAX_PREDICT ticks ahead of the last server tick and is snapped back to the
+    server's body whenever the prediction turns out wrong."""
+
+    def __init__(self, client, timeout=CONNECT_TIMEOUT):
+        self.client = client
+        self.log = None
+        self.seed = None
+        self.awaiting_box = False
+        self.running = True
+        self.tick = 0
+        self.shown = deque()
+        self.ahead = 0
+        message = client.inbox.get(timeout=timeout)
+        if message.get("t") != "full":
+            raise ConnectionError("server closed the connection")
+        self.load(message)
+
+    def load(self, message):
+        self.me = message["you"]
+        self.tick = message["tick"]
+        self.grid_width = self.width = message["w"]
+        self.grid_height = self.height = message["h"]
+        self.tick_ms = message["tick_ms"]
+        self.use_walls = message["walls_on"]
+        self.owner = array("i", [0]) * (self.width * self.height)
+        self.snakes = []
+        self.auth = deque()
+        for sid, color, score, body in message["snakes"]:
+            snake = self.snake(sid)
+            snake.color = color
+            snake.score = score
+            if body is not None:
+                self.place(sid, [cell(c) for c in body])
+        self.food = {cell(c): kind for c, kind in message["food"]}
+        self.walls = {cell(c) for c in message["walls"]}
+        self.projectiles = RemoteProjectiles({pid: cell(c) for pid, c in message["pro"]})
+        me = self.snake(self.me)
+        self.direction = me.direction
+        self.show(deque(self.auth))
+        self.ahead = 0
+
+    @property
+    def score(self):
+        return self.snakes[self.me].score
+
+    def snake(self, sid):
+        while len(self.snakes) <= sid:
+            self.snakes.append(ArenaSnake(len(self.snakes), True, "#888888", 0))
+        return self.snakes[sid]
+
+    def body(self, sid):
+        # The player's snake is drawn from the prediction; the server's copy is kept aside.
+        return self.auth if sid == self.me else self.snake(sid).body
+
+    def show(self, body):
+        self.shown = body
+        self.snake(self.me).body = body
+
+    def place(self, sid, cells):
+        self.clear(sid)
+        body = self.body(sid)
+        body.extend(cells)
+        snake = self.snake(sid)
+        snake.alive = True
+        for x, y in cells:
+            self.owner[y * self.width + x] = sid + 1
+        if len(cells) > 1:
+            snake.direction = self.heading(cells[0], cells[1], snake.direction)
+
+    def clear(self, sid):
+        body = self.body(sid)
+        for x, y in body:
+            if self.owner[y * self.width + x] == sid + 1:
+                self.owner[y * self.width + x] = 0
+        body.clear()
+        self.snake(sid).alive = False
+
+    @staticmethod
+    def heading(head, neck, default):
+        step = (head[0] - neck[0], head[1] - neck[1])
+        return next((name for name, d in DIRECTIONS.items() if d == step), default)
+
+    def walls_in(self, x0, y0, x1, y1):
+        return [c for c in self.walls if x0 <= c[0] < x1 and y0 <= c[1] < y1]
+
+    def food_items(self):
+        return self.food.items()
+
+    def set_direction(self, direction):
+        if self.snakes[self.me].alive and direction != OPPOSITES[self.direction]:
+            self.direction = direction
+            self.client.send({"t": "dir", "d": direction})
+
+    def shoot(self):
+        self.client.send({"t": "shoot"})
+        return []
+
+    def teleport(self):
+        self.client.send({"t": "tp"})
+        return []
+
+    def step(self, actions=None):
+        events = []
+        while True:
+            try:
+                message = self.client.inbox.get_nowait()
+            except queue.Empty:
+                break
+            events += self.receive(message)
+        if self.running:
+            events += self.predict()
+        return events
+
+    def receive(self, message):
+        kind = message["t"]
+        if kind == "full":
+            self.load(message)
+            return [("resync",)]
+        if kind == "closed":
+            self.running = False
+            return [("death", "server")]
+        if kind != "d":
+            return []
+        self.tick = message["k"]
+        me = self.snakes[self.me]
+        events = []
+        for event in message["e"]:
+            name = event[0]
+            if name == "snake_head":
+                sid, head = event[1], cell(event[2])
+                body = self.body(sid)
+                body.appendleft(head)
+                self.owner[head[1] * self.width + head[0]] = sid + 1
+                self.snake(sid).direction = self.heading(head, body[1], self.snake(sid).direction)
+                event = (name, sid, head)
+            elif name == "snake_tail":
+                x, y = self.body(event[1]).pop()
+                if self.owner[y * self.width + x] == event[1] + 1:
+                    self.owner[y * self.width + x] = 0
+            elif name == "snake_spawn":
+                self.place(event[1], [cell(c) for c in event[2]])
+                event = (name, event[1], tuple(self.body(event[1])))
+            elif name == "snake_dead":
+                self.clear(event[1])
+            elif name == "snake_color":
+                self.snake(event[1]).color = event[2]
+                continue
+            elif name == "food_added":
+                self.food[cell(event[1])] = event[2]
+                event = (name, cell(event[1]), event[2])
+            elif name == "food_eaten":
+                self.food.pop(cell(event[1]), None)
+                self.snake(event[2]).score += event[3]
+                event = (name, cell(event[1]), event[2], event[3])
+            elif name == "food_gone":
+                self.food.pop(cell(event[1]), None)
+                event = (name, cell(event[1]))
+            elif name == "pro":
+                self.projectiles.cells_by_id[event[1]] = cell(event[2])
+                event = (name, event[1], cell(event[2]))
+            elif name == "pro_gone":
+                self.projectiles.cells_by_id.pop(event[1], None)
+            elif name == "wall_removed":
+                self.walls.discard(cell(event[1]))
+                event = (name, cell(event[1]))
+            if name.startswith("snake_") and event[1] == self.me:
+                continue
+            events.append(tuple(event))
+        return events + self.reconcile(me)
+
+    def reconcile(self, me):
+        if not me.alive:
+            self.ahead = 0
+            if self.shown:
+                self.show(deque())
+                return [("snake_dead", self.me, "dead")]
+            return []
+        if not self.shown:
+            self.direction = me.direction
+        self.ahead = max(0, self.ahead - 1)
+        expected = self.simulate(self.auth, self.ahead)
+        if expected != self.shown:
+            self.show(expected)
+            return [("snake_spawn", self.me, tuple(expected))]
+        return []
+
+    def simulate(self, body, steps):
+        body = deque(body)
+        dx, dy = DIRECTIONS[self.direction]
+        for _ in range(steps):
+            head = (body[0][0] + dx, body[0][1] + dy)
+            body.appendleft(head)
+            if head not in self.food:
+                body.pop()
+        return body
+
+    def predict(self):
+        if self.ahead >= MAX_PREDICT or not self.shown:
+            return []
+        dx, dy = DIRECTIONS[self.direction]
+        head = (self.shown[0][0] + dx, self.shown[0][1] + dy)
+        if not (0 <= head[0] < self.width and 0 <= head[1] < self.height):
+            return []
+        if self.owner[head[1] * self.width + head[0]] or head in self.walls:
+            return []
+        self.ahead += 1
+        self.shown.appendleft(head)
+        events = [("snake_head", self.me, head)]
+        if head not in self.food:
+            self.shown.pop()
+            events.append(("snake_tail", self.me))
+        return events
+
+
+class RemoteProjectiles:
+    def __init__(self, cells_by_id):
+        self.cells_by_id = cells_by_id
+
+    def __len__(self):
+        return len(self.cells_by_id)
+
+    def cells(self):
+        return list(self.cells_by_id.items())
@@ -0,0 +1,82 @@
+from array import array
+
+
+class ScoreShotPolicy:
+    def __init__(self, points=30):
+        self.points = points
+        self.last_shot_score = 0
+
+    def reset(self):
+        self.last_shot_score = 0
+
+    def allows(self, score):
+        return score - self.last_shot_score >= self.points
+
+    def shot(self, score):
+        self.last_shot_score = score
+
+
+class Projectiles:
+    def __init__(self):
+        self.ids = array("i")
+        self.x = array("i")
+        self.y = array("i")
+        self.dx = array("b")
+        self.dy = array("b")
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def clear(self):
+        for arr in (self.ids, self.x, self.y, self.dx, self.dy):
+            del arr[:]
+
+    def add(self, x, y, dx, dy):
+        pid = self.next_id
+        self.next_id += 1
+        self.ids.append(pid)
+        self.x.append(x)
+        self.y.append(y)
+        self.dx.append(dx)
+        self.dy.append(dy)
+        return pid
+
+    def remove_at(self, k):
+        for arr in (self.ids, self.x, self.y, self.dx, self.dy):
+            arr[k] = arr[-1]
+            arr.pop()
+
+    def cells(self):
+        return [(self.ids[k], (self.x[k], self.y[k])) for k in range(len(self.ids))]
+
+    def advance(self, board, steps, events, hit=None):
+        k = 0
+        while k < len(self.ids):
+            if self.advance_one(k, board, steps, events, hit):
+                k += 1
+
+    def advance_one(self, k, board, steps, events, hit=None):
+        x, y = self.x[k], self.y[k]
+        dx, dy = self.dx[k], self.dy[k]
+        for _ in range(steps):
+            x += dx
+            y += dy
+            if not (0 <= x < board.width and 0 <= y < board.height):
+                events.append(("pro_gone", self.ids[k]))
+                self.remove_at(k)
+                return False
+            if board.is_wall((x, y)):
+                board.remove_wall((x, y))
+                events.append(("wall_removed", (x, y)))
+                events.append(("pro_gone", self.ids[k]))
+                self.remove_at(k)
+                return False
+            if hit is not None and hit(self.ids[k], x, y):
+                events.append(("pro_gone", self.ids[k]))
+                self.remove_at(k)
+                return False
+        self.x[k] = x
+        self.y[k] = y
+        events.append(("pro", self.ids[k], (x, y)))
+        return True
@@ -0,0 +1,295 @@
+import argparse
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from config import CELL_SIZE, COLORS, THUMB_SIZE
+from inputlog import InputLog
+from renderer import OUTLINE_3D, PROJECTILE, SHADOW_3D
+from replay import ReplayPlayer
+from shared import BODY, FOOD, GREEN, HEAD, WALL, BoardGrid
+from sprites import TILE_PAD, TILE_SIZE, paint, shapes
+
+# Codes past the BoardGrid ones that only exist on screen.
+PRO, BONUS = 6, 7
+KINDS = ("empty", "body", "head", "wall", "food", "green", "pro", "food")
+FULL_REDRAW = 0.25
+MAX_DELAY_MS = 65535
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def rgb(color):
+    return np.frombuffer(bytes.fromhex(color[1:]), np.uint8)
+
+
+def draw_runs(tile, rows, offset=0):
+    """Copies sprites.paint() runs onto a tile, cropping `offset` pixels off the top and left."""
+    size = tile.shape[0]
+    for y, runs in enumerate(rows[offset:offset + size]):
+        for color, start, end in runs:
+            start, end = max(start - offset, 0), min(end - offset, size)
+            if start < end:
+                tile[y, start:end] = rgb(color)
+    return tile
+
+
+def background():
+    # The canvas background with the grid lines BoardRenderer draws along each cell's top and left edge.
+    tile = np.empty((CELL_SIZE, CELL_SIZE, 3), np.uint8)
+    tile[:] = rgb(COLORS["bg"])
+    tile[0, :] = tile[:, 0] = rgb(COLORS["border"])
+    return tile
+
+
+class Rasterizer:
+    """Paints board cell codes into an RGB NumPy frame without a display.
+
+    Every cell is one tile in the flat or 3D style of BoardRenderer, so a frame
+    only repaints the cells whose code differs from the last one drawn. 3D tiles
+    are cut to their cell, which trims the part of the shadow that falls on
+    the next cell. `dirty` is the pixel box (x0, y0, x1, y1) the last draw()
+    touched, or None if nothing changed."""
+
+    def __init__(self, width, height, cell_size=CELL_SIZE, is_3d=False, snake_color=None):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.is_3d = is_3d
+        self.snake_color = snake_color or COLORS["snake"]
+        self.tiles = np.stack([self.tile(code) for code in range(len(KINDS))])
+        self.frame = np.empty((height * cell_size, width * cell_size, 3), np.uint8)
+        # No tile has code 255, so the first draw paints everything.
+        self.drawn = np.full(width * height, 255, np.uint8)
+        self.dirty = None
+
+    def colors(self, kind, code):
+        if kind == "pro":
+            return PROJECTILE
+        fill = {"body": self.snake_color, "head": COLORS["snake_head"], "wall": COLORS["wall"],
+                "food": COLORS["food_bonus"] if code == BONUS else COLORS["food"], "green": COLORS["food_green"]}[kind]
+        return fill, OUTLINE_3D[kind] if self.is_3d else fill
+
+    def tile(self, code):
+        kind = KINDS[code]
+        tile = background()
+        if kind == "empty":
+            pass
+        elif self.is_3d:
+            fill, outline = self.colors(kind, code)
+            draw_runs(tile, paint(TILE_SIZE, shapes(kind, fill, outline, SHADOW_3D[kind])), TILE_PAD)
+        elif kind == "pro":
+            fill, outline = PROJECTILE
+            draw_runs(tile, paint(CELL_SIZE, [(outline, 5, 5, 15, 15, True), (fill, 6, 6, 14, 14, True)]))
+        else:
+            tile[:] = rgb(self.colors(kind, code)[0])
+        # Nearest-neighbour scaling for thumbnails and other cell sizes.
+        index = np.arange(self.cell_size) * CELL_SIZE // self.cell_size
+        return tile[index][:, index]
+
+    def draw(self, codes, projectiles=(), bonus=-1):
+        """Brings the frame up to date with `codes`, one byte per cell as in shared.BoardGrid.
+
+        `projectiles` are cell indices drawn over the board and `bonus` is the
+        index of the food cell when the food is a bonus one."""
+        codes = np.frombuffer(codes, np.uint8)
+        if projectiles or bonus >= 0:
+            codes = codes.copy()
+            if bonus >= 0:
+                codes[bonus] = BONUS
+            codes[list(projectiles)] = PRO
+        changed = np.flatnonzero(codes != self.drawn)
+        if not changed.size:
+            self.dirty = None
+            return self.frame
+        size = self.cell_size
+        if changed.size > FULL_REDRAW * codes.size:
+            cells = self.tiles[codes.reshape(self.height, self.width)]
+            self.frame[:] = cells.transpose(0, 2, 1, 3, 4).reshape(self.frame.shape)
+            self.dirty = (0, 0, self.frame.shape[1], self.frame.shape[0])
+        else:
+            ys, xs = np.divmod(changed, self.width)
+            frame, tiles = self.frame, self.tiles
+            for y, x, code in zip(ys.tolist(), xs.tolist(), codes[changed].tolist()):
+                frame[y * size:(y + 1) * size, x * size:(x + 1) * size] = tiles[code]
+            self.dirty = (int(xs.min()) * size, int(ys.min()) * size, (int(xs.max()) + 1) * size,
+                          (int(ys.max()) + 1) * size)
+        self.drawn[changed] = codes[changed]
+        return self.frame
+
+    def draw_engine(self, grid, engine):
+        """Draws a BoardGrid that follows `engine`, with its projectiles and bonus food."""
+        projectiles = [grid.index(cell) for _, cell in engine.projectiles.cells()]
+        return self.draw(grid.grid, projectiles, grid.food if engine.food_bonus else -1)
+
+
+def chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def header(width, height):
+    # 8-bit truecolour, no interlacing.
+    return chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+
+def compress(pixels):
+    height = pixels.shape[0]
+    rows = np.zeros((height, 1 + pixels.shape[1] * 3), np.uint8)
+    rows[:, 1:] = pixels.reshape(height, -1)
+    return zlib.compress(rows.tobytes())
+
+
+def png_bytes(frame):
+    return PNG_SIGNATURE + header(frame.shape[1], frame.shape[0]) + chunk(b"IDAT", compress(frame)) + \
+        chunk(b"IEND", b"")
+
+
+class ApngWriter:
+    """Streams frames into an animated PNG, storing only the box that changed since the previous frame.
+
+    Frames with nothing new just make the previous one last longer. The frame
+    count is patched into the header on close()."""
+
+    def __init__(self, path, width, height, delay_ms):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.f = open(path, "wb")
+        self.delay_ms = delay_ms
+        self.frames = 0
+        self.seq = 0
+        self.pending = None
+        self.f.write(PNG_SIGNATURE + header(width, height))
+        self.actl = self.f.tell()
+        self.f.write(chunk(b"acTL", struct.pack(">II", 0, 0)))
+
+    def add(self, frame, box):
+        if box is None and self.pending is not None:
+            self.pending[2] = min(self.pending[2] + self.delay_ms, MAX_DELAY_MS)
+            return
+        self.flush()
+        box = box or (0, 0, frame.shape[1], frame.shape[0])
+        x0, y0, x1, y1 = box
+        self.pending = [box, compress(frame[y0:y1, x0:x1]), self.delay_ms]
+
+    def flush(self):
+        if self.pending is None:
+            return
+        (x0, y0, x1, y1), data, delay = self.pending
+        self.pending = None
+        # Each frame is drawn over the last one (dispose none, blend source).
+        self.f.write(chunk(b"fcTL", struct.pack(">IIIIIHHBB", self.seq, x1 - x0, y1 - y0, x0, y0, delay, 1000,
+                                                0, 0)))
+        self.seq += 1
+        if self.frames == 0:
+            self.f.write(chunk(b"IDAT", data))
+        else:
+            self.f.write(chunk(b"fdAT", struct.pack(">I", self.seq) + data))
+            self.seq += 1
+        self.frames += 1
+
+    def close(self):
+        self.flush()
+        self.f.write(chunk(b"IEND", b""))
+        self.f.seek(self.actl)
+        self.f.write(chunk(b"acTL", struct.pack(">II", self.frames, 0)))
+        self.f.close()
+
+
+class FrameWriter:
+    """Writes every frame as its own numbered PNG in a directory."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.frames = 0
+
+    def add(self, frame, box):
+        with open(os.path.join(self.directory, f"frame_{self.frames:06}.png"), "wb") as f:
+            f.write(png_bytes(frame))
+        self.frames += 1
+
+    def close(self):
+        pass
+
+
+def render_replay(log, out, cell_size=CELL_SIZE, is_3d=False, every=1):
+    """Plays a replay without a window into an animated PNG (`out` ending in .png) or a directory of frames.
+
+    Returns the number of frames written."""
+    player = ReplayPlayer(log)
+    engine = player.engine
+    grid = BoardGrid(engine)
+    raster = Rasterizer(engine.grid_width, engine.grid_height, cell_size, is_3d)
+    if out.lower().endswith(".png"):
+        writer = ApngWriter(out, raster.frame.shape[1], raster.frame.shape[0], engine.tick_ms * every)
+    else:
+        writer = FrameWriter(out)
+    raster.draw_engine(grid, engine)
+    writer.add(raster.frame, raster.dirty)
+    while not player.finished():
+        grid.apply(engine, player.step())
+        if engine.tick % every == 0:
+            raster.draw_engine(grid, engine)
+            writer.add(raster.frame, raster.dirty)
+    writer.close()
+    return writer.frames
+
+
+class Thumbnail:
+    """A board copied off an engine, so its PNG can be drawn later on another thread."""
+
+    def __init__(self, engine, size=THUMB_SIZE, is_3d=False, snake_color=None):
+        board = engine.board
+        self.width, self.height = engine.grid_width, engine.grid_height
+        self.walls = list(board.walls)
+        self.body = list(board.body)
+        self.food = engine.food
+        self.green = engine.food_green if engine.food_green_active else None
+        self.bonus = engine.food_bonus
+        self.size = size
+        self.is_3d = is_3d
+        self.snake_color = snake_color
+
+    def codes(self):
+        width = self.width
+        codes = np.zeros(width * self.height, np.uint8)
+        for code, cells in ((WALL, self.walls), (BODY, self.body)):
+            if cells:
+                xy = np.array(cells, np.int64)
+                codes[xy[:, 1] * width + xy[:, 0]] = code
+        for code, cell in ((FOOD, self.food), (GREEN, self.green), (HEAD, self.body[0] if self.body else None)):
+            if cell is not None:
+                codes[cell[1] * width + cell[0]] = code
+        return codes
+
+    def render(self):
+        """PNG bytes of the whole board with its longer side at most about `size` pixels.
+
+        Boards with more cells than that are sampled every few cells."""
+        width, height, size = self.width, self.height, self.size
+        step = -(-max(width, height) // size)
+        codes = self.codes().reshape(height, width)[::step, ::step]
+        raster = Rasterizer(codes.shape[1], codes.shape[0], max(1, size // max(width, height)), self.is_3d,
+                            self.snake_color)
+        bonus = -1
+        if step == 1 and self.bonus and self.food is not None:
+            bonus = self.food[1] * width + self.food[0]
+        return png_bytes(raster.draw(np.ascontiguousarray(codes), bonus=bonus))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Запись повтора в анимированный PNG или кадры без окна")
+    parser.add_argument("path")
+    parser.add_argument("out", help="файл .png для анимации или папка для отдельных кадров")
+    parser.add_argument("--cell", type=int, default=CELL_SIZE, help="размер клетки в пикселях")
+    parser.add_argument("--3d", dest="is_3d", action="store_true")
+    parser.add_argument("--every", type=int, default=1, help="брать каждый N-й тик")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        log = InputLog.from_bytes(f.read())
+    start = time.perf_counter()
+    frames = render_replay(log, args.out, args.cell, args.is_3d, args.every)
+    elapsed = time.perf_counter() - start
+    print(f"{frames} кадров за {elapsed:.2f} с ({frames / elapsed:.0f} кадров/с): {args.out}")
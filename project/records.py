@@ -0,0 +1,258 @@
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+from collections import deque
+
+from config import THUMB_DIR
+
+PAGE_SIZE = 100
+WRITE_QUEUE = 256
+WRITE_BATCH = 64
+CLOSE_TIMEOUT = 5
+# Jobs that may wait behind a full queue; past that the writer is stuck and new jobs are refused.
+OVERFLOW_LIMIT = 4096
+STORE_JOBS = ("add", "clear", "load", "page")
+
+
+def thumbnail_path(row_id, directory=THUMB_DIR):
+    """Where the thumbnail of the record with this row id lives; the Records tab keys its rows by the id."""
+    return os.path.join(directory, f"{row_id}.png")
+
+
+def write_atomic(path, data):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class RecordStore:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        # WAL keeps every committed batch intact if the process dies mid-write.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                time TEXT NOT NULL,
+                level TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_score ON records (score DESC, id);
+            CREATE INDEX IF NOT EXISTS records_level_score ON records (level, score DESC, id);
+            CREATE INDEX IF NOT EXISTS records_name_score ON records (name, score DESC, id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def migrate_text_file(self, path):
+        if not os.path.exists(path):
+            return 0
+        done = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_text_file'").fetchone()
+        if done:
+            return 0
+
+        def rows():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.strip().split(" | ")
+                    if len(parts) == 4 and parts[1].lstrip("-").isdigit():
+                        name, score, time_str, level = parts
+                        yield name, int(score), time_str, level
+
+        with self.conn:
+            cur = self.conn.executemany("INSERT INTO records (name, score, time, level) VALUES (?, ?, ?, ?)", rows())
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_text_file', ?)", (path,))
+        return cur.rowcount
+
+    def add(self, record):
+        return self.add_many([record])[0]
+
+    def add_many(self, records):
+        """Inserts the records in one transaction and returns their row ids."""
+        with self.conn:
+            return [self.conn.execute("INSERT INTO records (name, score, time, level) VALUES (?, ?, ?, ?)",
+                                      record).lastrowid for record in records]
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM records")
+
+    def count(self, level=None):
+        if level is None:
+            return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM records WHERE level = ?", (level,)).fetchone()[0]
+
+    def page(self, after=None, limit=PAGE_SIZE, level=None):
+        where = []
+        params = []
+        if level is not None:
+            where.append("level = ?")
+            params.append(level)
+        if after is not None:
+            where.append("score <= ? AND (score < ? OR id > ?)")
+            params += [after[0], after[0], after[1]]
+        sql = "SELECT id, name, score, time, level FROM records"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY score DESC, id LIMIT ?"
+        return self.conn.execute(sql, params + [limit]).fetchall()
+
+    def top(self, limit=10, level=None):
+        return [row[1:] for row in self.page(limit=limit, level=level)]
+
+    def player(self, name, limit=10):
+        rows = self.conn.execute(
+            "SELECT name, score, time, level FROM records WHERE name = ? ORDER BY score DESC, id LIMIT ?",
+            (name, limit))
+        return rows.fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+class RecordWriter:
+    """Runs a RecordStore on a background thread so the Tk thread never waits on disk.
+
+    Jobs run in submission order, consecutive adds are committed as one batch,
+    and answers to `load` and `page` come back through `results` as
+    (kind, token, payload) for the caller to poll. Failed jobs answer with
+    ("error", token, message) instead.
+
+    Submitting never blocks: once the queue is full, jobs wait in `overflow`
+    and the writer moves them over as it makes room. The overflow holds at
+    most OVERFLOW_LIMIT jobs; anything submitted past that is dropped and
+    answered with an error, so a writer stuck on disk cannot use up memory.
+
+    Thumbnails passed to add() are written to thumbnail_path() of the new
+    row id under `thumbs`, and clear() empties that directory as well."""
+
+    def __init__(self, path, maxsize=WRITE_QUEUE, thumbs=THUMB_DIR):
+        self.path = path
+        self.thumbs = thumbs
+        self.jobs = queue.Queue(maxsize)
+        self.overflow = deque()
+        self.lock = threading.Lock()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, job):
+        with self.lock:
+            if not self.overflow:
+                try:
+                    self.jobs.put_nowait(job)
+                    return
+                except queue.Full:
+                    pass
+            if len(self.overflow) >= OVERFLOW_LIMIT:
+                self.results.put(("error", job[1], f"очередь записи переполнена, {job[0]} не выполнено"))
+                return
+            self.overflow.append(job)
+
+    def refill(self):
+        with self.lock:
+            while self.overflow:
+                try:
+                    self.jobs.put_nowait(self.overflow[0])
+                except queue.Full:
+                    return
+                self.overflow.popleft()
+
+    def load(self, text_path, token=None):
+        self.submit(("load", token, text_path))
+
+    def add(self, record, thumbnail=None):
+        """`thumbnail`, if given, is called on the writer thread once the row id is known and returns PNG bytes."""
+        self.submit(("add", None, (record, thumbnail)))
+
+    def clear(self):
+        self.submit(("clear", None, None))
+
+    def page(self, after=None, limit=PAGE_SIZE, token=None):
+        self.submit(("page", token, (after, limit)))
+
+    def save_file(self, path, data):
+        self.submit(("file", None, (path, data)))
+
+    def render_file(self, path, render):
+        """Like save_file(), but the data comes from calling `render` on the writer thread."""
+        self.submit(("render", None, (path, render)))
+
+    def after(self, callback):
+        """Hands `callback` back through `results` as ("after", callback, None) once every job before it ran.
+
+        The writer never calls it; the Tk thread does when it polls."""
+        self.submit(("after", callback, None))
+
+    def busy(self):
+        return bool(self.jobs.unfinished_tasks or self.overflow)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        if self.thread.is_alive():
+            self.submit(("stop", None, None))
+            self.thread.join(timeout)
+
+    def run(self):
+        try:
+            store = RecordStore(self.path)
+        except (OSError, sqlite3.Error) as e:
+            # Files can still be written; every store job reports the error instead.
+            store = None
+            self.results.put(("error", None, str(e)))
+        held = None
+        while True:
+            job = held or self.jobs.get()
+            held = None
+            kind, token, payload = job
+            done = 1
+            try:
+                if store is None and kind in STORE_JOBS:
+                    raise sqlite3.OperationalError(f"база рекордов {self.path} не открыта")
+                if kind == "add":
+                    batch = [payload]
+                    while len(batch) < WRITE_BATCH:
+                        try:
+                            held = self.jobs.get_nowait()
+                        except queue.Empty:
+                            break
+                        if held[0] != "add":
+                            break
+                        batch.append(held[2])
+                        held = None
+                        done += 1
+                    ids = store.add_many([record for record, _ in batch])
+                    for row_id, (_, thumbnail) in zip(ids, batch):
+                        if thumbnail is not None:
+                            write_atomic(thumbnail_path(row_id, self.thumbs), thumbnail())
+                elif kind == "clear":
+                    store.clear()
+                    shutil.rmtree(self.thumbs, ignore_errors=True)
+                elif kind == "load":
+                    self.results.put(("load", token, store.migrate_text_file(payload)))
+                elif kind == "page":
+                    self.results.put(("page", token, store.page(after=payload[0], limit=payload[1])))
+                elif kind == "file":
+                    write_atomic(*payload)
+                elif kind == "render":
+                    write_atomic(payload[0], payload[1]())
+                elif kind == "after":
+                    self.results.put(("after", token, None))
+                elif kind == "stop":
+                    if store is not None:
+                        store.close()
+                    return
+            except Exception as e:
+                # Any failure is reported and the thread keeps going, so later jobs still get their answers.
+                self.results.put(("error", token, str(e)))
+            finally:
+                for _ in range(done):
+                    self.jobs.task_done()
+                self.refill()
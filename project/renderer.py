@@ -0,0 +1,339 @@
+from collections import deque
+
+from config import CELL_SIZE, COLORS
+from sprites import TILE_PAD, SpriteCache
+
+OUTLINE_3D = {"head": "#999999", "body": "#555555", "wall": "#aaaaaa", "food": "#ffffff", "bonus": "#ffffff",
+              "green": "#33ff33"}
+SHADOW_3D = {"head": "#222222", "body": "#222222", "wall": "#111111", "food": "#222222", "bonus": "#222222",
+             "green": "#111111", "pro": "#222222"}
+PROJECTILE = ("#ffcc00", "#ffaa00")
+
+
+class BoardRenderer:
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.is_3d = False
+        self.sprites = SpriteCache(canvas)
+        self.snake_color = COLORS["snake"]
+        self.snake = deque()
+        self.segments = {}
+        self.walls = {}
+        self.food = None
+        self.food_cell = None
+        self.food_bonus = False
+        self.green = None
+        self.green_cell = None
+        self.projectiles = {}
+        self.overlay = []
+        self.arena = {}
+        self.arena_items = {}
+        self.arena_colors = {}
+        self.foods = {}
+        self.grid_width = self.grid_height = 0
+        self.view_width = self.view_height = 0
+        self.origin = (0, 0)
+
+    def reset(self, grid_width, grid_height, view_width=None, view_height=None):
+        self.canvas.delete("all")
+        self.snake.clear()
+        self.segments.clear()
+        self.walls.clear()
+        self.food = self.food_cell = None
+        self.green = self.green_cell = None
+        self.projectiles.clear()
+        self.overlay = []
+        self.arena.clear()
+        self.arena_items.clear()
+        self.foods.clear()
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.view_width = min(view_width or grid_width, grid_width)
+        self.view_height = min(view_height or grid_height, grid_height)
+        self.origin = (0, 0)
+        self.canvas.config(scrollregion=(0, 0, grid_width * CELL_SIZE, grid_height * CELL_SIZE))
+        self.canvas.xview_moveto(0)
+        self.canvas.yview_moveto(0)
+
+        # Only the visible part of the grid is drawn; follow() shifts these lines with the camera.
+        for i in range(self.view_width):
+            self.canvas.create_line(i * CELL_SIZE, 0, i * CELL_SIZE, self.view_height * CELL_SIZE,
+                                    fill=COLORS["border"], tags="grid")
+        for j in range(self.view_height):
+            self.canvas.create_line(0, j * CELL_SIZE, self.view_width * CELL_SIZE, j * CELL_SIZE,
+                                    fill=COLORS["border"], tags="grid")
+
+    def visible(self):
+        x, y = self.origin
+        return x, y, x + self.view_width, y + self.view_height
+
+    def shown(self, cell):
+        x, y = self.origin
+        return x <= cell[0] < x + self.view_width and y <= cell[1] < y + self.view_height
+
+    def scrolls(self):
+        return self.view_width < self.grid_width or self.view_height < self.grid_height
+
+    def follow(self, head, board):
+        if not self.scrolls():
+            return False
+        x, y = self.origin
+        margin_x = self.view_width // 4
+        margin_y = self.view_height // 4
+        if margin_x <= head[0] - x < self.view_width - margin_x and margin_y <= head[1] - y < self.view_height - margin_y:
+            return False
+        x = min(max(head[0] - self.view_width // 2, 0), self.grid_width - self.view_width)
+        y = min(max(head[1] - self.view_height // 2, 0), self.grid_height - self.view_height)
+        if (x, y) == self.origin:
+            return False
+        self.canvas.move("grid", (x - self.origin[0]) * CELL_SIZE, (y - self.origin[1]) * CELL_SIZE)
+        self.origin = (x, y)
+        self.canvas.xview_moveto(x / self.grid_width)
+        self.canvas.yview_moveto(y / self.grid_height)
+        self.set_walls(board.walls_in(*self.visible()))
+        if self.snake:
+            self.show_snake(board)
+        if self.arena:
+            self.show_arena()
+        return True
+
+    def colors(self, kind, body_color=None):
+        if kind == "head":
+            color = COLORS["snake_head"]
+        elif kind == "body":
+            color = body_color or self.snake_color
+        elif kind == "wall":
+            color = COLORS["wall"]
+        elif kind == "food":
+            color = COLORS["food_bonus"] if self.food_bonus else COLORS["food"]
+        elif kind == "bonus":
+            color = COLORS["food_bonus"]
+        elif kind == "green":
+            color = COLORS["food_green"]
+        else:
+            return PROJECTILE
+        if self.is_3d:
+            return color, OUTLINE_3D[kind]
+        return color, color
+
+    def sprite(self, kind, body_color=None):
+        fill, outline = self.colors(kind, body_color)
+        return self.sprites.get(kind, fill, outline, SHADOW_3D[kind])
+
+    def style(self, item, kind, body_color=None):
+        if self.is_3d:
+            self.canvas.itemconfig(item, image=self.sprite(kind, body_color))
+        else:
+            fill, outline = self.colors(kind, body_color)
+            self.canvas.itemconfig(item, fill=fill, outline=outline)
+
+    def cell_points(self, cell):
+        x1 = cell[0] * CELL_SIZE
+        y1 = cell[1] * CELL_SIZE
+        x2 = x1 + CELL_SIZE
+        y2 = y1 + CELL_SIZE
+        return x1, y1, x2, y1, x2, y2, x1, y2
+
+    def create_cell(self, cell, kind, body_color=None, tags=None):
+        # In 3D mode a cell is one pre-rendered image with its shadow baked in.
+        x = cell[0] * CELL_SIZE
+        y = cell[1] * CELL_SIZE
+        tags = tags or kind
+        if self.is_3d:
+            item = self.canvas.create_image(x - TILE_PAD, y - TILE_PAD, image=self.sprite(kind, body_color),
+                                            anchor="nw", tags=tags)
+        elif kind == "pro":
+            item = self.canvas.create_oval(x + 5, y + 5, x + 15, y + 15, fill=PROJECTILE[0], outline=PROJECTILE[1],
+                                           tags=kind)
+        else:
+            fill, outline = self.colors(kind, body_color)
+            item = self.canvas.create_polygon(*self.cell_points(cell), fill=fill, outline=outline, tags=tags)
+        return (item,)
+
+    def move_cell(self, ids, cell, kind):
+        x = cell[0] * CELL_SIZE
+        y = cell[1] * CELL_SIZE
+        if self.is_3d:
+            self.canvas.coords(ids[0], x - TILE_PAD, y - TILE_PAD)
+        elif kind == "pro":
+            self.canvas.coords(ids[0], x + 5, y + 5, x + 15, y + 15)
+        else:
+            self.canvas.coords(ids[0], *self.cell_points(cell))
+
+    def delete_cell(self, ids):
+        if ids:
+            self.canvas.delete(*ids)
+
+    def set_snake(self, snake):
+        # The whole body is kept to know where the tail is, but only segments in the view get canvas items.
+        for ids in self.segments.values():
+            self.delete_cell(ids)
+        self.segments.clear()
+        self.snake = deque(snake)
+        for i, segment in enumerate(self.snake):
+            if self.shown(segment):
+                self.segments[segment] = self.create_cell(segment, "head" if i == 0 else "body")
+
+    def show_snake(self, board):
+        """Brings the segment items in line with the view after it scrolled, looking only at visible cells."""
+        for cell in [cell for cell in self.segments if not self.shown(cell)]:
+            self.delete_cell(self.segments.pop(cell))
+        head = self.snake[0]
+        x0, y0, x1, y1 = self.visible()
+        for y in range(y0, y1):
+            for x in range(x0, x1):
+                cell = (x, y)
+                if cell not in self.segments and board.is_snake(cell):
+                    self.segments[cell] = self.create_cell(cell, "head" if cell == head else "body")
+
+    def add_head(self, cell):
+        c = self.canvas
+        old = self.segments.get(self.snake[0]) if self.snake else None
+        if old:
+            c.dtag(old[0], "head")
+            c.addtag_withtag("body", old[0])
+            self.style(old[0], "body")
+        self.snake.appendleft(cell)
+        if self.shown(cell):
+            ids = self.segments[cell] = self.create_cell(cell, "head")
+            if self.food:
+                c.tag_lower(ids[0], self.food[0])
+
+    def remove_tail(self):
+        if self.snake:
+            self.delete_cell(self.segments.pop(self.snake.pop(), None))
+
+    def set_walls(self, walls):
+        for ids in self.walls.values():
+            self.delete_cell(ids)
+        self.walls = {wall: self.create_cell(wall, "wall") for wall in walls}
+
+    def remove_wall(self, cell):
+        self.delete_cell(self.walls.pop(cell, None))
+
+    def set_food(self, cell, bonus):
+        self.food_bonus = bonus
+        self.food, self.food_cell = self.place_food(self.food, self.food_cell, cell, "food")
+
+    def set_green(self, cell):
+        self.green, self.green_cell = self.place_food(self.green, self.green_cell, cell, "green")
+
+    def place_food(self, ids, old_cell, cell, kind):
+        if cell is None:
+            self.delete_cell(ids)
+            return None, None
+        if ids is None:
+            return self.create_cell(cell, kind), cell
+        if cell != old_cell:
+            self.move_cell(ids, cell, kind)
+        self.style(ids[0], kind)
+        return ids, cell
+
+    def set_arena_snake(self, sid, body, color):
+        # Like the player's snake: every body is kept, items exist only for segments in the view.
+        self.remove_arena_snake(sid)
+        self.arena_colors[sid] = color
+        body = self.arena[sid] = deque(body)
+        self.arena_items[sid] = {cell: self.create_cell(cell, "body" if i else "head", color, "arena")
+                                 for i, cell in enumerate(body) if self.shown(cell)}
+
+    def show_arena(self):
+        """Brings the arena items in line with the view after it scrolled."""
+        for sid, body in self.arena.items():
+            items = self.arena_items[sid]
+            for cell in [cell for cell in items if not self.shown(cell)]:
+                self.delete_cell(items.pop(cell))
+            head = body[0] if body else None
+            for cell in body:
+                if cell not in items and self.shown(cell):
+                    items[cell] = self.create_cell(cell, "head" if cell == head else "body", self.arena_colors[sid],
+                                                   "arena")
+
+    def add_arena_head(self, sid, cell):
+        body = self.arena[sid]
+        items = self.arena_items[sid]
+        old = items.get(body[0]) if body else None
+        if old:
+            self.style(old[0], "body", self.arena_colors[sid])
+        body.appendleft(cell)
+        if self.shown(cell):
+            items[cell] = self.create_cell(cell, "head", self.arena_colors[sid], "arena")
+
+    def remove_arena_tail(self, sid):
+        body = self.arena.get(sid)
+        if body:
+            self.delete_cell(self.arena_items[sid].pop(body.pop(), None))
+
+    def remove_arena_snake(self, sid):
+        self.arena.pop(sid, None)
+        for ids in self.arena_items.pop(sid, {}).values():
+            self.delete_cell(ids)
+
+    def set_foods(self, foods):
+        """Arena foods as (cell, kind) pairs, kind being "food", "bonus" or "green"."""
+        for ids in self.foods.values():
+            self.delete_cell(ids)
+        self.foods = {cell: self.create_cell(cell, kind) for cell, kind in foods}
+
+    def add_food(self, cell, kind="food"):
+        if cell not in self.foods:
+            self.foods[cell] = self.create_cell(cell, kind)
+
+    def remove_food(self, cell):
+        self.delete_cell(self.foods.pop(cell, None))
+
+    def set_projectiles(self, projectiles):
+        for ids in self.projectiles.values():
+            self.delete_cell(ids)
+        self.projectiles.clear()
+        for pid, cell in projectiles:
+            self.place_projectile(pid, cell)
+
+    def place_projectile(self, pid, cell):
+        ids = self.projectiles.get(pid)
+        if ids is None:
+            self.projectiles[pid] = self.create_cell(cell, "pro")
+        else:
+            self.move_cell(ids, cell, "pro")
+
+    def remove_projectile(self, pid):
+        self.delete_cell(self.projectiles.pop(pid, None))
+
+    def show_text(self, text, font, fill):
+        x = self.origin[0] * CELL_SIZE + int(self.canvas.cget("width")) // 2
+        y = self.origin[1] * CELL_SIZE + int(self.canvas.cget("height")) // 2
+        self.overlay.append(self.canvas.create_text(x, y, text=text, font=font, fill=fill,
+                                                    tags="overlay"))
+
+    def clear_overlay(self):
+        if self.overlay:
+            self.canvas.delete(*self.overlay)
+            self.overlay = []
+
+    def set_3d(self, is_3d):
+        """Switches item style; everything but the grid is dropped and must be redrawn."""
+        if is_3d == self.is_3d:
+            return
+        self.is_3d = is_3d
+        for ids in list(self.segments.values()) + list(self.walls.values()) + list(self.projectiles.values()):
+            self.delete_cell(ids)
+        self.delete_cell(self.food)
+        self.delete_cell(self.green)
+        for sid in list(self.arena):
+            self.remove_arena_snake(sid)
+        self.set_foods(())
+        self.segments.clear()
+        self.walls = {}
+        self.projectiles.clear()
+        self.food = self.food_cell = None
+        self.green = self.green_cell = None
+
+    def restyle(self):
+        self.sprites.clear()
+        self.canvas.itemconfig("grid", fill=COLORS["border"])
+        for kind in ("head", "body", "wall", "food", "bonus", "green", "pro"):
+            self.style(kind, kind)
+        for sid, items in self.arena_items.items():
+            head = self.arena[sid][0] if self.arena[sid] else None
+            for cell, ids in items.items():
+                self.style(ids[0], "head" if cell == head else "body", self.arena_colors[sid])
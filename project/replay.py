@@ -0,0 +1,78 @@
+import argparse
+import time
+
+from config import REWIND_BYTES
+from engine import SnakeEngine
+from inputlog import BOX, CTRL, DIRECTION, DIRECTION_NAMES, NOT_ENDED, REWIND, SHOOT, TELEPORT, InputLog
+
+
+class ReplayPlayer:
+    def __init__(self, log):
+        self.log = log
+        self.engine = SnakeEngine(log.width, log.height, log.use_walls, tick_ms=log.tick_ms, seed=log.seed,
+                                  level_style=log.level_style, rewind_bytes=REWIND_BYTES)
+        self.inputs = list(log.inputs())
+        self.pos = 0
+        self.ctrl = False
+
+    def finished(self):
+        if not self.engine.running:
+            return True
+        if self.log.end_tick != NOT_ENDED:
+            # A rewind sends the tick back, so the end only counts once every input is played.
+            return self.engine.tick >= self.log.end_tick and self.pos >= len(self.inputs)
+        return self.pos >= len(self.inputs) and self.engine.awaiting_box
+
+    def apply_inputs(self):
+        engine = self.engine
+        events = []
+        while self.pos < len(self.inputs) and self.inputs[self.pos][0] == engine.tick:
+            tick, code, arg = self.inputs[self.pos]
+            self.pos += 1
+            if code == DIRECTION:
+                engine.set_direction(DIRECTION_NAMES[arg])
+            elif code == SHOOT:
+                events += engine.shoot()
+            elif code == TELEPORT:
+                events += engine.teleport()
+            elif code == BOX:
+                events += engine.choose_box(arg)
+            elif code == REWIND:
+                events += engine.rewind(arg)
+            elif code == CTRL:
+                self.ctrl = bool(arg)
+        return events
+
+    def step(self):
+        events = self.apply_inputs()
+        return events + self.advance()
+
+    def advance(self):
+        """The tick after apply_inputs(); step() does both."""
+        if self.finished():
+            return []
+        return self.engine.step()
+
+    def run(self):
+        while not self.finished():
+            self.step()
+        return self.engine
+
+    def verify(self):
+        engine = self.run()
+        return engine.tick == self.log.end_tick and engine.score == self.log.final_score
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проиграть запись игры без окна")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    log = InputLog.load(args.path)
+    player = ReplayPlayer(log)
+    start = time.perf_counter()
+    engine = player.run()
+    elapsed = time.perf_counter() - start
+    ok = engine.tick == log.end_tick and engine.score == log.final_score
+    print(f"Счёт: {engine.score} (записан {log.final_score}) | Тиков: {engine.tick} | "
+          f"{engine.tick / max(elapsed, 1e-9):.0f} тиков/с | {'совпадает' if ok else 'НЕ совпадает'}")
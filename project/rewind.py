@@ -0,0 +1,376 @@
+import math
+import struct
+from collections import deque
+
+from config import REWIND_BYTES
+from levels import STYLES
+
+# A JUMP is a keyframe written after the snake was put down anew (start, teleport, respawn):
+# the ticks before it cannot be reached by stepping back.
+DELTA, KEYFRAME, JUMP = 1, 2, 3
+FROZEN, EXTRA_LIFE, AWAITING_BOX, FOOD_BONUS, GREEN_ACTIVE = 1, 2, 4, 8, 16
+DIRECTION_CODES = {"Up": 0, "Right": 1, "Down": 2, "Left": 3}
+DIRECTION_NAMES = {code: name for name, code in DIRECTION_CODES.items()}
+STEPS = {(0, -1): 0, (1, 0): 1, (0, 1): 2, (-1, 0): 3}
+# kind, tick, score, direction, flags, food, green food, growth pending, last milestone, last shot score,
+# ticks left on the green food, teleport and respawn timers, new head, tail cell left, walls shot, projectiles
+RECORD = struct.Struct("<BIiBBiiiiiHHHiiHH")
+SHOT = struct.Struct("<ibb")
+CELLS = struct.Struct("<IB")
+STATE_MAGIC = b"SNKS"
+STATE_VERSION = 2
+# magic, version, width, height, walls byte as in InputLog, tick_ms, seed, wall density, rewind charges,
+# level length, random state version, gauss_next
+STATE = struct.Struct("<4sBHHBHQdHIBd")
+RNG_WORDS = 625
+# Deltas written between keyframes, in multiples of the keyframe's own size.
+KEYFRAME_RATIO = 8
+
+
+def pack_body(body, width):
+    """A keyframe's snake: 2 bits per segment when each one touches the next, else a 4-byte index each."""
+    cells = [y * width + x for x, y in body]
+    steps = []
+    body = list(body)
+    for (x0, y0), (x1, y1) in zip(body, body[1:]):
+        step = STEPS.get((x1 - x0, y1 - y0))
+        if step is None:
+            return CELLS.pack(len(cells), 0) + struct.pack(f"<{len(cells)}i", *cells)
+        steps.append(step)
+    packed = bytearray((len(steps) + 3) // 4)
+    for k, step in enumerate(steps):
+        packed[k >> 2] |= step << ((k & 3) * 2)
+    return CELLS.pack(len(cells), 1) + struct.pack("<i", cells[0] if cells else -1) + packed
+
+
+def unpack_body(data, offset, width):
+    count, chained = CELLS.unpack_from(data, offset)
+    offset += CELLS.size
+    if not chained:
+        return list(struct.unpack_from(f"<{count}i", data, offset)), offset + 4 * count
+    cell, = struct.unpack_from("<i", data, offset)
+    offset += 4
+    cells = [cell] if count else []
+    moves = [-width, 1, width, -1]
+    for k in range(count - 1):
+        cell += moves[(data[offset + (k >> 2)] >> ((k & 3) * 2)) & 3]
+        cells.append(cell)
+    return cells, offset + (count + 2) // 4
+
+
+def pack_cells(cells):
+    return struct.pack(f"<I{len(cells)}i", len(cells), *cells)
+
+
+def unpack_cells(data, offset):
+    count, = struct.unpack_from("<I", data, offset)
+    return list(struct.unpack_from(f"<{count}i", data, offset + 4)), offset + 4 + 4 * count
+
+
+def record(engine, kind, head=-1, tail=-1, removed=()):
+    """The engine's state after a tick: the scalars every record carries, then walls shot and projectiles."""
+    timers = engine.timers
+    flags = (FROZEN * engine.frozen | EXTRA_LIFE * engine.extra_life | AWAITING_BOX * engine.awaiting_box
+             | FOOD_BONUS * engine.food_bonus | GREEN_ACTIVE * engine.food_green_active)
+    width = engine.grid_width
+    food = engine.food[1] * width + engine.food[0] if engine.food is not None else -1
+    green = engine.food_green[1] * width + engine.food_green[0] if engine.food_green is not None else -1
+    pro = engine.projectiles
+    data = RECORD.pack(kind, engine.tick, engine.score, DIRECTION_CODES[engine.direction], flags, food, green,
+                       engine.board.pending, max(engine.processed_milestones, default=0),
+                       engine.shot_policy.last_shot_score, timers.remaining(engine.green_timer),
+                       timers.remaining(engine.teleport_timer), timers.remaining(engine.freeze_timer), head, tail,
+                       len(removed), len(pro))
+    data += struct.pack(f"<{len(removed)}i", *removed)
+    for k in range(len(pro)):
+        data += SHOT.pack(pro.y[k] * width + pro.x[k], pro.dx[k], pro.dy[k])
+    return data
+
+
+def keyframe(engine, missing, kind=KEYFRAME, head=-1, tail=-1, removed=()):
+    return record(engine, kind, head, tail, removed) + pack_body(engine.board.body, engine.grid_width) + pack_cells(sorted(missing))
+
+
+def missing_walls(engine):
+    """Level cells that are not walls right now, which is how keyframes store the walls."""
+    width = engine.grid_width
+    return {y * width + x for x, y in engine.level if not engine.board.is_wall((x, y))}
+
+
+class Tick:
+    """One decoded record: the engine's scalars after a tick and what the tick changed on the board."""
+
+    def __init__(self, data, width):
+        self.width = width
+        self.end = self.read(data)
+
+    def read(self, data):
+        (_, self.tick, self.score, self.direction, self.flags, self.food, self.green, self.pending, self.milestone,
+         self.last_shot, self.green_left, self.teleport_left, self.freeze_left, self.head, self.tail, removed,
+         shots) = RECORD.unpack_from(data)
+        offset = RECORD.size
+        self.removed = struct.unpack_from(f"<{removed}i", data, offset)
+        offset += 4 * removed
+        self.shots = [SHOT.unpack_from(data, offset + k * SHOT.size) for k in range(shots)]
+        return offset + shots * SHOT.size
+
+    def cell(self, i):
+        return None if i < 0 else (i % self.width, i // self.width)
+
+    def undo(self, board):
+        """Takes this tick's moves and shots back off a board that is right after it."""
+        if self.head >= 0:
+            board.unmove(self.cell(self.tail))
+        for i in self.removed:
+            board.add_wall(self.cell(i))
+
+    def restore(self, engine):
+        """Everything but the snake and the walls."""
+        width = self.width
+        cell = self.cell
+        engine.board.pending = self.pending
+        engine.tick = self.tick
+        engine.score = self.score
+        engine.direction = engine.new_direction = DIRECTION_NAMES[self.direction]
+        engine.turns.clear()
+        engine.frozen = bool(self.flags & FROZEN)
+        engine.extra_life = bool(self.flags & EXTRA_LIFE)
+        engine.awaiting_box = bool(self.flags & AWAITING_BOX)
+        engine.food_bonus = bool(self.flags & FOOD_BONUS)
+        engine.food_value = 5 if engine.food_bonus else 1
+        engine.food = cell(self.food)
+        engine.food_green = cell(self.green)
+        engine.food_green_active = bool(self.flags & GREEN_ACTIVE)
+        engine.processed_milestones = set(range(30, self.milestone + 1, 30))
+        engine.shot_policy.last_shot_score = self.last_shot
+        engine.projectiles.clear()
+        for i, dx, dy in self.shots:
+            engine.projectiles.add(i % width, i // width, dx, dy)
+        timers = engine.timers
+        timers.clear()
+        engine.green_timer = timers.schedule(self.green_left, engine.expire_green) if self.green_left else None
+        engine.teleport_timer = (timers.schedule(self.teleport_left, engine.teleport_recharged)
+                                 if self.teleport_left else None)
+        engine.freeze_timer = timers.schedule(self.freeze_left, engine.unfreeze) if self.freeze_left else None
+
+
+class State(Tick):
+    """A decoded keyframe, moved forward tick by tick with apply()."""
+
+    def __init__(self, data, width):
+        super().__init__(data, width)
+        body, offset = unpack_body(data, self.end, width)
+        self.body = deque(body)
+        missing, _ = unpack_cells(data, offset)
+        self.missing = set(missing)
+
+    def apply(self, data):
+        self.read(data)
+        if self.head >= 0:
+            self.body.appendleft(self.head)
+            if self.tail >= 0:
+                self.body.pop()
+        self.missing.update(self.removed)
+
+    def restore(self, engine):
+        width = self.width
+        board = engine.board
+        board.clear_walls()
+        board.set_snake([self.cell(i) for i in self.body])
+        for x, y in engine.level:
+            if y * width + x not in self.missing:
+                board.add_wall((x, y))
+        super().restore(engine)
+
+
+class History:
+    """The rewind buffer: a compact record per tick in a ring of REWIND_BYTES bytes.
+
+    Most records are deltas: the scalars after the tick, the new head, whether
+    the tail moved, walls shot and the projectiles, so their size does not depend
+    on the snake. A keyframe with the whole body as 2-bit steps follows once the
+    deltas since the last one take KEYFRAME_RATIO times as many bytes as it did,
+    or right after a teleport or respawn. Keyframes therefore use about a ninth
+    of the buffer, and a longer snake only shortens how far back it reaches.
+
+    Each record also keeps the tail cell the tick left behind, so restoring
+    normally steps back from the live board one record at a time, at a cost that
+    depends on how far it goes and not on the snake or the board. Only when a
+    teleport or respawn lies in between does it decode the nearest keyframe,
+    play the deltas after it forward and rebuild the board."""
+
+    def __init__(self, size=REWIND_BYTES):
+        self.buf = bytearray(size)
+        # (lap, start, end, tick, kind) in the order they were written.
+        self.entries = deque()
+        self.pos = 0
+        self.lap = 0
+        self.since_keyframe = 0
+        self.keyframe_size = 0
+        self.force_keyframe = True
+        self.missing = set()
+        self.removed = []
+        self.last_tick = -1
+        self.width = 0
+
+    def start(self, engine):
+        self.entries.clear()
+        self.pos = 0
+        self.lap = 0
+        self.width = engine.grid_width
+        self.missing = missing_walls(engine)
+        self.removed.clear()
+        self.force_keyframe = True
+        self.last_tick = -1
+        self.record(engine, [])
+
+    def note(self, events):
+        # Events from shots and teleports between ticks go into the next record.
+        for event in events:
+            if event[0] == "wall_removed":
+                i = event[1][1] * self.width + event[1][0]
+                self.removed.append(i)
+                self.missing.add(i)
+            elif event[0] in ("teleport", "respawn"):
+                self.force_keyframe = True
+
+    def record(self, engine, events):
+        self.note(events)
+        if engine.tick == self.last_tick or not engine.running:
+            return
+        self.last_tick = engine.tick
+        head = tail = -1
+        for event in events:
+            if event[0] == "head":
+                head = event[1][1] * self.width + event[1][0]
+            elif event[0] == "tail":
+                tail = event[1][1] * self.width + event[1][0]
+            elif event[0] == "respawn":
+                self.missing = missing_walls(engine)
+        if self.force_keyframe or self.since_keyframe >= KEYFRAME_RATIO * self.keyframe_size:
+            # Keyframes carry the tick's moves as well, so restore() can step back over them.
+            kind = JUMP if self.force_keyframe else KEYFRAME
+            data = keyframe(engine, self.missing, kind, head, tail, self.removed)
+            if self.store(data, kind):
+                self.force_keyframe = False
+                self.since_keyframe = 0
+                self.keyframe_size = len(data)
+        else:
+            data = record(engine, DELTA, head, tail, self.removed)
+            self.store(data, DELTA)
+            self.since_keyframe += len(data)
+        self.removed.clear()
+
+    def store(self, data, kind):
+        size = len(self.buf)
+        if kind != DELTA and len(data) > size // 2:
+            # Too big to keep even two; nothing can be restored until the snake shrinks.
+            self.entries.clear()
+            return False
+        if kind == DELTA and not self.entries:
+            return False
+        entries = self.entries
+        if self.pos + len(data) > size:
+            # Leftovers from the lap before are older than everything written since; drop them and wrap.
+            while entries and entries[0][0] < self.lap:
+                entries.popleft()
+            self.lap += 1
+            self.pos = 0
+        end = self.pos + len(data)
+        while entries and entries[0][0] < self.lap and entries[0][1] < end:
+            entries.popleft()
+        # A delta is only useful after its keyframe.
+        while entries and entries[0][4] == DELTA:
+            entries.popleft()
+        if kind == DELTA and not entries:
+            return False
+        self.buf[self.pos:end] = data
+        entries.append((self.lap, self.pos, end, self.last_tick, kind))
+        self.pos = end
+        return True
+
+    def oldest(self):
+        return self.entries[0][3] if self.entries else None
+
+    def restore(self, engine, tick):
+        """Puts the engine back to the last recorded tick at or before `tick`, or the oldest one kept.
+
+        Everything recorded after it is dropped. Returns the tick restored to, or None."""
+        entries = self.entries
+        if not entries:
+            return None
+        last = len(entries) - 1
+        while last > 0 and entries[last][3] > tick:
+            last -= 1
+        first = last
+        while entries[first][4] == DELTA:
+            first -= 1
+        later = list(entries)[last + 1:]
+        if (entries[-1][3] == engine.tick and not self.force_keyframe
+                and all(entry[4] != JUMP for entry in later)):
+            # The board is right after the newest record, so it only has to step back over the ticks since.
+            board = engine.board
+            for i in self.removed:
+                board.add_wall((i % self.width, i // self.width))
+            for _, start, end, _, _ in reversed(later):
+                step = Tick(self.buf[start:end], self.width)
+                step.undo(board)
+                self.missing.difference_update(step.removed)
+            self.missing.difference_update(self.removed)
+            _, start, end, _, _ = entries[last]
+            state = Tick(self.buf[start:end], self.width)
+        else:
+            _, start, end, _, _ = entries[first]
+            state = State(self.buf[start:end], self.width)
+            for _, start, end, _, _ in list(entries)[first + 1:last + 1]:
+                state.apply(self.buf[start:end])
+            self.missing = state.missing
+        state.restore(engine)
+        while len(entries) > last + 1:
+            entries.pop()
+        self.lap, _, self.pos = entries[-1][:3]
+        self.since_keyframe = sum(entry[2] - entry[1] for entry in list(entries)[first + 1:])
+        self.keyframe_size = entries[first][2] - entries[first][1]
+        self.last_tick = engine.tick
+        self.removed.clear()
+        return engine.tick
+
+
+def save_state(engine):
+    """The whole game as bytes: engine settings, level, random state and a keyframe."""
+    version, words, gauss = engine.rng.getstate()
+    walls = STYLES.index(engine.level_style) + 1 if engine.use_walls else 0
+    width = engine.grid_width
+    level = [y * width + x for x, y in engine.level]
+    density = math.nan if engine.wall_density is None else engine.wall_density
+    return (STATE.pack(STATE_MAGIC, STATE_VERSION, width, engine.grid_height, walls, engine.tick_ms,
+                       engine.seed or 0, density, engine.rewinds, len(level), version,
+                       math.nan if gauss is None else gauss)
+            + struct.pack(f"<{RNG_WORDS}I", *words) + struct.pack(f"<{len(level)}i", *level)
+            + keyframe(engine, missing_walls(engine)))
+
+
+def load_state(data, **engine_args):
+    """A new SnakeEngine in the state save_state() wrote. Extra arguments go to the SnakeEngine constructor."""
+    from engine import SnakeEngine
+    (magic, version, width, height, walls, tick_ms, seed, density, rewinds, level_size, rng_version,
+     gauss) = STATE.unpack_from(data)
+    if magic != STATE_MAGIC or version != STATE_VERSION:
+        raise ValueError("not a saved game")
+    offset = STATE.size
+    words = struct.unpack_from(f"<{RNG_WORDS}I", data, offset)
+    offset += 4 * RNG_WORDS
+    level = struct.unpack_from(f"<{level_size}i", data, offset)
+    offset += 4 * level_size
+    # The constructor builds a fresh game; everything it picked is overwritten below.
+    engine = SnakeEngine(width, height, False, tick_ms=tick_ms, seed=seed,
+                         level_style=STYLES[walls - 1] if walls else "scatter",
+                         wall_density=None if math.isnan(density) else density, **engine_args)
+    engine.use_walls = bool(walls)
+    engine.level = tuple((i % width, i // width) for i in level)
+    engine.rewinds = rewinds
+    State(data[offset:], width).restore(engine)
+    engine.rng.setstate((rng_version, words, None if math.isnan(gauss) else gauss))
+    if engine.history is not None:
+        engine.history.start(engine)
+    return engine
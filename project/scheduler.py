@@ -0,0 +1,69 @@
+import time
+
+FRAME_MS = 16
+MAX_TICKS_PER_FRAME = 5
+
+
+class GameScheduler:
+    def __init__(self, root, tick, frame=None, frame_ms=FRAME_MS):
+        self.root = root
+        self.tick = tick
+        self.frame = frame
+        self.frame_ms = frame_ms
+        self.tick_ms = 100
+        self.rate = 1
+        self.job = None
+        self.active = False
+        self.last = 0.0
+        self.accumulator = 0.0
+        self.last_tick = None
+        self.metrics = None
+        # Wall-clock milliseconds spent running since the last reset; pauses stop the loop and do not count.
+        self.played = 0.0
+
+    def start(self):
+        self.stop()
+        self.active = True
+        self.last = time.perf_counter()
+        self.accumulator = 0.0
+        self.last_tick = None
+        self.job = self.root.after(self.frame_ms, self.loop)
+
+    def stop(self):
+        self.active = False
+        if self.job is not None:
+            self.root.after_cancel(self.job)
+            self.job = None
+
+    def loop(self):
+        self.job = None
+        now = time.perf_counter()
+        elapsed = (now - self.last) * 1000
+        self.last = now
+        self.played += elapsed
+
+        metrics = self.metrics
+        if metrics:
+            metrics.add("frame_jitter", elapsed - self.frame_ms)
+
+        self.accumulator += elapsed * self.rate
+        ticks = 0
+        while self.active and self.accumulator >= self.tick_ms:
+            self.accumulator -= self.tick_ms
+            if metrics:
+                tick_time = time.perf_counter()
+                if self.last_tick is not None:
+                    metrics.add("tick_jitter", (tick_time - self.last_tick) * 1000 - self.tick_ms / self.rate)
+                self.last_tick = tick_time
+            self.tick()
+            ticks += 1
+            if ticks == MAX_TICKS_PER_FRAME:
+                self.accumulator = min(self.accumulator, self.tick_ms)
+                break
+
+        if self.active and self.frame:
+            self.frame()
+        if metrics:
+            metrics.add("frame", (time.perf_counter() - now) * 1000)
+        if self.active and self.job is None:
+            self.job = self.root.after(self.frame_ms, self.loop)
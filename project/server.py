@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import json
+import random
+import signal
+import time
+
+from arena import ArenaEngine
+from config import DEFAULT_WIDTH, DEFAULT_HEIGHT, GAME_SPEED, SERVER_HOST, SERVER_PORT
+from engine import DIRECTIONS
+from levels import STYLES
+from metrics import PerfMetrics
+
+MAX_BUFFER = 256 * 1024
+MAX_LAG_TICKS = 5
+
+
+def encode(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class Client:
+    __slots__ = ("sid", "writer", "synced")
+
+    def __init__(self, sid, writer):
+        self.sid = sid
+        self.writer = writer
+        self.synced = False
+
+
+class GameServer:
+    """Runs one authoritative arena and streams per-tick events to every client.
+
+    Each tick's events are encoded once and the same bytes go to all clients. A
+    client whose socket falls behind is skipped and gets a full snapshot once it
+    drains, so a slow reader never stalls the tick loop."""
+
+    def __init__(self, grid_width=DEFAULT_WIDTH * 2, grid_height=DEFAULT_HEIGHT * 2, bots=10, use_walls=False,
+                 tick_ms=GAME_SPEED["Средний"], seed=None, level_style="scatter"):
+        self.arena = ArenaEngine(grid_width, grid_height, bots, players=0, use_walls=use_walls, tick_ms=tick_ms,
+                                 seed=seed, respawn_players=True, level_style=level_style)
+        self.clients = {}
+        self.actions = {}
+        self.events = []
+        self.metrics = PerfMetrics()
+        self.handlers = set()
+        self.closing = None
+
+    def snapshot(self, sid):
+        arena = self.arena
+        return {
+            "t": "full", "you": sid, "tick": arena.tick, "w": arena.width, "h": arena.height,
+            "tick_ms": arena.tick_ms, "walls_on": arena.use_walls,
+            "snakes": [[s.sid, s.color, s.score, list(s.body) if s.alive else None] for s in arena.snakes],
+            "food": list(arena.food_items()), "walls": list(arena.walls), "pro": arena.projectiles.cells(),
+        }
+
+    async def handle(self, reader, writer):
+        sid = None
+        self.handlers.add(asyncio.current_task())
+        try:
+            hello = json.loads(await reader.readline() or b"{}")
+            if hello.get("t") != "join":
+                return
+            sid = self.arena.add_player(self.events, hello.get("color"))
+            self.events.append(("snake_color", sid, self.arena.snakes[sid].color))
+            client = self.clients[sid] = Client(sid, writer)
+            writer.write(encode(self.snapshot(sid)))
+            client.synced = True
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                kind = message.get("t")
+                if kind == "dir" and message.get("d") in DIRECTIONS:
+                    self.arena.set_direction(message["d"], sid)
+                elif kind in ("shoot", "tp"):
+                    self.actions[sid] = "shoot" if kind == "shoot" else "teleport"
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if sid is not None:
+                self.clients.pop(sid, None)
+                self.actions.pop(sid, None)
+                self.arena.remove_player(sid, self.events)
+            writer.close()
+            self.handlers.discard(asyncio.current_task())
+
+    def broadcast(self, message):
+        data = encode(message)
+        for client in list(self.clients.values()):
+            transport = client.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > MAX_BUFFER:
+                client.synced = False
+            elif not client.synced:
+                client.writer.write(encode(self.snapshot(client.sid)))
+                client.synced = True
+            else:
+                client.writer.write(data)
+
+    def tick(self):
+        start = time.perf_counter()
+        actions, self.actions = self.actions, {}
+        events, self.events = self.events, []
+        events += self.arena.step(actions)
+        self.metrics.add("logic", (time.perf_counter() - start) * 1000)
+        sent = time.perf_counter()
+        self.broadcast({"t": "d", "k": self.arena.tick, "e": events})
+        self.metrics.add("send", (time.perf_counter() - sent) * 1000)
+
+    def stop(self):
+        if self.closing is not None and not self.closing.done():
+            self.closing.set_result(None)
+
+    async def run(self, host=SERVER_HOST, port=SERVER_PORT):
+        loop = asyncio.get_running_loop()
+        self.closing = loop.create_future()
+        try:
+            loop.add_signal_handler(signal.SIGINT, self.stop)
+        except (NotImplementedError, RuntimeError):
+            pass
+        server = await asyncio.start_server(self.handle, host, port)
+        step = self.arena.tick_ms / 1000
+        due = loop.time() + step
+        while not self.closing.done():
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.wait([self.closing], timeout=delay)
+                if self.closing.done():
+                    break
+            lag = loop.time() - due
+            self.metrics.add("tick_jitter", lag * 1000)
+            if lag > MAX_LAG_TICKS * step:
+                due = loop.time()
+            self.tick()
+            due += step
+
+        server.close()
+        for client in list(self.clients.values()):
+            client.writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await server.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сервер сетевой арены")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH * 2)
+    parser.add_argument("--height", type=int, default=DEFAULT_HEIGHT * 2)
+    parser.add_argument("--bots", type=int, default=10)
+    parser.add_argument("--walls", action="store_true")
+    parser.add_argument("--map", choices=STYLES, default="scatter")
+    parser.add_argument("--level", choices=list(GAME_SPEED), default="Средний")
+    args = parser.parse_args()
+
+    server = GameServer(args.width, args.height, args.bots, args.walls, GAME_SPEED[args.level],
+                        seed=random.getrandbits(64), level_style=args.map)
+    print(f"Сервер слушает {args.host}:{args.port}")
+    try:
+        asyncio.run(server.run(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    stats = server.metrics.stats
+    print(f"Тиков: {server.arena.tick} | логика p99 {stats['logic'].percentile(99):.2f} мс | "
+          f"рассылка p99 {stats['send'].percentile(99):.2f} мс | "
+          f"джиттер тика p50/p99 {stats['tick_jitter'].percentile(50):.2f}/"
+          f"{stats['tick_jitter'].percentile(99):.2f} мс")
@@ -0,0 +1,262 @@
+import argparse
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from config import SHARED_BOARD
+
+MAGIC = b"SNKB"
+VERSION = 1
+# magic, version, flags, width, height, seq, tick, score, snake head slot, snake length,
+# food, food value, green food, projectile count
+HEADER = struct.Struct("<4sHHHHQIiIIiiiI")
+SEQ_OFFSET = 12
+MAX_PROJECTILES = 64
+CLOSED = 1
+EMPTY, BODY, HEAD, WALL, FOOD, GREEN = range(6)
+READ_RETRIES = 1000
+
+
+def segment_size(width, height):
+    cells = width * height
+    return HEADER.size + cells + 4 * cells + 4 * MAX_PROJECTILES
+
+
+class BoardGrid:
+    """Cell codes (EMPTY/BODY/HEAD/WALL/FOOD/GREEN) for a SnakeEngine board, kept up to date from its events.
+
+    The snake is a ring of cell indices (y * width + x, -1 meaning none) with the
+    head at `head_slot`, so a tick only touches the cells its events name."""
+
+    def __init__(self, engine):
+        self.width = engine.grid_width
+        self.height = engine.grid_height
+        self.grid, self.ring = self.buffers(self.width * self.height)
+        self.head_slot = 0
+        self.length = 0
+        self.food = self.green = -1
+        self.publish(engine)
+
+    def buffers(self, cells):
+        return bytearray(cells), memoryview(bytearray(4 * cells)).cast("i")
+
+    def begin(self):
+        pass
+
+    def end(self, engine):
+        pass
+
+    def index(self, cell):
+        return -1 if cell is None else cell[1] * self.width + cell[0]
+
+    def publish(self, engine):
+        """Rewrites the whole frame; used at the start and after teleports, respawns and rewinds."""
+        self.begin()
+        board = engine.board
+        self.grid[:] = bytes(len(self.grid))
+        for cell in board.walls:
+            self.grid[self.index(cell)] = WALL
+        self.head_slot = 0
+        self.length = len(board.body)
+        for k, cell in enumerate(board.body):
+            self.ring[k] = self.index(cell)
+            self.grid[self.ring[k]] = BODY
+        if self.length:
+            self.grid[self.ring[0]] = HEAD
+        self.set_food(engine)
+        self.end(engine)
+
+    def set_food(self, engine):
+        for i in (self.food, self.green):
+            if i >= 0 and self.grid[i] in (FOOD, GREEN):
+                self.grid[i] = EMPTY
+        self.food = self.index(engine.food)
+        self.green = self.index(engine.food_green if engine.food_green_active else None)
+        # A teleport can drop the body over food; the snake is shown there until its tail passes.
+        if self.food >= 0 and self.grid[self.food] == EMPTY:
+            self.grid[self.food] = FOOD
+        if self.green >= 0 and self.grid[self.green] == EMPTY:
+            self.grid[self.green] = GREEN
+
+    def apply(self, engine, events):
+        if not events:
+            return
+        for event in events:
+            if event[0] in ("teleport", "respawn", "rewind"):
+                self.publish(engine)
+                return
+        self.begin()
+        grid = self.grid
+        ring = self.ring
+        for event in events:
+            kind = event[0]
+            if kind == "head":
+                i = self.index(event[1])
+                if self.length:
+                    grid[ring[self.head_slot]] = BODY
+                self.head_slot = (self.head_slot - 1) % len(ring)
+                ring[self.head_slot] = i
+                self.length += 1
+                grid[i] = HEAD
+            elif kind == "tail":
+                self.length -= 1
+                i = ring[(self.head_slot + self.length) % len(ring)]
+                # A teleport can drop the body over walls and food; they show again once the tail passes.
+                y, x = divmod(i, self.width)
+                if engine.board.is_wall((x, y)):
+                    grid[i] = WALL
+                elif i == self.food:
+                    grid[i] = FOOD
+                elif i == self.green:
+                    grid[i] = GREEN
+                else:
+                    grid[i] = EMPTY
+            elif kind in ("food", "green"):
+                self.set_food(engine)
+            elif kind == "wall_removed" and grid[self.index(event[1])] == WALL:
+                grid[self.index(event[1])] = EMPTY
+        self.end(engine)
+
+
+class BoardExport(BoardGrid):
+    """Publishes a SnakeEngine board into shared memory, one consistent frame per tick.
+
+    Layout after the header: the BoardGrid cells as one byte each, its snake
+    ring as int32, then up to MAX_PROJECTILES int32 cell indices.
+
+    `seq` works as a seqlock: it is odd while a frame is being written, so
+    readers retry until they see the same even value before and after copying.
+
+    Raises FileExistsError when a segment with this name already exists, so a
+    second game cannot take over the first one's export."""
+
+    def __init__(self, engine, name=SHARED_BOARD):
+        self.name = name
+        self.seq = 0
+        super().__init__(engine)
+
+    def buffers(self, cells):
+        self.shm = shared_memory.SharedMemory(self.name, create=True, size=segment_size(self.width, self.height))
+        self.buf = self.shm.buf
+        self.pro = self.buf[HEADER.size + 5 * cells:].cast("i")
+        grid = self.buf[HEADER.size:HEADER.size + cells]
+        return grid, self.buf[HEADER.size + cells:HEADER.size + 5 * cells].cast("i")
+
+    def begin(self):
+        self.seq += 1
+        struct.pack_into("<Q", self.buf, SEQ_OFFSET, self.seq)
+
+    def end(self, engine):
+        self.seq += 1
+        pro = engine.projectiles.cells()[:MAX_PROJECTILES]
+        for k, (_, cell) in enumerate(pro):
+            self.pro[k] = self.index(cell)
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, 0, self.width, self.height, self.seq, engine.tick,
+                         engine.score, self.head_slot, self.length, self.food, engine.food_value, self.green,
+                         len(pro))
+
+    def close(self):
+        # Tells attached readers that this segment is gone and they should reattach.
+        struct.pack_into("<H", self.buf, 6, CLOSED)
+        self.grid.release()
+        self.ring.release()
+        self.pro.release()
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class Frame:
+    __slots__ = ("tick", "score", "width", "height", "grid", "snake", "food", "food_value", "green",
+                 "projectiles")
+
+
+class BoardReader:
+    """Attaches to a BoardExport segment and copies out consistent frames."""
+
+    def __init__(self, name=SHARED_BOARD):
+        try:
+            self.shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # Before Python 3.13 every attach is tracked and the segment would be
+            # unlinked under the game when this process exits.
+            self.shm = shared_memory.SharedMemory(name)
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.buf = self.shm.buf
+
+    @property
+    def closed(self):
+        return struct.unpack_from("<H", self.buf, 6)[0] & CLOSED
+
+    def seq(self):
+        return struct.unpack_from("<Q", self.buf, SEQ_OFFSET)[0]
+
+    def read(self):
+        """The latest complete frame, or None if the writer kept the lock through every retry."""
+        for _ in range(READ_RETRIES):
+            before = self.seq()
+            if before & 1:
+                continue
+            (_, _, _, width, height, _, tick, score, head_slot, length, food, food_value, green,
+             count) = HEADER.unpack_from(self.buf)
+            cells = width * height
+            grid = bytes(self.buf[HEADER.size:HEADER.size + cells])
+            ring = self.buf[HEADER.size + cells:HEADER.size + 5 * cells].cast("i")
+            end = head_slot + length
+            snake = ring[head_slot:min(end, cells)].tolist() + ring[:max(0, end - cells)].tolist()
+            ring.release()
+            pro = self.buf[HEADER.size + 5 * cells:].cast("i")
+            projectiles = pro[:count].tolist()
+            pro.release()
+            if self.seq() != before:
+                continue
+            frame = Frame()
+            frame.tick, frame.score, frame.width, frame.height = tick, score, width, height
+            frame.grid, frame.snake, frame.projectiles = grid, snake, projectiles
+            frame.food, frame.food_value, frame.green = food, food_value, green
+            return frame
+        return None
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+
+def render(frame):
+    symbols = ".o@#*+"
+    rows = []
+    pro = set(frame.projectiles)
+    for y in range(frame.height):
+        start = y * frame.width
+        rows.append("".join("!" if start + x in pro else symbols[frame.grid[start + x]]
+                            for x in range(frame.width)))
+    return "\n".join(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Зритель: читает поле из общей памяти")
+    parser.add_argument("--name", default=SHARED_BOARD)
+    parser.add_argument("--fps", type=float, default=10)
+    args = parser.parse_args()
+
+    reader = None
+    last_tick = None
+    try:
+        while True:
+            if reader is None or reader.closed:
+                if reader is not None:
+                    reader.close()
+                try:
+                    reader = BoardReader(args.name)
+                except FileNotFoundError:
+                    reader = None
+                    time.sleep(1)
+                    continue
+            frame = reader.read()
+            if frame is not None and frame.tick != last_tick:
+                last_tick = frame.tick
+                print(f"\x1b[H\x1b[2JТик {frame.tick} | Счёт {frame.score} | Длина {len(frame.snake)}")
+                print(render(frame))
+            time.sleep(1 / args.fps)
+    except KeyboardInterrupt:
+        pass
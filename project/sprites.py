@@ -0,0 +1,72 @@
+import tkinter as tk
+
+from config import CELL_SIZE
+
+TILE_PAD = 2
+TILE_SIZE = CELL_SIZE + 2 * TILE_PAD + 2
+
+
+def paint(size, shapes):
+    """Rasterises (color, x0, y0, x1, y1, round) shapes in order, later ones on top.
+
+    Returns one list of (color, start, end) runs per row; uncovered pixels stay
+    transparent."""
+    pixels = [[None] * size for _ in range(size)]
+    for color, x0, y0, x1, y1, rounded in shapes:
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        rx, ry = (x1 - x0) / 2, (y1 - y0) / 2
+        for y in range(max(0, int(y0)), min(size, int(y1))):
+            row = pixels[y]
+            for x in range(max(0, int(x0)), min(size, int(x1))):
+                if not rounded or ((x + 0.5 - cx) / rx) ** 2 + ((y + 0.5 - cy) / ry) ** 2 <= 1:
+                    row[x] = color
+    rows = []
+    for row in pixels:
+        runs = []
+        x = 0
+        while x < size:
+            start = x
+            while x < size and row[x] == row[start]:
+                x += 1
+            if row[start] is not None:
+                runs.append((row[start], start, x))
+        rows.append(runs)
+    return rows
+
+
+def shapes(kind, fill, outline, shadow):
+    """Shape list for a tile whose top-left corner sits TILE_PAD pixels above and left of the cell."""
+    o = TILE_PAD
+    if kind == "pro":
+        return [(shadow, o + 7, o + 7, o + 17, o + 17, True),
+                (outline, o + 5, o + 5, o + 15, o + 15, True),
+                (fill, o + 6, o + 6, o + 14, o + 14, True)]
+    if kind in ("food", "bonus", "green"):
+        pad, offset = 2, 3
+    else:
+        pad, offset = 0, 2
+    rounded = kind != "wall"
+    x0 = y0 = o - pad
+    x1 = y1 = o + CELL_SIZE + pad
+    return [(shadow, o + offset, o + offset, o + CELL_SIZE + offset, o + CELL_SIZE + offset, rounded),
+            (outline, x0, y0, x1, y1, rounded),
+            (fill, x0 + 1, y0 + 1, x1 - 1, y1 - 1, rounded)]
+
+
+class SpriteCache:
+    def __init__(self, master):
+        self.master = master
+        self.images = {}
+
+    def get(self, kind, fill, outline, shadow):
+        key = (kind, fill, outline, shadow)
+        image = self.images.get(key)
+        if image is None:
+            image = self.images[key] = tk.PhotoImage(master=self.master, width=TILE_SIZE, height=TILE_SIZE)
+            for y, runs in enumerate(paint(TILE_SIZE, shapes(kind, fill, outline, shadow))):
+                for color, start, end in runs:
+                    image.put(color, to=(start, y, end, y + 1))
+        return image
+
+    def clear(self):
+        self.images = {}
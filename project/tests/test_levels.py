@@ -0,0 +1,38 @@
+from collections import deque
+
+import pytest
+
+from levels import STYLES, level
+
+
+def free_cells_connected(width, height, walls):
+    free = {(x, y) for y in range(height) for x in range(width)} - set(walls)
+    start = next(iter(free))
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        x, y = queue.popleft()
+        for cell in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if cell in free and cell not in seen:
+                seen.add(cell)
+                queue.append(cell)
+    return len(seen) == len(free)
+
+
+@pytest.mark.parametrize("style", STYLES)
+@pytest.mark.parametrize("width, height", [(20, 20), (41, 17), (90, 60)])
+def test_level_keeps_free_space_connected(style, width, height):
+    keep = tuple((width // 2 - i, height // 2) for i in range(-3, 3))
+    for seed in range(5):
+        walls = level(width, height, style, seed=seed, keep=keep)
+        assert walls
+        assert len(set(walls)) == len(walls)
+        assert all(0 <= x < width and 0 <= y < height for x, y in walls)
+        assert not set(keep) & set(walls)
+        assert free_cells_connected(width, height, walls)
+
+
+@pytest.mark.parametrize("style", STYLES)
+def test_level_depends_only_on_its_seed(style):
+    assert level.__wrapped__(30, 20, style, seed=7) == level.__wrapped__(30, 20, style, seed=7)
+    assert level.__wrapped__(30, 20, style, seed=7) != level.__wrapped__(30, 20, style, seed=8)
@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from autopilot import Autopilot
+from config import REWIND_BYTES
+from engine import SnakeEngine
+
+
+def snapshot(engine):
+    board = engine.board
+    return (list(board.body), set(board.walls), board.pending, engine.score, engine.direction, engine.food,
+            engine.food_bonus, engine.food_green, engine.food_green_active, engine.extra_life, engine.frozen,
+            engine.awaiting_box, sorted(cell for _, cell in engine.projectiles.cells()), sorted(board.free))
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_rewind_restores_the_recorded_state(seed):
+    rng = random.Random(seed)
+    engine = SnakeEngine(40, 30, True, seed=seed, rewind_bytes=REWIND_BYTES,
+                         level_style=("scatter", "corridors")[seed % 2])
+    states = {engine.tick: snapshot(engine)}
+    pilot = Autopilot(engine)
+    restores = 0
+    for _ in range(1500):
+        if not engine.running:
+            break
+        if engine.awaiting_box:
+            engine.choose_box(rng.randint(1, 4))
+        roll = rng.random()
+        if roll < 0.05:
+            engine.shoot()
+        elif roll < 0.055:
+            engine.teleport()
+        elif roll < 0.08:
+            # Whatever the path back (undoing ticks or a keyframe), the state must be the one played then.
+            engine.rewinds = 1
+            if engine.rewind(rng.randint(1, 40)):
+                restores += 1
+                assert snapshot(engine) == states[engine.tick]
+                pilot = Autopilot(engine)
+            continue
+        action = pilot.choose()
+        pilot.update(engine.step(None if action == "teleport" else action))
+        states[engine.tick] = snapshot(engine)
+    assert restores
@@ -0,0 +1,70 @@
+import os
+import random
+import sys
+from multiprocessing import resource_tracker
+
+import pytest
+
+from autopilot import Autopilot
+from engine import SnakeEngine
+from shared import BODY, EMPTY, FOOD, GREEN, HEAD, WALL, BoardExport, BoardReader
+
+
+def expected_grid(engine):
+    width = engine.grid_width
+    grid = bytearray(width * engine.grid_height)
+    for x, y in engine.board.walls:
+        grid[y * width + x] = WALL
+    cells = [(engine.food, FOOD)]
+    if engine.food_green_active:
+        cells.append((engine.food_green, GREEN))
+    for cell, code in cells:
+        # Food left under a teleported body shows once the tail has passed.
+        if cell is not None and not engine.board.is_snake(cell):
+            grid[cell[1] * width + cell[0]] = code
+    for x, y in engine.board.body:
+        grid[y * width + x] = BODY
+    x, y = engine.board.body[0]
+    grid[y * width + x] = HEAD
+    return bytes(grid)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_reader_sees_the_engine_board(seed):
+    rng = random.Random(seed)
+    engine = SnakeEngine(30, 20, seed % 2 == 0, seed=seed,
+                         level_style=("scatter", "rooms", "maze", "corridors")[seed % 4])
+    engine.extra_life = True
+    pilot = Autopilot(engine)
+    export = BoardExport(engine, name=f"snake_test_{os.getpid()}_{seed}")
+    reader = BoardReader(export.name)
+    if sys.version_info < (3, 13):
+        # The reader normally runs in another process; here it has just unregistered the export's own segment.
+        resource_tracker.register(reader.shm._name, "shared_memory")
+    try:
+        while engine.running and engine.tick < 800:
+            if engine.awaiting_box:
+                export.apply(engine, engine.choose_box(rng.randint(1, 4)))
+                continue
+            events = engine.step(pilot.choose() if rng.random() < 0.9 else rng.choice(["Up", "Down", "Left", "Right"]))
+            pilot.update(events)
+            export.apply(engine, events)
+            if rng.random() < 0.05:
+                export.apply(engine, engine.shoot())
+            if rng.random() < 0.03:
+                export.apply(engine, engine.teleport())
+            if not engine.running:
+                break
+            frame = reader.read()
+            width = engine.grid_width
+            assert (frame.tick, frame.score, frame.width, frame.height) == (engine.tick, engine.score, width,
+                                                                            engine.grid_height)
+            assert frame.snake == [y * width + x for x, y in engine.board.body]
+            assert frame.grid == expected_grid(engine)
+            assert frame.food == (-1 if engine.food is None else engine.food[1] * width + engine.food[0])
+            assert frame.food_value == engine.food_value
+            assert sorted(frame.projectiles) == sorted(y * width + x for _, (x, y) in engine.projectiles.cells())
+    finally:
+        reader.close()
+        export.close()
+    assert reader.buf is None
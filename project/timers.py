@@ -0,0 +1,73 @@
+WHEEL_SIZE = 512
+
+
+class Timer:
+    __slots__ = ("due", "callback", "args")
+
+    def __init__(self, due, callback, args):
+        self.due = due
+        self.callback = callback
+        self.args = args
+
+
+class TimerWheel:
+    """Hashed timing wheel counted in game ticks.
+
+    A timer due at tick t waits in slot t % WHEEL_SIZE, so advancing one tick
+    only looks at one slot. Timers longer than a full turn of the wheel stay in
+    their slot and are passed over once per turn. Ticks only happen while the
+    game runs, so pauses need no special handling. Delays are game time: the
+    Ctrl speed-up runs them faster in real time, like everything else in the
+    game, and replays see them at the same ticks."""
+
+    def __init__(self, size=WHEEL_SIZE):
+        self.size = size
+        self.slots = [[] for _ in range(size)]
+        self.now = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def schedule(self, delay, callback, *args):
+        """Calls callback(*context, *args) from the advance() `delay` ticks from now (at least one)."""
+        timer = Timer(self.now + max(1, delay), callback, args)
+        self.slots[timer.due % self.size].append(timer)
+        self.count += 1
+        return timer
+
+    def cancel(self, timer):
+        # Cancelled timers are dropped from their slot the next time it comes round.
+        if timer is not None and timer.callback is not None:
+            timer.callback = None
+            self.count -= 1
+
+    def pending(self, timer):
+        return timer is not None and timer.callback is not None
+
+    def remaining(self, timer):
+        return timer.due - self.now if self.pending(timer) else 0
+
+    def advance(self, *context):
+        self.now += 1
+        slot = self.slots[self.now % self.size]
+        if not slot:
+            return
+        due = [timer for timer in slot if timer.due <= self.now]
+        if not due:
+            return
+        slot[:] = [timer for timer in slot if timer.due > self.now and timer.callback is not None]
+        for timer in due:
+            callback = timer.callback
+            if callback is not None:
+                timer.callback = None
+                self.count -= 1
+                callback(*context, *timer.args)
+
+    def clear(self):
+        for slot in self.slots:
+            for timer in slot:
+                timer.callback = None
+            slot.clear()
+        self.now = 0
+        self.count = 0
@@ -0,0 +1,144 @@
+import argparse
+import csv
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from autopilot import Autopilot
+from config import DEFAULT_WIDTH, DEFAULT_HEIGHT, GAME_SPEED, TOURNAMENT_DIR
+from engine import SnakeEngine
+from levels import STYLES
+
+FIELDS = ("seed", "level", "walls", "score", "ticks", "death", "box1", "box2", "box3", "box4", "extra_life_used")
+BATCH = 25
+
+
+def play(seed, level, walls, width, height, boxes, max_ticks, style="scatter", density=None):
+    rng = random.Random(seed)
+    engine = SnakeEngine(width, height, walls, tick_ms=GAME_SPEED[level], seed=seed, level_style=style,
+                         wall_density=density)
+    pilot = Autopilot(engine)
+    picked = Counter()
+    death = "timeout"
+    extra_life_used = 0
+    while engine.running and engine.tick < max_ticks:
+        if engine.awaiting_box:
+            option = rng.randint(1, 4) if boxes == "random" else pilot.box() if boxes == "bot" else int(boxes)
+            picked[option] += 1
+            engine.choose_box(option)
+            continue
+        events = engine.step(pilot.choose())
+        pilot.update(events)
+        for event in events:
+            if event[0] == "death":
+                death = event[1]
+            elif event[0] == "respawn":
+                extra_life_used += 1
+    return (seed, level, int(walls), engine.score, engine.tick, death, picked[1], picked[2], picked[3], picked[4],
+            extra_life_used)
+
+
+def play_batch(games):
+    return [play(*game) for game in games]
+
+
+def games(args):
+    rng = random.Random(args.seed)
+    for _ in range(args.games):
+        level = rng.choice(args.levels)
+        walls = args.walls == "on" or (args.walls == "mixed" and rng.random() < 0.5)
+        yield (rng.getrandbits(63), level, walls, args.width, args.height, args.boxes, args.max_ticks, args.map,
+               args.density)
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0
+
+
+def report(rows):
+    result = {"games": len(rows), "levels": {}, "deaths": {}, "boxes": {}, "extra_life": {}}
+    for level in sorted({row[1] for row in rows}):
+        scores = sorted(row[3] for row in rows if row[1] == level)
+        result["levels"][level] = {
+            "games": len(scores), "mean": sum(scores) / len(scores), "p10": percentile(scores, 10),
+            "p50": percentile(scores, 50), "p90": percentile(scores, 90), "max": scores[-1],
+            "histogram": dict(sorted(Counter(score // 50 * 50 for score in scores).items())),
+        }
+    deaths = Counter(row[5] for row in rows)
+    result["deaths"] = {reason: count / len(rows) for reason, count in deaths.most_common()}
+    picks = [sum(row[6 + i] for row in rows) for i in range(4)]
+    result["boxes"] = {f"box{i + 1}": count / max(1, sum(picks)) for i, count in enumerate(picks)}
+    for label, group in (("used", [r for r in rows if r[10]]), ("not_used", [r for r in rows if not r[10]])):
+        result["extra_life"][label] = {"games": len(group),
+                                       "mean_score": sum(r[3] for r in group) / len(group) if group else 0,
+                                       "mean_ticks": sum(r[4] for r in group) / len(group) if group else 0}
+    return result
+
+
+def run(args):
+    os.makedirs(TOURNAMENT_DIR, exist_ok=True)
+    base = os.path.join(TOURNAMENT_DIR, args.name or time.strftime("%Y%m%d_%H%M%S"))
+    rows = []
+    start = time.perf_counter()
+    with open(base + ".csv", "w", encoding="utf-8", newline="") as f, \
+            ProcessPoolExecutor(max_workers=args.workers) as pool:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        pending = {pool.submit(play_batch, batch) for batch in batches(games(args), args.batch)}
+        for future in as_completed(pending):
+            batch = future.result()
+            writer.writerows(batch)
+            f.flush()
+            rows += batch
+            print(f"\r{len(rows)}/{args.games} игр", end="", flush=True)
+    elapsed = time.perf_counter() - start
+    summary = report(rows)
+    summary["seconds"] = elapsed
+    summary["games_per_second"] = len(rows) / elapsed
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return base, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Турнир ботов без окна на всех ядрах")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--levels", nargs="+", choices=list(GAME_SPEED), default=list(GAME_SPEED))
+    parser.add_argument("--walls", choices=("on", "off", "mixed"), default="mixed")
+    parser.add_argument("--map", choices=STYLES, default="scatter")
+    parser.add_argument("--density", type=float, default=None)
+    parser.add_argument("--boxes", choices=("random", "bot", "1", "2", "3", "4"), default="random")
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH)
+    parser.add_argument("--height", type=int, default=DEFAULT_HEIGHT)
+    parser.add_argument("--max-ticks", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--name", default=None)
+    args = parser.parse_args()
+
+    base, summary = run(args)
+    print(f"\n{summary['games']} игр за {summary['seconds']:.1f} с ({summary['games_per_second']:.1f} игр/с)")
+    for level, stats in summary["levels"].items():
+        print(f"{level}: средний счёт {stats['mean']:.1f} | p50 {stats['p50']} | p90 {stats['p90']} | "
+              f"макс {stats['max']}")
+    print("Смерти: " + ", ".join(f"{reason} {share:.1%}" for reason, share in summary["deaths"].items()))
+    print("Шкатулки: " + ", ".join(f"{box} {share:.1%}" for box, share in summary["boxes"].items()))
+    life = summary["extra_life"]
+    print(f"Вторая жизнь: со средним счётом {life['used']['mean_score']:.1f} против "
+          f"{life['not_used']['mean_score']:.1f} без неё")
+    print(f"Результаты: {base}.csv, {base}.json")